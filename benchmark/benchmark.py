@@ -0,0 +1,460 @@
+"""
+Benchmarks the time SSP takes to prepare a submission.
+
+A synthetic project of a configurable shape is generated, and SSP is run on it against a stub spark-submit and a local
+wheelhouse, so neither Spark nor network access is needed. Every run is timed, and the stages SSP records in its
+metrics file are collected. Cold runs start without any archive, wheel or cache. Warm runs reuse everything. Incremental
+runs change one file of one package before every run.
+
+Usage, from the root of the repository:
+
+    python benchmark/benchmark.py --packages 20 --files-per-package 50 --runs 10
+    python benchmark/benchmark.py --compare benchmark/results/<earlier result>.json
+
+Results are stored in benchmark/results/ as JSON, so that a later version can be compared against them.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPOSITORY_DIR, 'benchmark', 'results')
+SSP_DIR = os.path.join(REPOSITORY_DIR, 'dist', 'windows' if os.name == 'nt' else 'linux', '.spark-submit-project')
+# SSP itself, the same for every OS.
+SSP_COMMON_DIR = os.path.join(REPOSITORY_DIR, 'dist', 'common', '.spark-submit-project')
+
+PRIVATE_FOLDER_PATH = '.spark-submit-project'
+# What SSP keeps between runs. Deleted before every cold run.
+PRIVATE_STATE = ['dist', 'lib', 'wheelhouse', 'archive_cache.json', 'requirements.lock']
+
+
+class _ProjectShape:
+    """
+    Holds the shape of the synthetic project.
+    """
+
+    def __init__(self, args):
+        """
+        :param args: The parsed command line arguments.
+        """
+        self.packages = args.packages
+        self.files_per_package = args.files_per_package
+        self.file_sizes = [int(size) for size in args.file_sizes.split(',')]
+        self.include_lines = args.include_lines
+        self.asset_dirs = args.asset_dirs
+        self.asset_dir_size = args.asset_dir_size
+        self.wheels = args.wheels
+        self.seed = args.seed
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class _SyntheticProject:
+    """
+    Generates a project for SSP with the shape of a _ProjectShape.
+    """
+
+    def __init__(self, project_dir, shape: _ProjectShape):
+        """
+        :param project_dir: The directory the project is generated in.
+        :param shape: The shape of the project.
+        """
+        self.project_dir = project_dir
+        self.shape = shape
+        self.random = random.Random(shape.seed)
+        self.source_bytes = 0
+        self.source_files = 0
+
+    def _write_source_file(self, path, size):
+        """
+        Writes a python file of about `size` bytes.
+
+        :param path: Complete filename of the file.
+        :param size: The size of the file.
+        :return: None.
+        """
+        lines = []
+        length = 0
+        while length < size:
+            line = f"value_{len(lines)} = {self.random.randint(0, 1 << 30)}  # {self.random.random()}\n"
+            lines.append(line)
+            length += len(line)
+
+        with open(path, 'w') as file:
+            file.write(''.join(lines))
+
+        self.source_bytes += length
+        self.source_files += 1
+
+    def _write_wheel(self, wheelhouse_dir, name):
+        """
+        Writes a pure python wheel holding a single module.
+
+        :param wheelhouse_dir: The directory the wheel is written to.
+        :param name: The name of the distribution and of its module.
+        :return: None.
+        """
+        dist_info = f"{name}-1.0.dist-info"
+        files = {
+            f"{name}/__init__.py": b"VERSION = '1.0'\n",
+            f"{dist_info}/METADATA": f"Metadata-Version: 2.1\nName: {name}\nVersion: 1.0\n".encode(),
+            f"{dist_info}/WHEEL": b"Wheel-Version: 1.0\nGenerator: ssp-benchmark\nRoot-Is-Purelib: true\n"
+                                  b"Tag: py3-none-any\n",
+        }
+
+        record = []
+        for (archive_name, data) in files.items():
+            digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b'=').decode()
+            record.append(f"{archive_name},sha256={digest},{len(data)}")
+        record.append(f"{dist_info}/RECORD,,")
+        files[f"{dist_info}/RECORD"] = ('\n'.join(record) + '\n').encode()
+
+        with zipfile.ZipFile(os.path.join(wheelhouse_dir, f"{name}-1.0-py3-none-any.whl"), 'w') as wheel:
+            for (archive_name, data) in files.items():
+                wheel.writestr(archive_name, data)
+
+    def generate(self):
+        """
+        Writes the project, with SSP's private folder copied from the dist directories of this repository.
+
+        :return: None.
+        """
+        shape = self.shape
+        os.makedirs(self.project_dir)
+        shutil.copytree(SSP_DIR, os.path.join(self.project_dir, PRIVATE_FOLDER_PATH))
+        for entry in os.scandir(SSP_COMMON_DIR):
+            if entry.is_file():
+                shutil.copy2(entry.path, os.path.join(self.project_dir, PRIVATE_FOLDER_PATH))
+
+        def path(*names):
+            return os.path.join(self.project_dir, *names)
+
+        with open(path('main.py'), 'w') as file:
+            file.write("print('main')\n")
+
+        for package in range(shape.packages):
+            package_dir = path('src', f"package_{package}")
+            os.makedirs(package_dir)
+            for module in range(shape.files_per_package):
+                self._write_source_file(os.path.join(package_dir, f"module_{module}.py"),
+                                        self.random.choice(shape.file_sizes))
+
+        os.makedirs(path('include'))
+        os.makedirs(path('include', 'files'))
+        code_lines = []
+        asset_lines = []
+        for line in range(shape.include_lines):
+            code_file = os.path.join('include', 'files', f"included_{line}.py")
+            self._write_source_file(path(code_file), self.random.choice(shape.file_sizes))
+            code_lines.append(code_file)
+
+            asset_file = os.path.join('include', 'files', f"asset_{line}.txt")
+            with open(path(asset_file), 'w') as file:
+                file.write(f"asset {line}\n")
+            asset_lines.append(asset_file)
+
+        with open(path('include', 'code.txt'), 'w') as file:
+            file.write('\n'.join(code_lines) + '\n')
+        with open(path('include', 'assets.txt'), 'w') as file:
+            file.write('\n'.join(asset_lines) + '\n')
+
+        for asset_dir in range(shape.asset_dirs):
+            directory = path('include', 'assets', f"asset_dir_{asset_dir}")
+            os.makedirs(directory)
+            # Half of the bytes compress well and half do not, like text data next to images.
+            with open(os.path.join(directory, 'data.csv'), 'w') as file:
+                file.write('id,value\n' * (shape.asset_dir_size // 18))
+            with open(os.path.join(directory, 'data.bin'), 'wb') as file:
+                file.write(self.random.getrandbits(8 * (shape.asset_dir_size // 2)).to_bytes(shape.asset_dir_size // 2,
+                                                                                            'little'))
+
+        wheelhouse_dir = path('wheels')
+        os.makedirs(wheelhouse_dir)
+        requirement_lines = ['--no-index', f"--find-links {wheelhouse_dir}"]
+        for wheel in range(shape.wheels):
+            self._write_wheel(wheelhouse_dir, f"benchmark_dependency_{wheel}")
+            requirement_lines.append(f"benchmark_dependency_{wheel}")
+        with open(path('requirements.txt'), 'w') as file:
+            file.write('\n'.join(requirement_lines) + '\n')
+
+        config_filename = path(PRIVATE_FOLDER_PATH, 'ssp.conf')
+        with open(config_filename) as file:
+            config = file.read()
+        for (key, value) in [('Include Code File', os.path.join('include', 'code.txt')),
+                             ('Include Assets File', os.path.join('include', 'assets.txt')),
+                             ('Include Assets Directory', os.path.join('include', 'assets')),
+                             ('Source Code Directory', 'src'),
+                             ('Use Shared Wheel Store', 'False'),
+                             ('Level', '30')]:
+            config = '\n'.join(f"{key} = {value}" if line.split('=')[0].strip() == key else line
+                               for line in config.split('\n'))
+        with open(config_filename, 'w') as file:
+            file.write(config)
+
+    def create_stub_spark_submit(self) -> str:
+        """
+        Writes a spark-submit that does nothing.
+
+        :return: Type[str] the directory the stub is in, to be added to the PATH.
+        """
+        bin_dir = os.path.join(self.project_dir, 'bin')
+        os.makedirs(bin_dir)
+        if os.name == 'nt':
+            with open(os.path.join(bin_dir, 'spark-submit.bat'), 'w') as file:
+                file.write('@exit /b 0\n')
+        else:
+            stub = os.path.join(bin_dir, 'spark-submit')
+            with open(stub, 'w') as file:
+                file.write('#!/bin/sh\nexit 0\n')
+            os.chmod(stub, 0o755)
+        return bin_dir
+
+    def touch_one_file(self):
+        """
+        Changes one source file, so that one package has to be archived again.
+
+        :return: None.
+        """
+        package = self.random.randrange(self.shape.packages)
+        with open(os.path.join(self.project_dir, 'src', f"package_{package}", 'module_0.py'), 'a') as file:
+            file.write(f"changed = {self.random.random()}\n")
+
+    def clean(self):
+        """
+        Deletes everything SSP keeps between runs.
+
+        :return: None.
+        """
+        for name in PRIVATE_STATE:
+            path = os.path.join(self.project_dir, PRIVATE_FOLDER_PATH, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.isfile(path):
+                os.remove(path)
+
+
+class _Benchmark:
+    """
+    Runs SSP on a synthetic project and collects the timings.
+    """
+
+    SCENARIOS = ['cold', 'warm', 'incremental']
+
+    def __init__(self, project: _SyntheticProject, runs, jobs):
+        """
+        :param project: The generated project.
+        :param runs: The number of timed runs of every scenario.
+        :param jobs: The value of SSP's '--jobs' argument, 0 for the value of the config file.
+        """
+        self.project = project
+        self.runs = runs
+        self.jobs = jobs
+        self.env = dict(os.environ)
+        self.env['PATH'] = project.create_stub_spark_submit() + os.pathsep + self.env['PATH']
+
+    def _run_ssp(self) -> (float, dict):
+        """
+        Runs SSP once.
+
+        :return: Type(float, dict) the time the run took, and the metrics SSP wrote.
+        """
+        command = [sys.executable, os.path.join(PRIVATE_FOLDER_PATH, 'spark-submit-project.py')]
+        if self.jobs > 0:
+            command += ['--jobs', str(self.jobs)]
+        command.append('main.py')
+
+        started = time.perf_counter()
+        completed = subprocess.run(command, cwd=self.project.project_dir, env=self.env, stdout=subprocess.DEVNULL)
+        wall_seconds = time.perf_counter() - started
+
+        if completed.returncode != 0:
+            raise RuntimeError(f"SSP exited with {completed.returncode}.")
+
+        metrics_file = os.path.join(self.project.project_dir, PRIVATE_FOLDER_PATH, 'metrics.json')
+        with open(metrics_file) as file:
+            return wall_seconds, json.load(file)
+
+    def run_scenario(self, scenario) -> [dict]:
+        """
+        Runs a scenario `self.runs` times.
+
+        :param scenario: One of SCENARIOS.
+        :return: Type[dict] the wall time and stage times of every run.
+        """
+        results = []
+        if scenario != 'cold':
+            self._run_ssp()
+
+        for _ in range(self.runs):
+            if scenario == 'cold':
+                self.project.clean()
+            elif scenario == 'incremental':
+                self.project.touch_one_file()
+
+            wall_seconds, metrics = self._run_ssp()
+            stages = {}
+            archived_bytes = 0
+            for stage in metrics['stages']:
+                name = 'archive' if stage['name'].startswith('archive ') else stage['name']
+                stages[name] = stages.get(name, 0.0) + stage['wall_seconds']
+                if name == 'archive':
+                    archived_bytes += stage['bytes_read']
+            results.append({'wall_seconds': wall_seconds, 'stages': stages, 'archived_bytes': archived_bytes})
+
+        return results
+
+
+def _percentile(values, percent) -> float:
+    """
+    Returns the nearest-rank percentile of the values.
+
+    :param values: The values.
+    :param percent: The percentile, from 0 to 100.
+    :return: Type[float]
+    """
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+def _summarize(runs) -> dict:
+    """
+    Summarizes the runs of a scenario.
+
+    :param runs: The runs returned by `_Benchmark.run_scenario`.
+    :return: Type[dict]
+    """
+    wall_times = [run['wall_seconds'] for run in runs]
+    stage_names = sorted({name for run in runs for name in run['stages']})
+    archive_seconds = sum(run['stages'].get('archive', 0.0) for run in runs)
+    archived_bytes = sum(run['archived_bytes'] for run in runs)
+
+    return {
+        'runs': len(runs),
+        'p50': _percentile(wall_times, 50),
+        'p90': _percentile(wall_times, 90),
+        'p99': _percentile(wall_times, 99),
+        'max': max(wall_times),
+        'runs_per_second': len(runs) / sum(wall_times),
+        'archive_mib_per_second': archived_bytes / (1 << 20) / archive_seconds if archived_bytes > 0 else None,
+        'stages': {name: sum(run['stages'].get(name, 0.0) for run in runs) / len(runs) for name in stage_names},
+    }
+
+
+def _print_table(summaries, baseline=None):
+    """
+    Prints the summaries, with their change from the baseline.
+
+    :param summaries: The summary of every scenario.
+    :param baseline: The summaries of an earlier result, None to not compare.
+    :return: None.
+    """
+    print(f"{'Scenario':<12} {'Runs':>5} {'p50 (s)':>9} {'p90 (s)':>9} {'p99 (s)':>9} {'Max (s)':>9} "
+          f"{'Archive MiB/s':>14} {'vs baseline':>12}")
+    for (scenario, summary) in summaries.items():
+        throughput = summary['archive_mib_per_second']
+        change = ''
+        if baseline is not None and scenario in baseline:
+            change = f"{(summary['p50'] / baseline[scenario]['p50'] - 1) * 100:+.1f}%"
+        print(f"{scenario:<12} {summary['runs']:>5} {summary['p50']:>9.3f} {summary['p90']:>9.3f} "
+              f"{summary['p99']:>9.3f} {summary['max']:>9.3f} "
+              f"{'-' if throughput is None else f'{throughput:.1f}':>14} {change:>12}")
+
+    print()
+    for (scenario, summary) in summaries.items():
+        stages = ', '.join(f"{name} {seconds:.3f}s" for (name, seconds) in summary['stages'].items())
+        print(f"{scenario:<12} mean stages: {stages}")
+
+
+def _get_version() -> str:
+    """
+    Names the version being benchmarked after the git commit of the repository, if there is one.
+
+    :return: Type[str]
+    """
+    try:
+        completed = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=REPOSITORY_DIR,
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+        if completed.returncode == 0:
+            return completed.stdout.strip()
+    except OSError:
+        pass
+    return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the time SSP takes to prepare a submission.")
+    parser.add_argument('--packages', type=int, default=10, help="Top level packages in the Source Code Directory.")
+    parser.add_argument('--files-per-package', type=int, default=20, help="Python files in every package.")
+    parser.add_argument('--file-sizes', default='512,2048,8192,65536',
+                        help="Comma separated sizes in bytes, every file gets one of them at random.")
+    parser.add_argument('--include-lines', type=int, default=20,
+                        help="Lines in the Include Code File and in the Include Assets File.")
+    parser.add_argument('--asset-dirs', type=int, default=2, help="Directories in the Include Assets Directory.")
+    parser.add_argument('--asset-dir-size', type=int, default=4 << 20, help="Bytes in every asset directory.")
+    parser.add_argument('--wheels', type=int, default=5, help="Requirements, served from a local wheelhouse.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the generated contents.")
+    parser.add_argument('--runs', type=int, default=5, help="Timed runs of every scenario.")
+    parser.add_argument('--jobs', type=int, default=0, help="SSP's --jobs, 0 for the value in ssp.conf.")
+    parser.add_argument('--scenarios', default=','.join(_Benchmark.SCENARIOS),
+                        help="Comma separated scenarios to run: cold, warm and incremental.")
+    parser.add_argument('--compare', help="A stored result to compare against.")
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help="Exit with 1 if the p50 of a scenario is this many percent slower than in --compare.")
+    parser.add_argument('--no-save', action='store_true', help="Do not store the result.")
+    args = parser.parse_args()
+
+    shape = _ProjectShape(args)
+    scenarios = [scenario.strip() for scenario in args.scenarios.split(',')]
+    for scenario in scenarios:
+        if scenario not in _Benchmark.SCENARIOS:
+            parser.error(f"Unknown scenario '{scenario}'.")
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = json.load(file)['summaries']
+
+    with tempfile.TemporaryDirectory(prefix='ssp-benchmark-') as temp_dir:
+        project = _SyntheticProject(os.path.join(temp_dir, 'project'), shape)
+        project.generate()
+        print(f"Generated {project.source_files} source files, {project.source_bytes / (1 << 20):.1f} MiB.")
+
+        benchmark = _Benchmark(project, args.runs, args.jobs)
+        summaries = {}
+        for scenario in scenarios:
+            summaries[scenario] = _summarize(benchmark.run_scenario(scenario))
+
+    print()
+    _print_table(summaries, baseline)
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        version = _get_version()
+        result_file = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{version}.json")
+        with open(result_file, 'w') as file:
+            json.dump({'version': version, 'python': sys.version.split()[0], 'shape': shape.to_dict(),
+                       'runs': args.runs, 'jobs': args.jobs, 'summaries': summaries}, file, indent=2)
+        print(f"\nStored the result in {result_file}")
+
+    if baseline is not None:
+        regressions = [scenario for (scenario, summary) in summaries.items() if scenario in baseline and
+                       summary['p50'] > baseline[scenario]['p50'] * (1 + args.threshold / 100)]
+        if len(regressions) > 0:
+            print(f"\nRegressed by more than {args.threshold}%: {', '.join(regressions)}")
+            exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5592 @@
+import abc
+import logging
+import sys
+import os
+import zipfile
+import shutil
+import subprocess
+import configparser
+import concurrent.futures
+import hashlib
+import importlib.util
+import json
+import tempfile
+import re
+import threading
+import time
+
+
+PRIVATE_FOLDER_PATH = '.spark-submit-project'
+CONFIGURATION_FILENAME = os.path.join(PRIVATE_FOLDER_PATH, 'ssp.conf')
+WHEELHOUSE_DIR = os.path.join(PRIVATE_FOLDER_PATH, 'wheelhouse')
+# The commands that may be passed to ssp.sh in place of the args of spark-submit. 'plan' and 'init' are not in the
+# list, 'plan' goes with the args of spark-submit and 'init' is run by ssp.sh itself.
+SSP_COMMANDS = ['watch', 'batch', 'gc', 'sizes']
+# Spark properties whose value is a list of paths. The paths SSP needs are appended to the value passed to this script,
+# or set in the Spark properties file, instead of replacing it.
+PATH_LIST_SPARK_CONF_KEYS = ['spark.executorEnv.PYTHONPATH']
+# The spark-submit options that take no value. Every other option before the application file is followed by its
+# value, unless it is passed as '--name=value'.
+SPARK_SUBMIT_FLAGS = ['--verbose', '-v', '--help', '-h', '--version', '--supervise']
+# Shown by 'plan' in place of what is only known once the files are built, e.g. the hash of an archive.
+PLAN_PLACEHOLDER = '<unknown>'
+
+
+class _PathConfigurationKeys:
+    """
+    Holds the key names for file paths section of the config file.
+    """
+
+    def __init__(self):
+        pass
+
+    SECTION_NAME = 'PATHS'
+
+    LIBRARIES_DIR = 'Libraries Directory'
+    DISTRIBUTION_DIR = 'Distribution Directory'
+    SOURCE_CODE_DIR = 'Source Code Directory'
+    REQUIREMENTS_FILE = 'Requirements File'
+    INCLUDE_CODE_DIR = 'Include Code Directory'
+    INCLUDE_ASSETS_DIR = 'Include Assets Directory'
+    INCLUDE_CODE_FILE = 'Include Code File'
+    INCLUDE_ASSETS_FILE = 'Include Assets File'
+
+    def get_keys_list(self) -> [str]:
+        """
+        Returns all the key names in a list.
+
+        :return: Type[str]
+        """
+        return [self.LIBRARIES_DIR, self.DISTRIBUTION_DIR, self.SOURCE_CODE_DIR, self.REQUIREMENTS_FILE,
+                self.INCLUDE_CODE_FILE, self.INCLUDE_CODE_DIR, self.INCLUDE_ASSETS_FILE, self.INCLUDE_ASSETS_DIR]
+
+
+class _OptionsConfigurationKeys:
+    """
+    Holds key names for the [OPTIONS] section of config file.
+    """
+
+    def __init__(self):
+        pass
+
+    SECTION_NAME = 'OPTIONS'
+
+    USE_ARCHIVE_ARG = 'Use Archive Argument'
+    USE_ARCHIVE_CACHE = 'Use Archive Cache'
+    USE_REQUIREMENTS_LOCK = 'Use Requirements Lock'
+    JOBS = 'Jobs'
+    REPRODUCIBLE_ARCHIVES = 'Reproducible Archives'
+    CONSOLIDATE_PY_FILES = 'Consolidate Py Files'
+    COMPRESSION_LEVEL = 'Compression Level'
+    WRITE_METRICS = 'Write Metrics'
+    PRINT_METRICS_SUMMARY = 'Print Metrics Summary'
+    USE_MANIFEST = 'Use Manifest'
+    FAIL_ON_CONFLICTS = 'Fail On Conflicts'
+    PRUNE_UNUSED_CODE = 'Prune Unused Code'
+    PRUNE_ALLOWLIST = 'Prune Allowlist'
+    PACK_VIRTUAL_ENVIRONMENT = 'Pack Virtual Environment'
+    VIRTUAL_ENVIRONMENT_ALIAS = 'Virtual Environment Alias'
+    ARTIFACT_STORE = 'Artifact Store'
+    BATCH_CONCURRENCY = 'Batch Concurrency'
+    SUBMIT_TIMEOUT = 'Submit Timeout'
+    OUTPUT_TIMEOUT = 'Output Timeout'
+    FATAL_OUTPUT_PATTERNS = 'Fatal Output Patterns'
+    PRECOMPILE_BYTECODE = 'Precompile Bytecode'
+    BYTECODE_PYTHON = 'Bytecode Python'
+    DROP_SOURCES = 'Drop Sources'
+    SIZE_BUDGETS = 'Size Budgets'
+    FAIL_ON_SIZE_BUDGETS = 'Fail On Size Budgets'
+    PRINT_SIZE_REPORT = 'Print Size Report'
+    USE_BUILD_GENERATIONS = 'Use Build Generations'
+    EXECUTOR_EXTRACTION_CACHE = 'Executor Extraction Cache'
+    USE_SHARED_WHEEL_STORE = 'Use Shared Wheel Store'
+    SHARED_WHEEL_STORE_DIRECTORY = 'Shared Wheel Store Directory'
+
+    # Keys whose values are either 'True' or 'False', and keys whose values are integers.
+    BOOLEAN_KEYS = [USE_ARCHIVE_ARG, USE_ARCHIVE_CACHE, USE_REQUIREMENTS_LOCK, REPRODUCIBLE_ARCHIVES,
+                    CONSOLIDATE_PY_FILES, WRITE_METRICS, PRINT_METRICS_SUMMARY, USE_MANIFEST, FAIL_ON_CONFLICTS,
+                    PRUNE_UNUSED_CODE, PACK_VIRTUAL_ENVIRONMENT, PRECOMPILE_BYTECODE, DROP_SOURCES,
+                    FAIL_ON_SIZE_BUDGETS, PRINT_SIZE_REPORT, USE_BUILD_GENERATIONS, USE_SHARED_WHEEL_STORE]
+    INTEGER_KEYS = [JOBS, COMPRESSION_LEVEL, BATCH_CONCURRENCY, SUBMIT_TIMEOUT, OUTPUT_TIMEOUT]
+
+    def get_keys_list(self) -> [str]:
+        """
+        Returns all the key names in a list, in the order of the config file.
+
+        :return: Type[str]
+        """
+        return [self.USE_ARCHIVE_ARG, self.USE_ARCHIVE_CACHE, self.USE_REQUIREMENTS_LOCK, self.JOBS,
+                self.REPRODUCIBLE_ARCHIVES, self.CONSOLIDATE_PY_FILES, self.COMPRESSION_LEVEL, self.WRITE_METRICS,
+                self.PRINT_METRICS_SUMMARY, self.USE_MANIFEST, self.FAIL_ON_CONFLICTS, self.PRUNE_UNUSED_CODE,
+                self.PRUNE_ALLOWLIST, self.PACK_VIRTUAL_ENVIRONMENT, self.VIRTUAL_ENVIRONMENT_ALIAS,
+                self.ARTIFACT_STORE, self.BATCH_CONCURRENCY, self.SUBMIT_TIMEOUT, self.OUTPUT_TIMEOUT,
+                self.FATAL_OUTPUT_PATTERNS, self.PRECOMPILE_BYTECODE, self.BYTECODE_PYTHON, self.DROP_SOURCES,
+                self.SIZE_BUDGETS, self.FAIL_ON_SIZE_BUDGETS, self.PRINT_SIZE_REPORT, self.USE_BUILD_GENERATIONS,
+                self.EXECUTOR_EXTRACTION_CACHE, self.USE_SHARED_WHEEL_STORE, self.SHARED_WHEEL_STORE_DIRECTORY]
+
+    def get_required_keys_list(self) -> [str]:
+        """
+        Returns the key names that have no default value in a list.
+
+        :return: Type[str]
+        """
+        return [self.USE_ARCHIVE_ARG]
+
+    def get_value_errors_message(self) -> str:
+        """
+        Describes the values the keys of `get_keys_list` must have.
+
+        :return: Type[str]
+        """
+        def join(names):
+            names = [f"'{name}'" for name in names]
+            return ' and '.join([', '.join(names[:-1]), names[-1]]) if len(names) > 1 else ''.join(names)
+
+        keys_list = self.get_keys_list()
+        return (f"Make sure that the values of {join([key for key in keys_list if key in self.BOOLEAN_KEYS])} are "
+                f"either 'True' or 'False', that the values of "
+                f"{join([key for key in keys_list if key in self.INTEGER_KEYS])} are integers, that the value of "
+                f"'{self.COMPRESSION_LEVEL}' is from 0 to 9, and that every line of '{self.SIZE_BUDGETS}' is one of "
+                f"{', '.join(_SizeReport.CATEGORIES)} or total, '=' and a size, e.g. 'wheels = 200 MiB'.")
+
+
+class _Paths:
+    """
+    Represents all the paths used in this script.
+
+    Uses _PathConfigurationKeys class to read the config file.
+    """
+
+    def __init__(self, config_filename):
+        """
+        Reads the `config_filename` file using the _PathConfigurationKeys and stores them in an instance of itself.
+
+        :param config_filename: complete filename of the config file.
+        """
+
+        keys = _PathConfigurationKeys()
+
+        conf = configparser.ConfigParser()
+        conf.read(config_filename)
+
+        try:
+            conf = conf[keys.SECTION_NAME]
+
+            self.libraries_dir = conf[keys.LIBRARIES_DIR]
+            self.distribution_dir = conf[keys.DISTRIBUTION_DIR]
+            self.source_code_dir = conf[keys.SOURCE_CODE_DIR]
+            self.requirements_file = conf[keys.REQUIREMENTS_FILE]
+            self.include_code_dir = conf[keys.INCLUDE_CODE_DIR]
+            self.include_code_file = conf[keys.INCLUDE_CODE_FILE]
+            self.include_assets_dir = conf[keys.INCLUDE_ASSETS_DIR]
+            self.include_assets_file = conf[keys.INCLUDE_ASSETS_FILE]
+
+        except KeyError:
+
+            keys_list_str = '\n'.join(keys.get_keys_list())
+
+            logging.error(
+                f"\n  Configuration for one or more paths was missing.\n  Ensure that '{CONFIGURATION_FILENAME}' "
+                f"has all the required paths in the [{keys.SECTION_NAME}] section.\n  "
+                f"\n  The list of required keys is:\n  [{keys.SECTION_NAME}]\n  {keys_list_str}\n  "
+            )
+            exit(1)
+
+
+class _Options:
+    """
+    Represents all the options used in this script.
+
+    Uses _OptionsConfigurationKeys class to read the config file.
+    """
+
+    def __init__(self, config_filename):
+        """
+        Reads the `config_filename` file using the _OptionsConfigurationKeys and stores them in an instance of itself.
+
+        :param config_filename: complete filename of the config file.
+        """
+
+        keys = _OptionsConfigurationKeys()
+
+        conf = configparser.ConfigParser()
+        conf.read(config_filename)
+
+        try:
+            conf = conf[keys.SECTION_NAME]
+
+            self.use_archive_arg = conf.getboolean(keys.USE_ARCHIVE_ARG)
+            self.use_archive_cache = conf.getboolean(keys.USE_ARCHIVE_CACHE, fallback=True)
+            self.use_requirements_lock = conf.getboolean(keys.USE_REQUIREMENTS_LOCK, fallback=True)
+            self.jobs = conf.getint(keys.JOBS, fallback=0)
+            self.reproducible_archives = conf.getboolean(keys.REPRODUCIBLE_ARCHIVES, fallback=True)
+            self.consolidate_py_files = conf.getboolean(keys.CONSOLIDATE_PY_FILES, fallback=False)
+            self.compression_level = conf.getint(keys.COMPRESSION_LEVEL, fallback=_ZipWriter.DEFAULT_COMPRESSION_LEVEL)
+            self.write_metrics = conf.getboolean(keys.WRITE_METRICS, fallback=True)
+            self.print_metrics_summary = conf.getboolean(keys.PRINT_METRICS_SUMMARY, fallback=False)
+            self.use_manifest = conf.getboolean(keys.USE_MANIFEST, fallback=True)
+            self.fail_on_conflicts = conf.getboolean(keys.FAIL_ON_CONFLICTS, fallback=False)
+            self.prune_unused_code = conf.getboolean(keys.PRUNE_UNUSED_CODE, fallback=False)
+            self.prune_allowlist = [name.strip() for name in conf.get(keys.PRUNE_ALLOWLIST, fallback='').split(',')
+                                    if name.strip() != '']
+            self.pack_virtual_environment = conf.getboolean(keys.PACK_VIRTUAL_ENVIRONMENT, fallback=False)
+            self.virtual_environment_alias = conf.get(keys.VIRTUAL_ENVIRONMENT_ALIAS, fallback='environment')
+            self.artifact_store = conf.get(keys.ARTIFACT_STORE, fallback='').strip()
+            self.batch_concurrency = conf.getint(keys.BATCH_CONCURRENCY, fallback=1)
+            self.submit_timeout = conf.getint(keys.SUBMIT_TIMEOUT, fallback=0)
+            self.output_timeout = conf.getint(keys.OUTPUT_TIMEOUT, fallback=0)
+            self.fatal_output_patterns = [pattern.strip() for pattern in
+                                          conf.get(keys.FATAL_OUTPUT_PATTERNS, fallback='').splitlines()
+                                          if pattern.strip() != '']
+            self.precompile_bytecode = conf.getboolean(keys.PRECOMPILE_BYTECODE, fallback=False)
+            self.bytecode_python = conf.get(keys.BYTECODE_PYTHON, fallback='').strip()
+            self.drop_sources = conf.getboolean(keys.DROP_SOURCES, fallback=False)
+            self.size_budgets = _SizeReport.parse_budgets(conf.get(keys.SIZE_BUDGETS, fallback='').splitlines())
+            self.fail_on_size_budgets = conf.getboolean(keys.FAIL_ON_SIZE_BUDGETS, fallback=False)
+            self.print_size_report = conf.getboolean(keys.PRINT_SIZE_REPORT, fallback=False)
+            self.use_build_generations = conf.getboolean(keys.USE_BUILD_GENERATIONS, fallback=True)
+            self.executor_extraction_cache = conf.get(keys.EXECUTOR_EXTRACTION_CACHE, fallback='').strip()
+            self.use_shared_wheel_store = conf.getboolean(keys.USE_SHARED_WHEEL_STORE, fallback=True)
+            self.shared_wheel_store_directory = conf.get(keys.SHARED_WHEEL_STORE_DIRECTORY, fallback='').strip()
+
+            if not 0 <= self.compression_level <= 9:
+                raise ValueError(f"'{keys.COMPRESSION_LEVEL}' must be from 0 to 9.")
+
+        except KeyError:
+
+            keys_list_str = '\n'.join(keys.get_required_keys_list())
+
+            logging.error(
+                f"\n  Configuration for one or more paths was missing.\n  Ensure that '{CONFIGURATION_FILENAME}' "
+                f"has all the required paths in the [{keys.SECTION_NAME}] section.\n  "
+                f"\n  The list of required keys is:\n  [{keys.SECTION_NAME}]\n  {keys_list_str}\n  "
+            )
+            exit(1)
+        except (ValueError, TypeError):
+            logging.error(f"Unable to read a key of the [{keys.SECTION_NAME}] Section. "
+                          f"{keys.get_value_errors_message()}")
+            exit(1)
+
+    def get_jobs(self) -> int:
+        """
+        Returns the number of worker processes to archive directories with. A value of 0 or less means one worker per
+        CPU.
+
+        :return: Type[int]
+        """
+        if self.jobs > 0:
+            return self.jobs
+        return os.cpu_count() or 1
+
+
+class _IgnoreRules:
+    """
+    Holds the gitignore-style rules of the '.sspignore' file of the project directory, which leave files and
+    directories out of the archives and of the dependencies.
+
+    Every pattern is compiled to a regular expression once. Like with git, the last matching pattern decides, '!'
+    re-includes what an earlier pattern left out, a trailing '/' only matches directories, and a pattern with a '/'
+    anywhere but at its end is matched from the project directory, while others are matched at any depth. The contents
+    of a left out directory are never looked at, so they can not be re-included.
+    """
+
+    FILENAME = '.sspignore'
+
+    # The rules of the last file loaded, by the size and modification time of the file.
+    _loaded = {}
+
+    def __init__(self, patterns, base_dir=os.curdir):
+        """
+        :param patterns: The lines of the ignore file.
+        :param base_dir: The directory the patterns are relative to.
+        """
+        self.base_dir = os.path.abspath(base_dir)
+        self.rules = []
+        for line in patterns:
+            rule = _IgnoreRules._compile(line)
+            if rule is not None:
+                self.rules.append(rule)
+        # None without any rules, so archives made before there was an ignore file stay up to date.
+        self.fingerprint = hashlib.sha256('\n'.join(patterns).encode()).hexdigest() if len(self.rules) > 0 else None
+
+    @staticmethod
+    def load(filename=FILENAME) -> '_IgnoreRules':
+        """
+        Reads the ignore file, unless it did not change since it was last read.
+
+        :param filename: The complete filename of the ignore file.
+        :return: Type[_IgnoreRules] no rules if there is no ignore file.
+        """
+        try:
+            stat = os.stat(filename)
+            key = (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            return _IgnoreRules([])
+
+        if key not in _IgnoreRules._loaded:
+            with open(filename, 'r') as file:
+                _IgnoreRules._loaded = {key: _IgnoreRules(file.read().splitlines(), os.path.dirname(key[0]))}
+        return _IgnoreRules._loaded[key]
+
+    @staticmethod
+    def _compile(line):
+        """
+        Compiles a line of the ignore file.
+
+        :param line: The line.
+        :return: Type[(re.Pattern, bool, bool)] the pattern, whether it re-includes what it matches, and whether it
+            only matches directories. None for blank lines and comments.
+        """
+        pattern = line.rstrip()
+        if pattern == '' or pattern.startswith('#'):
+            return None
+
+        negated = pattern.startswith('!')
+        if negated or pattern.startswith('\\'):
+            pattern = pattern[1:]
+
+        directory_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        anchored = '/' in pattern
+        pattern = pattern.lstrip('/')
+
+        regex = ''
+        idx = 0
+        while idx < len(pattern):
+            if pattern.startswith('**/', idx):
+                regex += '(?:.*/)?'
+                idx += 3
+            elif pattern.startswith('**', idx):
+                regex += '.*'
+                idx += 2
+            elif pattern[idx] == '*':
+                regex += '[^/]*'
+                idx += 1
+            elif pattern[idx] == '?':
+                regex += '[^/]'
+                idx += 1
+            elif pattern[idx] == '[' and ']' in pattern[idx + 2:]:
+                end = pattern.index(']', idx + 2)
+                characters = pattern[idx + 1:end].replace('\\', '\\\\')
+                if characters.startswith('!'):
+                    characters = '^' + characters[1:]
+                regex += f"[{characters}]"
+                idx = end + 1
+            else:
+                regex += re.escape(pattern[idx])
+                idx += 1
+
+        return re.compile(('^' if anchored else '^(?:.*/)?') + regex + '$'), negated, directory_only
+
+    def get_relative_path(self, path) -> str:
+        """
+        :param path: A path relative to the current working directory, or an absolute path.
+        :return: Type[str] the path relative to the directory of the ignore file, with '/' separators.
+        """
+        return os.path.relpath(os.path.abspath(path), self.base_dir).replace(os.path.sep, '/')
+
+    def matches(self, relative_path, is_directory) -> bool:
+        """
+        Checks the rules against a path whose parent directories are known not to be left out.
+
+        :param relative_path: The path, as returned by `get_relative_path`.
+        :param is_directory: Whether or not the path is a directory.
+        :return: Type[bool] whether or not the path is left out.
+        """
+        ignored = False
+        for (regex, negated, directory_only) in self.rules:
+            if (is_directory or not directory_only) and regex.match(relative_path):
+                ignored = not negated
+        return ignored
+
+    def is_ignored(self, path, is_directory=None) -> bool:
+        """
+        Checks whether a path, or any of its parent directories, is left out.
+
+        :param path: A path relative to the current working directory, or an absolute path.
+        :param is_directory: Whether or not the path is a directory, None checks the disk.
+        :return: Type[bool]
+        """
+        if len(self.rules) == 0:
+            return False
+
+        relative_path = self.get_relative_path(path)
+        if relative_path.startswith('..'):
+            return False
+        if is_directory is None:
+            is_directory = os.path.isdir(path)
+
+        parts = relative_path.split('/')
+        for idx in range(1, len(parts)):
+            if self.matches('/'.join(parts[:idx]), True):
+                return True
+        return self.matches(relative_path, is_directory)
+
+    def scan(self, directory, excluded_entries=()) -> [(str, os.DirEntry)]:
+        """
+        Lists every file and directory under `directory` that is not left out, in a single traversal. Directories that
+        are left out are not entered, and neither are symbolic links to directories.
+
+        :param directory: The directory to list.
+        :param excluded_entries: Names of top level files and directories of `directory` to leave out too.
+        :return: Type[(str, os.DirEntry)] the path relative to `directory`, with '/' separators, and the entry of
+            every file and directory.
+        """
+        prefix = self.get_relative_path(directory)
+        prefix = '' if prefix == '.' else prefix + '/'
+        use_rules = len(self.rules) > 0 and not prefix.startswith('..')
+
+        entries = []
+        pending_dirs = [('', directory)]
+        while len(pending_dirs) > 0:
+            (relative_dir, path) = pending_dirs.pop()
+            with os.scandir(path) as iterator:
+                for entry in iterator:
+                    relative_path = relative_dir + entry.name
+                    if relative_dir == '' and entry.name in excluded_entries:
+                        continue
+                    if use_rules and self.matches(prefix + relative_path, entry.is_dir()):
+                        continue
+                    entries.append((relative_path, entry))
+                    if entry.is_dir(follow_symlinks=False):
+                        pending_dirs.append((relative_path + '/', entry.path))
+
+        return entries
+
+
+class _ArchiveCache:
+    """
+    Keeps a fingerprint of every directory that was archived, so that directories whose contents did not change are
+    not archived again.
+
+    A directory's fingerprint is made of the relative paths, sizes and modification times of its files. When that
+    does not match, e.g. after a fresh checkout touched every file, a hash of the files' contents is compared before
+    deciding to archive the directory again.
+
+    The fingerprints are stored as json in the private folder.
+    """
+
+    FILENAME = os.path.join(PRIVATE_FOLDER_PATH, 'archive_cache.json')
+    VERSION = 1
+
+    def __init__(self, enabled=True, filename=FILENAME):
+        """
+        Loads the stored fingerprints, if there are any.
+
+        :param enabled: If False, every directory is reported as changed and nothing is stored.
+        :param filename: The json file where the fingerprints are kept.
+        """
+        self.enabled = enabled
+        self.filename = filename
+        self._entries = {}
+
+        if enabled and os.path.isfile(filename):
+            try:
+                with open(filename, 'r') as file:
+                    content = json.load(file)
+                if content.get('version') == _ArchiveCache.VERSION:
+                    self._entries = content.get('entries', {})
+            except (OSError, ValueError):
+                logging.warning(f"Archive cache '{filename}' could not be read. All directories will be archived.")
+
+    @staticmethod
+    def _list_files(scanned_entries) -> [(str, int, int)]:
+        """
+        Lists the files of a directory with their sizes and modification times, sorted by relative path.
+
+        :param scanned_entries: The files and directories of the directory, as returned by `_IgnoreRules.scan`.
+        :return: Type[(str, int, int)] relative path, size and mtime in nanoseconds of each file.
+        """
+        files = []
+        for (relative_path, entry) in scanned_entries:
+            if not entry.is_dir():
+                stat = entry.stat()
+                files.append((relative_path, stat.st_size, stat.st_mtime_ns))
+        files.sort()
+        return files
+
+    @staticmethod
+    def _stat_fingerprint(files) -> str:
+        """
+        Hashes the paths, sizes and modification times returned by `_list_files`.
+
+        :param files: The output of `_list_files`.
+        :return: Type[str]
+        """
+        digest = hashlib.sha256()
+        for (relative_path, size, mtime) in files:
+            digest.update(f"{relative_path}\0{size}\0{mtime}\n".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _content_hash(directory, files) -> str:
+        """
+        Hashes the relative paths and the contents of the files returned by `_list_files`.
+
+        :param directory: The directory the files were listed from.
+        :param files: The output of `_list_files`.
+        :return: Type[str]
+        """
+        digest = hashlib.sha256()
+        for (relative_path, _, _) in files:
+            digest.update(f"{relative_path}\0".encode())
+            with open(os.path.join(directory, relative_path), 'rb') as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _archive_stat(archive_path):
+        """
+        Returns the size and modification time of an archive, or None if the archive does not exist.
+
+        :param archive_path: Complete filename of the archive.
+        :return: Type[int, int] or None.
+        """
+        if not os.path.isfile(archive_path):
+            return None
+        stat = os.stat(archive_path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def is_up_to_date(self, directory, archive_path, excluded_entries=(), ignore_rules=None, bytecode=None,
+                      compression_level=None, reproducible=True) -> bool:
+        """
+        Checks whether `archive_path` still holds the current contents of `directory`, archived with the same settings.
+
+        If only the modification times changed but the contents are the same, the stored fingerprint is refreshed.
+
+        :param directory: The directory that is archived.
+        :param archive_path: Complete filename of the archive made from the directory.
+        :param excluded_entries: The top level files and directories left out of the archive, they are not compared.
+        :param ignore_rules: An instance of _IgnoreRules, the files it leaves out are not compared.
+        :param bytecode: The instance of _Bytecode the archive should be compiled with, None if it is not compiled.
+        :param compression_level: The deflate level the archive should be written with, see _ZipWriter. None for
+            _ZipWriter's default.
+        :param reproducible: Whether or not the archive should be written in reproducible mode, see _ZipWriter.
+        :return: Type[bool]
+        """
+        if not self.enabled:
+            return False
+
+        if compression_level is None:
+            compression_level = _ZipWriter.DEFAULT_COMPRESSION_LEVEL
+
+        entry = self._entries.get(archive_path)
+        archive_stat = _ArchiveCache._archive_stat(archive_path)
+        if entry is None or archive_stat is None or entry.get('archive') != archive_stat \
+                or entry.get('source') != os.path.abspath(directory) \
+                or entry.get('excluded_entries', []) != list(excluded_entries) \
+                or entry.get('ignore_rules') != (ignore_rules.fingerprint if ignore_rules is not None else None) \
+                or entry.get('bytecode') != (bytecode.fingerprint if bytecode is not None else None) \
+                or entry.get('compression_level') != compression_level or entry.get('reproducible') != reproducible:
+            return False
+
+        files = _ArchiveCache._list_files((ignore_rules or _IgnoreRules([])).scan(directory, excluded_entries))
+        stat_fingerprint = _ArchiveCache._stat_fingerprint(files)
+        if entry.get('stat_fingerprint') == stat_fingerprint:
+            return True
+
+        if entry.get('content_hash') == _ArchiveCache._content_hash(directory, files):
+            entry['stat_fingerprint'] = stat_fingerprint
+            return True
+
+        return False
+
+    @staticmethod
+    def create_entry(directory, scanned_entries, ignore_rules=None, bytecode=None, compression_level=None,
+                     reproducible=True) -> dict:
+        """
+        Computes the fingerprint of `directory`. It should be computed before the directory is archived, so that
+        files changed while archiving are noticed on the next run.
+
+        :param directory: The directory that is going to be archived.
+        :param scanned_entries: The files and directories that are going to be archived, as returned by
+            `_IgnoreRules.scan`.
+        :param ignore_rules: The instance of _IgnoreRules the entries were scanned with.
+        :param bytecode: The instance of _Bytecode the directory is going to be compiled with, if any.
+        :param compression_level: The deflate level the directory is going to be archived with, see _ZipWriter. None
+            for _ZipWriter's default.
+        :param reproducible: Whether or not the directory is going to be archived in reproducible mode.
+        :return: Type[dict]
+        """
+        if compression_level is None:
+            compression_level = _ZipWriter.DEFAULT_COMPRESSION_LEVEL
+
+        files = _ArchiveCache._list_files(scanned_entries)
+        entry = {
+            'source': os.path.abspath(directory),
+            'stat_fingerprint': _ArchiveCache._stat_fingerprint(files),
+            'content_hash': _ArchiveCache._content_hash(directory, files),
+            'compression_level': compression_level,
+            'reproducible': reproducible,
+        }
+        if ignore_rules is not None and ignore_rules.fingerprint is not None:
+            entry['ignore_rules'] = ignore_rules.fingerprint
+        if bytecode is not None:
+            entry['bytecode'] = bytecode.fingerprint
+        return entry
+
+    def update(self, archive_path, entry):
+        """
+        Stores the fingerprint of a directory after it was archived into `archive_path`.
+
+        :param archive_path: Complete filename of the archive made from the directory.
+        :param entry: The fingerprint of the directory, as returned by `create_entry`.
+        :return: None.
+        """
+        if not self.enabled or entry is None:
+            return
+
+        self._entries[archive_path] = dict(entry, archive=_ArchiveCache._archive_stat(archive_path))
+
+    @staticmethod
+    def _files_fingerprint(file_paths) -> str:
+        """
+        Hashes the paths, sizes and modification times of a list of files.
+
+        :param file_paths: Complete filenames of the files.
+        :return: Type[str]
+        """
+        files = []
+        for path in file_paths:
+            stat = os.stat(path)
+            files.append((os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+        return _ArchiveCache._stat_fingerprint(files)
+
+    def get_files_entry(self, file_paths, archive_path, **settings) -> dict:
+        """
+        Returns what was stored by `update_files_entry` for an archive made from a list of files, if neither the
+        files nor the archive changed since, and the archive was made with the same settings.
+
+        :param file_paths: Complete filenames of the files the archive is made from.
+        :param archive_path: Complete filename of the archive.
+        :param settings: What the archive should have been made with, e.g. its compression level, compared with the
+            values stored by `update_files_entry`.
+        :return: Type[dict] or None.
+        """
+        if not self.enabled:
+            return None
+
+        entry = self._entries.get(archive_path)
+        if entry is None or entry.get('archive') != _ArchiveCache._archive_stat(archive_path) \
+                or entry.get('files_fingerprint') != _ArchiveCache._files_fingerprint(file_paths) \
+                or any(entry.get(key) != value for (key, value) in settings.items()):
+            return None
+
+        return entry
+
+    def update_files_entry(self, file_paths, archive_path, **values):
+        """
+        Stores the fingerprint of a list of files after they were archived into `archive_path`, along with `values`.
+
+        :param file_paths: Complete filenames of the files the archive was made from.
+        :param archive_path: Complete filename of the archive.
+        :param values: Anything else that should be returned by `get_files_entry`. Must be json serializable.
+        :return: None.
+        """
+        if not self.enabled:
+            return
+
+        self._entries[archive_path] = dict(values, files_fingerprint=_ArchiveCache._files_fingerprint(file_paths),
+                                           archive=_ArchiveCache._archive_stat(archive_path))
+
+    def forget(self, archive_path):
+        """
+        Removes the fingerprint stored for `archive_path`.
+
+        :param archive_path: Complete filename of the archive.
+        :return: None.
+        """
+        self._entries.pop(archive_path, None)
+
+    def save(self):
+        """
+        Writes the fingerprints to the cache file.
+
+        :return: None.
+        """
+        if not self.enabled:
+            return
+
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        temp_filename = self.filename + '.tmp'
+        with open(temp_filename, 'w') as file:
+            json.dump({'version': _ArchiveCache.VERSION, 'entries': self._entries}, file, indent=2, sort_keys=True)
+        os.replace(temp_filename, self.filename)
+
+
+class _RequirementsLock:
+    """
+    Pins every package the requirements file resolves to, as a whole, to an exact `name==version`, along with the
+    wheel that was built for every pin and its hash.
+
+    The lock is used to skip pip entirely when the requirements file did not change. Otherwise the file is resolved
+    again, and only the wheels of the pins that were added or changed are fetched or built.
+
+    The lock is stored as json in the private folder.
+    """
+
+    FILENAME = os.path.join(PRIVATE_FOLDER_PATH, 'requirements.lock')
+    VERSION = 2
+
+    def __init__(self, enabled=True, filename=FILENAME):
+        """
+        Loads the stored lock, if there is one.
+
+        :param enabled: If False, the lock is never up to date and nothing is stored.
+        :param filename: The json file where the lock is kept.
+        """
+        self.enabled = enabled
+        self.filename = filename
+        self.requirements_hash = None
+        self.lines = []
+        self.pins = {}
+        self.wheels = {}
+
+        if enabled and os.path.isfile(filename):
+            try:
+                with open(filename, 'r') as file:
+                    content = json.load(file)
+                if content.get('version') == _RequirementsLock.VERSION:
+                    self.requirements_hash = content.get('requirements_hash')
+                    self.lines = content.get('lines', [])
+                    self.pins = content.get('pins', {})
+                    self.wheels = content.get('wheels', {})
+            except (OSError, ValueError):
+                logging.warning(f"Requirements lock '{filename}' could not be read. All requirements will be built.")
+
+    @staticmethod
+    def hash_file(filename) -> str:
+        """
+        Returns the sha256 hash of a file's contents.
+
+        :param filename: Complete filename of the file.
+        :return: Type[str]
+        """
+        digest = hashlib.sha256()
+        with open(filename, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def parse_requirements(filename) -> ([str], [str]):
+        """
+        Splits a requirements file into pip option lines, e.g. `--index-url ...` or `-r other.txt`, and requirement
+        lines. Comments, blank lines and line continuations are handled the way pip handles them.
+
+        Paths of nested requirement and constraint files are made absolute, since the lines are later written to
+        another file.
+
+        :param filename: Complete filename of the requirements file.
+        :return: Type([str], [str]) option lines and requirement lines.
+        """
+        with open(filename, 'r') as file:
+            content = re.sub(r'\\\n', '', file.read())
+
+        base_dir = os.path.dirname(os.path.abspath(filename))
+        options_lines = []
+        requirement_lines = []
+
+        for line in content.splitlines():
+            line = re.sub(r'(^|\s+)#.*$', '', line).strip()
+            if line == '':
+                continue
+            if line.startswith('-'):
+                nested = re.match(r'^(-r|-c|--requirement|--constraint)[\s=]+(.+)$', line)
+                if nested and '://' not in nested.group(2):
+                    line = f"{nested.group(1)} {os.path.join(base_dir, nested.group(2))}"
+                options_lines.append(line)
+            else:
+                requirement_lines.append(line)
+
+        return options_lines, requirement_lines
+
+    def is_up_to_date(self, requirements_hash, libraries_dir) -> bool:
+        """
+        Checks whether the lock was made from a requirements file with `requirements_hash` and all of its wheels are
+        still in the libraries directory.
+
+        :param requirements_hash: The hash of the current requirements file.
+        :param libraries_dir: The directory where the wheels are kept.
+        :return: Type[bool]
+        """
+        if not self.enabled or self.requirements_hash is None or self.requirements_hash != requirements_hash:
+            return False
+
+        for (filename, wheel) in self.wheels.items():
+            path = os.path.join(libraries_dir, filename)
+            if not os.path.isfile(path) or os.path.getsize(path) != wheel.get('size'):
+                return False
+
+        return True
+
+    def get_changed_lines(self, requirement_lines) -> [str]:
+        """
+        Returns the requirement lines that were added or changed since the lock was made.
+
+        :param requirement_lines: The current requirement lines of the requirements file.
+        :return: Type[str]
+        """
+        return [line for line in requirement_lines if line not in self.lines]
+
+    def get_missing_pins(self, pins, libraries_dir) -> [str]:
+        """
+        Forgets the pins that are no longer in the resolved requirements, and returns the pins that were added since
+        the lock was made, or whose wheels went missing.
+
+        :param pins: The pins of the resolved requirements, e.g. 'urllib3==1.26.18'.
+        :param libraries_dir: The directory where the wheels are kept.
+        :return: Type[str]
+        """
+        self.pins = {pin: wheel for (pin, wheel) in self.pins.items() if pin in pins}
+
+        return [pin for pin in pins
+                if pin not in self.pins or not os.path.isfile(os.path.join(libraries_dir, self.pins[pin]))]
+
+    def set_pin_wheel(self, pin, wheel_path):
+        """
+        Records the wheel that was built for a pin.
+
+        :param pin: The pin, e.g. 'urllib3==1.26.18'.
+        :param wheel_path: Complete filename of the wheel.
+        :return: None.
+        """
+        filename = os.path.basename(wheel_path)
+        name_parts = filename.split('-')
+        self.wheels[filename] = {
+            'name': name_parts[0],
+            'version': name_parts[1] if len(name_parts) > 1 else '',
+            'sha256': _RequirementsLock.hash_file(wheel_path),
+            'size': os.path.getsize(wheel_path),
+        }
+        self.pins[pin] = filename
+
+    def get_locked_wheels(self) -> {str}:
+        """
+        Returns the filenames of the wheels of the locked pins.
+
+        :return: Type{str}
+        """
+        return set(self.pins.values())
+
+    def save(self, requirements_hash, requirement_lines):
+        """
+        Writes the lock to the lock file.
+
+        :param requirements_hash: The hash of the requirements file the lock was made from, None if the lock is
+            incomplete, e.g. because some pin could not be built.
+        :param requirement_lines: The requirement lines of the requirements file the lock was made from.
+        :return: None.
+        """
+        if not self.enabled:
+            return
+
+        self.requirements_hash = requirements_hash
+        self.lines = requirement_lines
+        locked_wheels = self.get_locked_wheels()
+        self.wheels = {filename: wheel for (filename, wheel) in self.wheels.items() if filename in locked_wheels}
+
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        temp_filename = self.filename + '.tmp'
+        with open(temp_filename, 'w') as file:
+            json.dump({'version': _RequirementsLock.VERSION, 'requirements_hash': requirements_hash,
+                       'lines': self.lines, 'pins': self.pins, 'wheels': self.wheels},
+                      file, indent=2, sort_keys=True)
+        os.replace(temp_filename, self.filename)
+
+
+class _VirtualEnvironment:
+    """
+    A virtual environment with the requirements installed in it, packed into a single archive for the `--archives`
+    argument of spark-submit. The executors unpack it under an alias and run its python, so packages that need to be
+    compiled get to every executor ready to import, without being installed there.
+
+    The python of the environment still loads the standard library from the installation it was created from, so the
+    executors need the same python version at the same path as the machine running SSP.
+
+    What the archive was made from is stored as json in the private folder.
+    """
+
+    FILENAME = os.path.join(PRIVATE_FOLDER_PATH, 'environment.json')
+    DIRECTORY = os.path.join(PRIVATE_FOLDER_PATH, 'environment')
+    ARCHIVE_FILENAME = 'environment.tar.gz'
+    VERSION = 1
+
+    def __init__(self, enabled=True, filename=FILENAME):
+        """
+        Loads the stored state of the environment, if there is one.
+
+        :param enabled: If False, the environment is never up to date and nothing is stored.
+        :param filename: The json file where the state is kept.
+        """
+        self.enabled = enabled
+        self.filename = filename
+        self.requirements_hash = None
+        self.python = None
+        self.archive = None
+
+        if enabled and os.path.isfile(filename):
+            try:
+                with open(filename, 'r') as file:
+                    content = json.load(file)
+                if content.get('version') == _VirtualEnvironment.VERSION:
+                    self.requirements_hash = content.get('requirements_hash')
+                    self.python = content.get('python')
+                    self.archive = content.get('archive')
+            except (OSError, ValueError):
+                logging.warning(f"Virtual environment state '{filename}' could not be read. "
+                                f"The environment will be created again.")
+
+    @staticmethod
+    def get_archive_path(paths: _Paths) -> str:
+        """
+        :param paths: An instance of _Paths, being used by the script.
+        :return: Type[str] complete filename of the packed environment.
+        """
+        return os.path.join(paths.distribution_dir, _VirtualEnvironment.ARCHIVE_FILENAME)
+
+    @staticmethod
+    def get_python(directory) -> str:
+        """
+        :param directory: The directory of the environment.
+        :return: Type[str] complete filename of the python of the environment.
+        """
+        if os.name == 'nt':
+            return os.path.join(directory, 'Scripts', 'python.exe')
+        return os.path.join(directory, 'bin', 'python')
+
+    def is_up_to_date(self, requirements_hash, archive_path) -> bool:
+        """
+        Checks whether the archive was made from a requirements file with `requirements_hash` by the python running SSP,
+        and was not changed since.
+
+        :param requirements_hash: The hash of the current requirements file.
+        :param archive_path: Complete filename of the packed environment.
+        :return: Type[bool]
+        """
+        return self.enabled and self.requirements_hash is not None and self.requirements_hash == requirements_hash \
+            and self.python == sys.version and self.archive == _ArchiveCache._archive_stat(archive_path)
+
+    def save(self, requirements_hash, archive_path):
+        """
+        Writes the state of the environment to the state file.
+
+        :param requirements_hash: The hash of the requirements file the environment was made from. None if some
+            requirements failed to install, so they are tried again by the next run.
+        :param archive_path: Complete filename of the packed environment.
+        :return: None.
+        """
+        if not self.enabled:
+            return
+
+        self.requirements_hash = requirements_hash
+        self.python = sys.version
+        self.archive = _ArchiveCache._archive_stat(archive_path)
+
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        temp_filename = self.filename + '.tmp'
+        with open(temp_filename, 'w') as file:
+            json.dump({
+                'version': _VirtualEnvironment.VERSION,
+                'requirements_hash': self.requirements_hash,
+                'python': self.python,
+                'archive': self.archive,
+            }, file, indent=2, sort_keys=True)
+        os.replace(temp_filename, self.filename)
+
+    @staticmethod
+    def pack(directory, archive_path, compression_level, reproducible):
+        """
+        Packs the contents of the environment's directory into a .tar.gz file, so that they are at the root of the
+        directory it is unpacked in.
+
+        :param directory: The directory of the environment.
+        :param archive_path: Complete filename of the archive.
+        :param compression_level: The gzip level, from 0 to 9.
+        :param reproducible: Whether or not to normalize the timestamps, owners and permissions of the entries.
+        :return: None.
+        """
+        import gzip
+        import tarfile
+
+        def normalize(tar_info):
+            if reproducible:
+                tar_info.mtime = 0
+                tar_info.uid = tar_info.gid = 0
+                tar_info.uname = tar_info.gname = ''
+                tar_info.mode = 0o755 if tar_info.isdir() or tar_info.mode & 0o111 else 0o644
+            return tar_info
+
+        os.makedirs(os.path.dirname(archive_path) or '.', exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(archive_path) or '.',
+                                                      prefix='.environment-', suffix='.tar.gz')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as file, \
+                    gzip.GzipFile(fileobj=file, mode='wb', compresslevel=compression_level,
+                                  mtime=0 if reproducible else None) as gzip_file, \
+                    tarfile.open(fileobj=gzip_file, mode='w', format=tarfile.PAX_FORMAT) as archive:
+                for name in sorted(os.listdir(directory)):
+                    archive.add(os.path.join(directory, name), arcname=name, filter=normalize)
+            os.replace(temp_path, archive_path)
+        except BaseException:
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @staticmethod
+    def get_shipped_alias(options: _Options, archives) -> str:
+        """
+        Spark is only set to run the python of the environment if it is shipped.
+
+        :param options: An instance of _Options, being used by the script.
+        :param archives: The archive assets of the submission.
+        :return: Type[str] the alias of the packed environment, None if it is not in `archives`.
+        """
+        alias = options.virtual_environment_alias
+        if options.pack_virtual_environment and any(path.endswith(f"#{alias}") for path in archives):
+            return alias
+        return None
+
+    @staticmethod
+    def get_spark_conf(alias, args) -> {str: str}:
+        """
+        Makes the Spark properties that run the python of the packed environment.
+
+        The executors run the python of the unpacked archive. In client mode the driver runs on this machine, so it runs
+        the python of the local environment instead.
+
+        :param alias: The name of the directory the executors unpack the archive in.
+        :param args: The args passed to spark-submit.
+        :return: Type{str: str}
+        """
+        executor_python = os.path.relpath(_VirtualEnvironment.get_python(_VirtualEnvironment.DIRECTORY),
+                                          _VirtualEnvironment.DIRECTORY).replace(os.path.sep, '/')
+        conf = {'spark.pyspark.python': f"./{alias}/{executor_python}"}
+
+        deploy_mode = _pop_ssp_arg(['spark-submit'] + list(args), '--deploy-mode')
+        if deploy_mode != 'cluster':
+            conf['spark.pyspark.driver.python'] = os.path.abspath(
+                _VirtualEnvironment.get_python(_VirtualEnvironment.DIRECTORY))
+
+        return conf
+
+
+class _FileHashes:
+    """
+    Keeps the sha256 hashes of local files by their size and modification time, so that unchanged files are not read
+    again.
+
+    The hashes are stored as json in the private folder.
+    """
+
+    FILENAME = os.path.join(PRIVATE_FOLDER_PATH, 'artifact_hashes.json')
+    VERSION = 1
+
+    def __init__(self, filename=FILENAME):
+        """
+        Loads the stored hashes, if there are any.
+
+        :param filename: The json file where the hashes are kept.
+        """
+        self.filename = filename
+        self.bytes_read = 0
+        self._hashes = {}
+
+        if os.path.isfile(filename):
+            try:
+                with open(filename, 'r') as file:
+                    content = json.load(file)
+                if content.get('version') == _FileHashes.VERSION:
+                    self._hashes = content.get('hashes', {})
+            except (OSError, ValueError):
+                logging.warning(f"Artifact hashes '{filename}' could not be read. All files will be hashed again.")
+
+    def hash_file(self, path) -> str:
+        """
+        Returns the sha256 hash of a local file, read again only if its size or modification time changed.
+
+        :param path: Complete filename of the file.
+        :return: Type[str]
+        """
+        absolute_path = os.path.abspath(path)
+        stat = _ArchiveCache._archive_stat(absolute_path)
+        entry = self._hashes.get(absolute_path)
+        if entry is not None and entry.get('stat') == stat:
+            return entry['sha256']
+
+        sha256 = _RequirementsLock.hash_file(absolute_path)
+        self.bytes_read += stat[0]
+        self._hashes[absolute_path] = {'stat': stat, 'sha256': sha256}
+        return sha256
+
+    def save(self):
+        """
+        Writes the hashes to the hashes file.
+
+        :return: None.
+        """
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        temp_filename = self.filename + '.tmp'
+        with open(temp_filename, 'w') as file:
+            json.dump({'version': _FileHashes.VERSION, 'hashes': self._hashes}, file, indent=2, sort_keys=True)
+        os.replace(temp_filename, self.filename)
+
+
+class _ArtifactStore(abc.ABC):
+    """
+    Keeps the dependencies of submissions named by the sha256 hash of their contents, so that spark-submit is passed
+    the URIs of files that are already in the store instead of local files it uploads again for every submission.
+
+    Backends implement the abstract methods `exists`, `put` and `get_uri`, so a backend missing one of them can not
+    be created, and are picked by the scheme of the store's location, see
+    `get_backend`. The hashes of local files are kept by _FileHashes, so unchanged files are not read again.
+    """
+
+    FILENAME = _FileHashes.FILENAME
+
+    def __init__(self, location, filename=FILENAME):
+        """
+        Loads the stored hashes, if there are any.
+
+        :param location: The location of the store, e.g. '/mnt/shared/ssp' or 'file:///mnt/shared/ssp'.
+        :param filename: The json file where the hashes of local files are kept.
+        """
+        self.location = location
+        self.files_written = 0
+        self.bytes_written = 0
+        self._hashes = _FileHashes(filename)
+
+    @property
+    def bytes_read(self) -> int:
+        """
+        :return: Type[int] the number of bytes read to hash the local files.
+        """
+        return self._hashes.bytes_read
+
+    @staticmethod
+    def get_backend(location):
+        """
+        Returns the backend class for the scheme of a store location. Locations without a scheme are local paths.
+
+        :param location: The location of the store.
+        :return: Type[type] a subclass of _ArtifactStore, None if the scheme is not supported.
+        """
+        scheme = location.split('://')[0].lower() if '://' in location else 'file'
+        return {
+            'file': _LocalArtifactStore,
+        }.get(scheme)
+
+    @staticmethod
+    def open(location) -> '_ArtifactStore':
+        """
+        Opens the store at `location` with the backend for its scheme.
+
+        :param location: The location of the store.
+        :return: Type[_ArtifactStore]
+        """
+        backend = _ArtifactStore.get_backend(location)
+        if backend is None:
+            logging.error(f"The scheme of the artifact store '{location}' is not supported.")
+            exit(1)
+        return backend(location)
+
+    @abc.abstractmethod
+    def exists(self, key) -> bool:
+        """
+        :param key: The name of an artifact in the store, '<sha256>/<filename>'.
+        :return: Type[bool] whether or not the artifact is in the store.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def put(self, path, key):
+        """
+        Adds a local file to the store. Must not leave a partial artifact behind if it fails.
+
+        :param path: Complete filename of the local file.
+        :param key: The name of the artifact in the store, '<sha256>/<filename>'.
+        :return: None.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_uri(self, key) -> str:
+        """
+        :param key: The name of an artifact in the store, '<sha256>/<filename>'.
+        :return: Type[str] the URI spark-submit is passed for the artifact.
+        """
+        raise NotImplementedError
+
+    def publish(self, paths) -> [str]:
+        """
+        Adds the local files that are not in the store yet, and returns the URIs of all of them.
+
+        Spark places every file in the working directory of the executors by its name, so the artifacts keep the
+        names of the files. Aliases of archives, e.g. 'environment.tar.gz#environment', are kept. Paths that are not
+        local files, e.g. URIs, are returned as they are.
+
+        :param paths: Complete filenames of the files.
+        :return: Type[str]
+        """
+        uris = []
+        for path in paths:
+            (filename, hash_sign, alias) = path.partition('#')
+            if not os.path.isfile(filename):
+                uris.append(path)
+                continue
+
+            key = self._get_key(filename)
+            if not self.exists(key):
+                logging.debug(f"Adding '{filename}' to the artifact store as '{key}'.")
+                self.put(filename, key)
+                self.files_written += 1
+                self.bytes_written += os.path.getsize(filename)
+            uris.append(self.get_uri(key) + hash_sign + alias)
+
+        return uris
+
+    def get_uris(self, paths, unknown_files=()) -> [str]:
+        """
+        Works out the URIs `publish` would return, without adding anything to the store.
+
+        :param paths: Complete filenames of the files.
+        :param unknown_files: Normalized filenames of files that would be built, their hashes are PLAN_PLACEHOLDER.
+        :return: Type[str]
+        """
+        uris = []
+        for path in paths:
+            (filename, hash_sign, alias) = path.partition('#')
+            if os.path.normpath(filename) in unknown_files:
+                uris.append(self.get_uri(f"{PLAN_PLACEHOLDER}/{os.path.basename(filename)}") + hash_sign + alias)
+            elif os.path.isfile(filename):
+                uris.append(self.get_uri(self._get_key(filename)) + hash_sign + alias)
+            else:
+                uris.append(path)
+        return uris
+
+    def _get_key(self, filename) -> str:
+        """
+        :param filename: Complete filename of a local file.
+        :return: Type[str] the name of its artifact in the store, '<sha256>/<filename>'.
+        """
+        return f"{self._hashes.hash_file(filename)}/{os.path.basename(filename)}"
+
+    def save(self):
+        """
+        Writes the hashes of the local files to the hashes file.
+
+        :return: None.
+        """
+        self._hashes.save()
+
+
+class _LocalArtifactStore(_ArtifactStore):
+    """
+    An artifact store in a directory of a shared filesystem, mounted at the same path on the machine running SSP and
+    on every node of the cluster.
+
+    Artifacts are passed as 'local:' URIs, which Spark reads from the node's own filesystem instead of uploading them.
+    """
+
+    def __init__(self, location, filename=_ArtifactStore.FILENAME):
+        """
+        :param location: The directory of the store, e.g. '/mnt/shared/ssp' or 'file:///mnt/shared/ssp'.
+        :param filename: The json file where the hashes of local files are kept.
+        """
+        super().__init__(location, filename)
+        directory = location[len('file://'):] if location.lower().startswith('file://') else location
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+
+    def exists(self, key) -> bool:
+        """
+        See `_ArtifactStore.exists`.
+        """
+        return os.path.isfile(os.path.join(self.directory, key))
+
+    def put(self, path, key):
+        """
+        See `_ArtifactStore.put`.
+        """
+        destination = os.path.join(self.directory, key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+        # Written next to the destination and renamed, so other submissions never see a partial artifact.
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(destination), prefix='.artifact-')
+        os.close(file_descriptor)
+        try:
+            shutil.copyfile(path, temp_path)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, destination)
+        except BaseException:
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def get_uri(self, key) -> str:
+        """
+        See `_ArtifactStore.get_uri`.
+        """
+        return 'local:' + os.path.join(self.directory, key).replace(os.path.sep, '/')
+
+
+class _FileLock:
+    """
+    An advisory lock on a file, shared or exclusive. It is released by `release`, or when the process ends.
+
+    flock is used on POSIX. Windows only has exclusive locks, so shared locks are not taken there.
+    """
+
+    POLL_INTERVAL_SECONDS = 0.1
+
+    def __init__(self, filename, shared=False):
+        """
+        :param filename: The complete filename of the lock file, it is created if it does not exist.
+        :param shared: Whether or not other processes may hold a shared lock on the file at the same time.
+        """
+        self.filename = filename
+        self.shared = shared
+        self._file = None
+
+    def acquire(self, blocking=True) -> bool:
+        """
+        Locks the file.
+
+        :param blocking: Whether or not to wait until the lock is free.
+        :return: Type[bool] whether or not the lock was acquired, always True if `blocking` is True.
+        """
+        os.makedirs(os.path.dirname(self.filename) or os.curdir, exist_ok=True)
+        self._file = open(self.filename, 'a')
+
+        if os.name != 'nt':
+            import fcntl
+
+            flags = (fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB)
+            try:
+                fcntl.flock(self._file.fileno(), flags)
+                return True
+            except BlockingIOError:
+                self.release()
+                return False
+
+        if self.shared:
+            return True
+
+        import msvcrt
+
+        while True:
+            try:
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    self.release()
+                    return False
+                time.sleep(_FileLock.POLL_INTERVAL_SECONDS)
+
+    def release(self):
+        """
+        Unlocks the file, closing it releases the lock.
+
+        :return: None.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class _BuildGenerations:
+    """
+    Pins the files of a submission to an immutable build generation, so that later builds of the project can not
+    change or delete them while spark-submit still reads them.
+
+    A generation is a directory of hard links to the shipped files SSP made, i.e. those of the Distribution and
+    Libraries Directories. SSP never writes into those files, it only replaces or deletes them, so the links keep the
+    contents of the build they were made from. A generation is filled in a staging directory that is then renamed in
+    place, and submissions of the same build share it. Every submission holds a shared lock on its generation, and
+    builds delete the generations that are not locked, except for the newest ones.
+
+    Builds themselves hold the exclusive build lock of the project, so only one runs at a time.
+    """
+
+    DIRECTORY = os.path.join(PRIVATE_FOLDER_PATH, 'generations')
+    BUILD_LOCK_FILENAME = os.path.join(PRIVATE_FOLDER_PATH, 'build.lock')
+    STAGING_INFIX = '.staging-'
+
+    # The number of generations kept even if no submission uses them, e.g. for submissions on Windows, which does
+    # not have shared locks.
+    KEPT_GENERATIONS = 2
+
+    @staticmethod
+    def get_build_lock() -> _FileLock:
+        """
+        :return: Type[_FileLock] the lock builds of the project hold, not acquired yet.
+        """
+        return _FileLock(_BuildGenerations.BUILD_LOCK_FILENAME)
+
+    @staticmethod
+    def _get_pinned_files(paths: _Paths, dependencies, unknown_files=()) -> {str: str}:
+        """
+        Finds the shipped files SSP made.
+
+        :param paths: An instance of _Paths, being used by the script.
+        :param dependencies: Type([str], [str], [str]) the code dependencies, file assets and archive assets.
+        :param unknown_files: Normalized filenames of files that would be built, they are pinned even if they do not
+            exist yet.
+        :return: Type{str: str} the path in the generation of every file to pin, by its complete filename.
+        """
+        pinned_files = {}
+        for path in [path for group in dependencies for path in group]:
+            filename = path.split('#')[0]
+            for (name, directory) in [('dist', paths.distribution_dir), ('lib', paths.libraries_dir)]:
+                relative_path = os.path.relpath(os.path.abspath(filename), os.path.abspath(directory))
+                if not relative_path.startswith(os.pardir) and \
+                        (os.path.isfile(filename) or os.path.normpath(filename) in unknown_files):
+                    pinned_files[filename] = os.path.join(name, relative_path)
+                    break
+        return pinned_files
+
+    @staticmethod
+    def _get_generation_dir(dependencies, pinned_files) -> str:
+        """
+        Names the generation of the dependencies by their hash and the sizes, modification times and inodes of the
+        files to pin.
+
+        :param dependencies: Type([str], [str], [str]) the code dependencies, file assets and archive assets.
+        :param pinned_files: The files to pin, as returned by `_get_pinned_files`.
+        :return: Type[str] the directory of the generation.
+        """
+        digest = hashlib.sha256(json.dumps(dependencies).encode())
+        for (filename, pinned_path) in sorted(pinned_files.items()):
+            stat = os.stat(filename)
+            digest.update(f"{pinned_path}\0{stat.st_size}\0{stat.st_mtime_ns}\0{stat.st_ino}\n".encode())
+        return os.path.join(_BuildGenerations.DIRECTORY, digest.hexdigest()[:16])
+
+    @staticmethod
+    def _get_pinned_dependencies(dependencies, pinned_files, generation_dir) -> ([str], [str], [str]):
+        """
+        :param dependencies: Type([str], [str], [str]) the code dependencies, file assets and archive assets.
+        :param pinned_files: The files to pin, as returned by `_get_pinned_files`.
+        :param generation_dir: The directory of the generation.
+        :return: Type([str], [str], [str]) the dependencies, with the pinned files replaced by their copies in the
+            generation.
+        """
+        def get_pinned_path(path):
+            (filename, separator, alias) = path.partition('#')
+            if filename not in pinned_files:
+                return path
+            return os.path.join(generation_dir, pinned_files[filename]) + separator + alias
+
+        return tuple([get_pinned_path(path) for path in group] for group in dependencies)
+
+    @staticmethod
+    def plan(paths: _Paths, dependencies, unknown_files=(), complete=True) -> ([str], [str], [str]):
+        """
+        Works out the dependencies `pin` would return, without making or locking the generation.
+
+        :param paths: An instance of _Paths, being used by the script.
+        :param dependencies: Type([str], [str], [str]) the code dependencies, file assets and archive assets.
+        :param unknown_files: Normalized filenames of files that would be built. If any of them is pinned, the
+            generation is not known, and PLAN_PLACEHOLDER is its name.
+        :param complete: Whether or not `dependencies` hold every file of the submission, e.g. not if the wheels of
+            the requirements are not known. If not, the generation is not known either.
+        :return: Type([str], [str], [str])
+        """
+        pinned_files = _BuildGenerations._get_pinned_files(paths, dependencies, unknown_files)
+        if not complete or any(os.path.normpath(filename) in unknown_files for filename in pinned_files):
+            generation_dir = os.path.join(_BuildGenerations.DIRECTORY, PLAN_PLACEHOLDER)
+        else:
+            generation_dir = _BuildGenerations._get_generation_dir(dependencies, pinned_files)
+        return _BuildGenerations._get_pinned_dependencies(dependencies, pinned_files, generation_dir)
+
+    @staticmethod
+    def pin(paths: _Paths, dependencies) -> (([str], [str], [str]), _FileLock, bool):
+        """
+        Makes the generation of the dependencies, unless it already exists, and locks it. It should be called while
+        the build lock is held.
+
+        :param paths: An instance of _Paths, being used by the script.
+        :param dependencies: Type([str], [str], [str]) the code dependencies, file assets and archive assets.
+        :return: Type(([str], [str], [str]), _FileLock, bool) the dependencies, with the files SSP made replaced by
+            their pinned copies, the shared lock held on the generation, and whether or not it was created.
+        """
+        pinned_files = _BuildGenerations._get_pinned_files(paths, dependencies)
+        generation_dir = _BuildGenerations._get_generation_dir(dependencies, pinned_files)
+
+        lock = _FileLock(generation_dir + '.lock', shared=True)
+        lock.acquire()
+
+        created = not os.path.isdir(generation_dir)
+        if created:
+            staging_dir = tempfile.mkdtemp(prefix=os.path.basename(generation_dir) + _BuildGenerations.STAGING_INFIX,
+                                           dir=_BuildGenerations.DIRECTORY)
+            for (filename, pinned_path) in pinned_files.items():
+                os.makedirs(os.path.dirname(os.path.join(staging_dir, pinned_path)), exist_ok=True)
+                Requirements._link_or_copy(filename, os.path.join(staging_dir, pinned_path))
+            os.rename(staging_dir, generation_dir)
+        else:
+            # The newest generations are the ones kept.
+            os.utime(generation_dir)
+
+        pinned_dependencies = _BuildGenerations._get_pinned_dependencies(dependencies, pinned_files, generation_dir)
+        return pinned_dependencies, lock, created
+
+    @staticmethod
+    def collect_garbage() -> int:
+        """
+        Deletes the generations no submission uses, except for the newest ones, and the staging directories of builds
+        that did not finish. It should be called while the build lock is held.
+
+        :return: Type[int] the number of generations deleted.
+        """
+        if not os.path.isdir(_BuildGenerations.DIRECTORY):
+            return 0
+
+        generation_dirs = []
+        for entry in os.scandir(_BuildGenerations.DIRECTORY):
+            if not entry.is_dir():
+                continue
+            if _BuildGenerations.STAGING_INFIX in entry.name:
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                generation_dirs.append((entry.stat().st_mtime, entry.path))
+
+        deleted_generations = 0
+        for (_, generation_dir) in sorted(generation_dirs, reverse=True)[_BuildGenerations.KEPT_GENERATIONS:]:
+            lock = _FileLock(generation_dir + '.lock')
+            if lock.acquire(blocking=False):
+                shutil.rmtree(generation_dir, ignore_errors=True)
+                lock.release()
+                deleted_generations += 1
+                try:
+                    os.remove(lock.filename)
+                except OSError:
+                    pass
+        return deleted_generations
+
+
+class _SharedWheelStore:
+    """
+    Keeps the wheels built for the requirements of every project in one directory, so that a wheel is only downloaded
+    and built once per machine. The Libraries Directories of the projects are filled with hard links to the stored
+    wheels, or with reflinks or copies where hard links are not supported.
+
+    The store is the 'wheel_store' directory of SSP_HOME_DIR, unless the [OPTIONS] section's 'Shared Wheel Store
+    Directory' is set. Its 'wheels' directory holds the wheels by filename, and is what pip is pointed at with
+    --find-links. Every project writes the filenames and sha256 hashes of the wheels it uses to its own reference file
+    in the 'refs' directory, and `collect_garbage`, run by `ssp.sh gc`, deletes the wheels no project references.
+
+    Builds hold a shared lock on the store while they add and link wheels, and `collect_garbage` holds an exclusive
+    one, so wheels are never deleted between being found in the store and being linked.
+    """
+
+    DIRECTORY_NAME = 'wheel_store'
+    WHEELS_DIRECTORY_NAME = 'wheels'
+    REFS_DIRECTORY_NAME = 'refs'
+    LOCK_FILENAME = 'store.lock'
+    VERSION = 1
+
+    def __init__(self, directory):
+        """
+        :param directory: The directory of the store, None or empty if there is no store.
+        """
+        self.enabled = bool(directory)
+        self.directory = directory
+        self.wheels_dir = os.path.join(directory, _SharedWheelStore.WHEELS_DIRECTORY_NAME) if self.enabled else None
+        self.refs_dir = os.path.join(directory, _SharedWheelStore.REFS_DIRECTORY_NAME) if self.enabled else None
+
+    @staticmethod
+    def get(options: _Options):
+        """
+        Returns the store the options ask for. It is only used while 'Use Requirements Lock' is true, since the
+        wheels are built into the store by the requirements lock.
+
+        :param options: An instance of _Options, being used by the script.
+        :return: Type[_SharedWheelStore]
+        """
+        if not options.use_shared_wheel_store or not options.use_requirements_lock:
+            return _SharedWheelStore(None)
+
+        directory = options.shared_wheel_store_directory
+        if directory == '':
+            home_dir = os.environ.get('SSP_HOME_DIR', '')
+            if home_dir == '':
+                logging.debug("SSP_HOME_DIR is not defined. The wheels are not kept in the shared wheel store.")
+                return _SharedWheelStore(None)
+            directory = os.path.join(home_dir, _SharedWheelStore.DIRECTORY_NAME)
+
+        return _SharedWheelStore(os.path.abspath(os.path.expanduser(directory)))
+
+    def get_lock(self, shared=True) -> _FileLock:
+        """
+        :param shared: Whether or not the lock is the shared lock of builds, or the exclusive one of `collect_garbage`.
+        :return: Type[_FileLock] the lock of the store, not acquired yet.
+        """
+        return _FileLock(os.path.join(self.directory, _SharedWheelStore.LOCK_FILENAME), shared)
+
+    @staticmethod
+    def _get_project_id() -> str:
+        """
+        :return: Type[str] the name of the current project's reference file, made from the path of its private folder.
+        """
+        return hashlib.sha256(os.path.abspath(PRIVATE_FOLDER_PATH).encode()).hexdigest()[:16]
+
+    def adopt(self, wheel_path) -> str:
+        """
+        Adds a wheel of a Libraries Directory to the store, unless a wheel with its filename already is there.
+
+        :param wheel_path: Complete filename of the wheel.
+        :return: Type[str] the complete filename of the wheel in the store.
+        """
+        stored_path = os.path.join(self.wheels_dir, os.path.basename(wheel_path))
+        if not os.path.isfile(stored_path):
+            os.makedirs(self.wheels_dir, exist_ok=True)
+            temp_path = f"{stored_path}.{os.getpid()}.tmp"
+            Requirements._link_or_copy(wheel_path, temp_path)
+            os.replace(temp_path, stored_path)
+        return stored_path
+
+    def set_references(self, wheels: {str: dict}, libraries_dir):
+        """
+        Records the wheels the current project uses, adopting the ones that are not in the store yet, e.g. those built
+        before the store was used. The reference file is only written if the wheels changed.
+
+        :param wheels: Type{str: dict} the wheels of the requirements lock, by filename, see _RequirementsLock.
+        :param libraries_dir: The directory where the project's wheels are kept.
+        :return: None.
+        """
+        for filename in wheels:
+            wheel_path = os.path.join(libraries_dir, filename)
+            if os.path.isfile(wheel_path):
+                self.adopt(wheel_path)
+
+        references = {filename: wheel.get('sha256') for (filename, wheel) in wheels.items()}
+        refs_filename = os.path.join(self.refs_dir, _SharedWheelStore._get_project_id() + '.json')
+
+        try:
+            with open(refs_filename, 'r') as file:
+                content = json.load(file)
+            if content.get('version') == _SharedWheelStore.VERSION and content.get('wheels') == references:
+                return
+        except (OSError, ValueError):
+            pass
+
+        os.makedirs(self.refs_dir, exist_ok=True)
+        temp_filename = f"{refs_filename}.{os.getpid()}.tmp"
+        with open(temp_filename, 'w') as file:
+            json.dump({'version': _SharedWheelStore.VERSION, 'project': os.path.abspath(PRIVATE_FOLDER_PATH),
+                       'wheels': references}, file, indent=2, sort_keys=True)
+        os.replace(temp_filename, refs_filename)
+
+    def collect_garbage(self) -> (int, int):
+        """
+        Deletes the reference files of projects that no longer exist, and the wheels that no reference file lists.
+        It should be called while the exclusive lock of the store is held.
+
+        :return: Type(int, int) the number of wheels deleted and their size in bytes.
+        """
+        referenced_wheels = set()
+        if os.path.isdir(self.refs_dir):
+            for entry in os.scandir(self.refs_dir):
+                if entry.name.endswith('.tmp'):
+                    os.remove(entry.path)
+                    continue
+                try:
+                    with open(entry.path, 'r') as file:
+                        content = json.load(file)
+                except (OSError, ValueError):
+                    logging.warning(f"Reference file '{entry.path}' could not be read. It is kept, along with every "
+                                    f"wheel.")
+                    return 0, 0
+                if not os.path.isdir(content.get('project', '')):
+                    logging.info(f"Forgetting the wheels of the deleted project '{content.get('project')}'.")
+                    os.remove(entry.path)
+                    continue
+                referenced_wheels.update(content.get('wheels', {}))
+
+        deleted_wheels, deleted_bytes = 0, 0
+        if os.path.isdir(self.wheels_dir):
+            for entry in os.scandir(self.wheels_dir):
+                if entry.is_file() and entry.name not in referenced_wheels:
+                    logging.debug(f"Deleting unreferenced wheel '{entry.path}'.")
+                    deleted_bytes += entry.stat().st_size
+                    deleted_wheels += 0 if entry.name.endswith('.tmp') else 1
+                    os.remove(entry.path)
+        return deleted_wheels, deleted_bytes
+
+
+class _ExtractionBootstrap:
+    """
+    Ships the 'ssp_bootstrap' module, which extracts the zip files of `--py-files` once per executor host and user
+    into a cache directory before the python workers start, and sets Spark to run it. See ssp_bootstrap.py.
+
+    The module is run in place of 'pyspark.daemon', which only the executors of Linux and macOS hosts use. It must be
+    importable when the executor starts, i.e. its zip file must be in the executor's working directory, as on YARN
+    and Kubernetes, or at its local path, as in local mode.
+    """
+
+    MODULE_NAME = 'ssp_bootstrap'
+    SOURCE_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"{MODULE_NAME}.py")
+    ARCHIVE_FILENAME = f"{MODULE_NAME}.zip"
+    BUNDLE_EXTENSIONS = ('.zip', '.whl', '.egg')
+
+    @staticmethod
+    def get_archive_path(paths: _Paths) -> str:
+        """
+        :param paths: An instance of _Paths, being used by the script.
+        :return: Type[str] complete filename of the archive of the bootstrap module.
+        """
+        return os.path.join(paths.distribution_dir, _ExtractionBootstrap.ARCHIVE_FILENAME)
+
+    @staticmethod
+    def is_module_up_to_date(paths: _Paths) -> bool:
+        """
+        :param paths: An instance of _Paths, being used by the script.
+        :return: Type[bool] whether or not the archive of the bootstrap module is newer than the module.
+        """
+        archive_path = _ExtractionBootstrap.get_archive_path(paths)
+        return os.path.isfile(archive_path) and \
+            os.path.getmtime(archive_path) >= os.path.getmtime(_ExtractionBootstrap.SOURCE_FILENAME)
+
+    @staticmethod
+    def get_py_files(paths: _Paths, py_files) -> [str]:
+        """
+        :param paths: An instance of _Paths, being used by the script.
+        :param py_files: Complete filenames of the code dependencies.
+        :return: Type[str] the code dependencies, with the archive of the bootstrap module first.
+        """
+        archive_path = _ExtractionBootstrap.get_archive_path(paths)
+        return [archive_path] + [path for path in py_files if os.path.normpath(path) != os.path.normpath(archive_path)]
+
+    @staticmethod
+    def add_module(paths: _Paths, py_files) -> [str]:
+        """
+        Archives the bootstrap module into the Distribution Directory, unless the archive is up to date.
+
+        :param paths: An instance of _Paths, being used by the script.
+        :param py_files: Complete filenames of the code dependencies.
+        :return: Type[str] the code dependencies, with the archive of the bootstrap module first.
+        """
+        if not _ExtractionBootstrap.is_module_up_to_date(paths):
+            os.makedirs(paths.distribution_dir, exist_ok=True)
+            with _ZipWriter(_ExtractionBootstrap.get_archive_path(paths)) as writer:
+                writer.add_file(os.path.basename(_ExtractionBootstrap.SOURCE_FILENAME),
+                                _ExtractionBootstrap.SOURCE_FILENAME)
+
+        return _ExtractionBootstrap.get_py_files(paths, py_files)
+
+    @staticmethod
+    def hash_bundles(py_files, hashes: _FileHashes, unknown_files=()) -> [(str, str)]:
+        """
+        Hashes the zip files the executors extract.
+
+        :param py_files: Complete filenames of the code dependencies.
+        :param hashes: An instance of _FileHashes, unchanged files are not read again.
+        :param unknown_files: Normalized filenames of files that would be built, their hashes are PLAN_PLACEHOLDER.
+        :return: Type[(str, str)] the sha256 hash and the filename of every zip file, in the order of `py_files`.
+        """
+        bundles = []
+        for path in py_files:
+            filename = os.path.basename(path)
+            if not filename.lower().endswith(_ExtractionBootstrap.BUNDLE_EXTENSIONS) \
+                    or filename == _ExtractionBootstrap.ARCHIVE_FILENAME:
+                continue
+            if os.path.normpath(path) in unknown_files:
+                bundles.append((PLAN_PLACEHOLDER, filename))
+            elif os.path.isfile(path):
+                bundles.append((hashes.hash_file(path), filename))
+        return bundles
+
+    @staticmethod
+    def get_spark_conf(py_files, bundles, cache_dir) -> {str: str}:
+        """
+        Makes the Spark properties that run the bootstrap module on the executors. 'spark.executorEnv.PYTHONPATH' is
+        appended to any value it already has, see `_build_spark_submit_args`.
+
+        :param py_files: Complete filenames of the code dependencies, as they are passed to spark-submit.
+        :param bundles: The zip files to extract, as returned by `hash_bundles`.
+        :param cache_dir: The cache directory on the executor hosts.
+        :return: Type{str: str}
+        """
+        archive_path = next(path for path in py_files
+                            if os.path.basename(path) == _ExtractionBootstrap.ARCHIVE_FILENAME)
+        search_dirs = []
+        for path in py_files:
+            directory = os.path.dirname(os.path.abspath(path))
+            if directory not in search_dirs:
+                search_dirs.append(directory)
+
+        return {
+            'spark.python.daemon.module': _ExtractionBootstrap.MODULE_NAME,
+            # The working directory of executors on YARN and Kubernetes, and the local path for local mode.
+            'spark.executorEnv.PYTHONPATH': os.pathsep.join([_ExtractionBootstrap.ARCHIVE_FILENAME,
+                                                             os.path.abspath(archive_path)]),
+            'spark.executorEnv.SSP_EXTRACTION_CACHE': cache_dir,
+            'spark.executorEnv.SSP_EXTRACTION_BUNDLES': ','.join(f"{sha256}:{filename}"
+                                                                 for (sha256, filename) in bundles),
+            'spark.executorEnv.SSP_EXTRACTION_SEARCH_PATH': os.pathsep.join(search_dirs),
+        }
+
+
+class _Manifest:
+    """
+    Remembers the dependencies of the last run along with a fingerprint of everything they were made from, so that a
+    run in which nothing changed can skip straight to spark-submit.
+
+    The fingerprint covers the config file, the requirements file, the include files, the directory trees of the
+    source code and include directories, the requirements lock, the dependencies themselves and this script. It is
+    made of file names, sizes and modification times only, so checking it costs one stat call per file.
+
+    The manifest is stored as json in the private folder.
+    """
+
+    FILENAME = os.path.join(PRIVATE_FOLDER_PATH, 'manifest.json')
+    VERSION = 1
+
+    def __init__(self, enabled=True, filename=FILENAME):
+        """
+        Loads the stored manifest, if there is one.
+
+        :param enabled: If False, the manifest is never up to date and nothing is stored.
+        :param filename: The json file where the manifest is kept.
+        """
+        self.enabled = enabled
+        self.filename = filename
+        self.fingerprint = None
+        self.py_files = []
+        self.files = []
+        self.archives = []
+
+        if enabled and os.path.isfile(filename):
+            try:
+                with open(filename, 'r') as file:
+                    content = json.load(file)
+                if content.get('version') == _Manifest.VERSION:
+                    self.fingerprint = content.get('fingerprint')
+                    self.py_files = content.get('py_files', [])
+                    self.files = content.get('files', [])
+                    self.archives = content.get('archives', [])
+            except (OSError, ValueError):
+                logging.warning(f"Manifest '{filename}' could not be read. All dependencies will be checked.")
+
+    @staticmethod
+    def _add_stat(digest, path):
+        """
+        Adds the name, size and modification time of a file or directory to the fingerprint.
+
+        :param digest: The hashlib object of the fingerprint.
+        :param path: The path of the file or directory.
+        :return: None.
+        """
+        try:
+            stat = os.stat(path)
+            digest.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+        except OSError:
+            digest.update(f"{path}\0missing\n".encode())
+
+    @staticmethod
+    def _add_tree(digest, directory):
+        """
+        Adds every file and directory under `directory` to the fingerprint, in a single traversal.
+
+        :param digest: The hashlib object of the fingerprint.
+        :param directory: The directory to add.
+        :return: None.
+        """
+        _Manifest._add_stat(digest, directory)
+        if not os.path.isdir(directory):
+            return
+
+        pending_dirs = [directory]
+        while len(pending_dirs) > 0:
+            with os.scandir(pending_dirs.pop()) as entries:
+                for entry in sorted(entries, key=lambda e: e.name):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    digest.update(f"{entry.path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+                    if entry.is_dir(follow_symlinks=False):
+                        pending_dirs.append(entry.path)
+
+    @staticmethod
+    def _compute_fingerprint(config_filename, paths: _Paths, dependencies, application_file=None) -> str:
+        """
+        Computes the fingerprint of the inputs and the outputs of a run.
+
+        :param config_filename: The complete filename of the config file.
+        :param paths: An instance of _Paths, being used by the script.
+        :param dependencies: The complete filenames of the dependencies passed to spark-submit.
+        :param application_file: The application file the dependencies were pruned for, None if they were not pruned.
+        :return: Type[str]
+        """
+        digest = hashlib.sha256()
+        if application_file is not None:
+            _Manifest._add_stat(digest, os.path.abspath(application_file))
+        for path in [os.path.abspath(__file__), config_filename, paths.requirements_file, paths.include_code_file,
+                     paths.include_assets_file, _RequirementsLock.FILENAME, _IgnoreRules.FILENAME]:
+            _Manifest._add_stat(digest, path)
+
+        # The shared wheel store may be moved without changing the config file, see _SharedWheelStore.
+        digest.update(os.environ.get('SSP_HOME_DIR', '').encode() + b'\0')
+
+        # Files matching the glob patterns of the include files may come and go.
+        for path in [paths.include_code_file, paths.include_assets_file]:
+            if os.path.isfile(path):
+                digest.update('\0'.join(Requirements._extract_paths(path, warn=False)).encode())
+
+        for directory in [paths.source_code_dir, paths.include_code_dir, paths.include_assets_dir,
+                          paths.libraries_dir]:
+            _Manifest._add_tree(digest, directory)
+
+        for path in dependencies:
+            # Archives may be passed with an alias, e.g. 'environment.tar.gz#environment'.
+            _Manifest._add_stat(digest, path.split('#')[0])
+
+        return digest.hexdigest()
+
+    def get_dependencies(self, config_filename, paths: _Paths, application_file=None) -> ([str], [str], [str]):
+        """
+        Returns the dependencies of the last run, if nothing changed since then.
+
+        :param config_filename: The complete filename of the config file.
+        :param paths: An instance of _Paths, being used by the script.
+        :param application_file: The application file the dependencies are pruned for, None if they are not pruned.
+        :return: Type([str],[str],[str]) the lists `Requirements.get_requirements_list` returns, None if anything
+            changed.
+        """
+        if not self.enabled or self.fingerprint is None:
+            return None
+
+        fingerprint = _Manifest._compute_fingerprint(config_filename, paths,
+                                                     self.py_files + self.files + self.archives, application_file)
+        if fingerprint != self.fingerprint:
+            return None
+
+        return self.py_files, self.files, self.archives
+
+    def save(self, config_filename, paths: _Paths, py_files, files, archives, application_file=None):
+        """
+        Writes the dependencies of this run and the fingerprint they were made from to the manifest file.
+
+        :param config_filename: The complete filename of the config file.
+        :param paths: An instance of _Paths, being used by the script.
+        :param py_files: Complete filenames of the code dependencies.
+        :param files: Complete filenames of the file assets.
+        :param archives: Complete filenames of the archive assets.
+        :param application_file: The application file the dependencies were pruned for, None if they were not pruned.
+        :return: None.
+        """
+        if not self.enabled:
+            if os.path.isfile(self.filename):
+                os.remove(self.filename)
+            return
+
+        self.fingerprint = _Manifest._compute_fingerprint(config_filename, paths, py_files + files + archives,
+                                                          application_file)
+        self.py_files = py_files
+        self.files = files
+        self.archives = archives
+
+        temp_filename = self.filename + '.tmp'
+        with open(temp_filename, 'w') as file:
+            json.dump({
+                'version': _Manifest.VERSION,
+                'fingerprint': self.fingerprint,
+                'py_files': py_files,
+                'files': files,
+                'archives': archives,
+            }, file, indent=2, sort_keys=True)
+        os.replace(temp_filename, self.filename)
+
+
+class _Metrics:
+    """
+    Times the stages of a run and counts the files and bytes they handle, so that it is known where the time before,
+    and of, spark-submit goes.
+
+    The metrics of the last run are kept in '.spark-submit-project/metrics.json', next to the log file.
+    """
+
+    FILENAME = 'metrics.json'
+    VERSION = 1
+
+    def __init__(self):
+        self.started = time.time()
+        self._started_counter = time.perf_counter()
+        self.stages = []
+
+    @staticmethod
+    def get_children_cpu_time() -> float:
+        """
+        Returns the CPU time of the child processes that finished, e.g. pip and spark-submit.
+
+        :return: Type[float] seconds, 0 where it is not available.
+        """
+        try:
+            import resource
+        except ImportError:
+            return 0.0
+
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+
+    def add(self, name, wall_seconds, cpu_seconds, files=0, bytes_read=0, bytes_written=0, **values):
+        """
+        Records a stage.
+
+        :param name: The name of the stage, e.g. 'pip' or 'archive src/package'.
+        :param wall_seconds: The time the stage took.
+        :param cpu_seconds: The CPU time the stage used.
+        :param files: The number of files the stage handled.
+        :param bytes_read: The number of bytes the stage read.
+        :param bytes_written: The number of bytes the stage wrote.
+        :param values: Anything else to record about the stage, e.g. `action='reuse'`.
+        :return: None.
+        """
+        stage = {'name': name, 'wall_seconds': round(wall_seconds, 6), 'cpu_seconds': round(cpu_seconds, 6),
+                 'files': files, 'bytes_read': bytes_read, 'bytes_written': bytes_written}
+        stage.update(values)
+        self.stages.append(stage)
+
+    def measure(self, name, children=False):
+        """
+        Times the stage run in a `with` block. The counts can be set on the returned object.
+
+        :param name: The name of the stage.
+        :param children: Whether or not the CPU time of the child processes started in the block is counted too.
+        :return: Type[_MeasuredStage]
+        """
+        return _MeasuredStage(self, name, children)
+
+    @staticmethod
+    def format_size(size) -> str:
+        """
+        Formats a number of bytes for people to read, e.g. '1.5 MiB'.
+
+        :param size: The number of bytes.
+        :return: Type[str]
+        """
+        for unit in ['B', 'KiB', 'MiB', 'GiB']:
+            if abs(size) < 1024 or unit == 'GiB':
+                return f"{size} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+            size /= 1024
+
+    def get_summary(self) -> str:
+        """
+        Makes a table of the stages.
+
+        :return: Type[str]
+        """
+        lines = [f"{'Stage':<56} {'Wall (s)':>9} {'CPU (s)':>9} {'Files':>7} {'Read':>11} {'Written':>11}"]
+        for stage in self.stages:
+            name = stage['name'] if 'action' not in stage else f"{stage['name']} ({stage['action']})"
+            lines.append(f"{name:<56} {stage['wall_seconds']:>9.3f} {stage['cpu_seconds']:>9.3f} "
+                         f"{stage['files']:>7} {_Metrics.format_size(stage['bytes_read']):>11} "
+                         f"{_Metrics.format_size(stage['bytes_written']):>11}")
+        lines.append(f"{'Total':<56} {time.perf_counter() - self._started_counter:>9.3f}")
+        return '\n'.join(lines)
+
+    def save(self):
+        """
+        Writes the metrics to the metrics file.
+
+        :return: None.
+        """
+        import socket
+
+        metrics_file = os.path.join(PRIVATE_FOLDER_PATH, _Metrics.FILENAME)
+        data = {
+            'version': _Metrics.VERSION,
+            'host': socket.gethostname(),
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self.started)),
+            'wall_seconds': round(time.perf_counter() - self._started_counter, 6),
+            'stages': self.stages,
+        }
+
+        # Runs in other processes may save their metrics at the same time.
+        temp_file = f"{metrics_file}.{os.getpid()}.tmp"
+        with open(temp_file, 'w') as file:
+            json.dump(data, file, indent=2)
+        os.replace(temp_file, metrics_file)
+
+
+class _MeasuredStage:
+    """
+    Times a stage for _Metrics, see `_Metrics.measure`.
+    """
+
+    def __init__(self, metrics: _Metrics, name, children):
+        """
+        :param metrics: The metrics the stage is recorded in.
+        :param name: The name of the stage.
+        :param children: Whether or not the CPU time of the child processes is counted too.
+        """
+        self.metrics = metrics
+        self.name = name
+        self.children = children
+        self.files = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.values = {}
+        self._wall = 0.0
+        self._cpu = 0.0
+
+    def _get_cpu_time(self) -> float:
+        # Only the calling thread is counted, since the other stages run in other threads at the same time.
+        cpu_time = time.thread_time()
+        if self.children:
+            cpu_time += _Metrics.get_children_cpu_time()
+        return cpu_time
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = self._get_cpu_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.add(self.name, time.perf_counter() - self._wall, self._get_cpu_time() - self._cpu, self.files,
+                         self.bytes_read, self.bytes_written, **self.values)
+
+
+class _Bytecode:
+    """
+    Compiles the .py files of the archives to .pyc files, for the python version the executors run.
+
+    zipimport never writes bytecode, so without them every python worker compiles every module it imports from an
+    archive, every time it starts. The .pyc files are placed next to their sources, where zipimport looks for them
+    first. They are hash based and unchecked, so they are used whatever the timestamps of the archive's entries are,
+    and they are only ever loaded by the python version they were compiled for, which falls back to the sources
+    otherwise.
+
+    Compiled files are kept in the private folder by the hash of their source, so a file is only compiled once.
+    The versions of the python executables are kept there too, so that an executable is only run again once it
+    changed, and `get_submission_plan` never has to run it.
+    """
+
+    DIRECTORY = os.path.join(PRIVATE_FOLDER_PATH, 'bytecode')
+    VERSIONS_FILENAME = os.path.join(DIRECTORY, 'versions.json')
+    VERSIONS_VERSION = 1
+
+    # The fingerprint of an instance whose python version is not known. It is never stored, so the archives it is
+    # compared with are never up to date.
+    UNKNOWN_FINGERPRINT = 'unknown'
+
+    # Compiles the sources listed as json on its standard input, and prints the ones that could not be compiled.
+    COMPILE_SCRIPT = '''
+import json, py_compile, sys
+failures = {}
+for (source, cfile, dfile) in json.load(sys.stdin):
+    try:
+        py_compile.compile(source, cfile, dfile, doraise=True,
+                           invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+    except py_compile.PyCompileError as error:
+        failures[dfile] = error.msg.strip().splitlines()[-1]
+print(json.dumps(failures))
+'''
+
+    # The python versions are told apart by the magic number of their .pyc files.
+    VERSION_SCRIPT = "import importlib.util, sys; print(importlib.util.MAGIC_NUMBER.hex(), *sys.version_info[:2])"
+
+    # The instances created by `get`, by the options they were created with.
+    _instances = {}
+
+    def __init__(self, python='', drop_sources=False, run_python=True):
+        """
+        :param python: The python executable of the version the executors run. An empty string for the python
+            running SSP.
+        :param drop_sources: Whether or not the sources of the compiled files are left out of the archives.
+        :param run_python: Whether or not `python` may be run to find its version. If False and the version is not
+            known from an earlier run, the instance can not compile anything and its fingerprint is
+            UNKNOWN_FINGERPRINT.
+        """
+        self.python = python or sys.executable
+        self.drop_sources = drop_sources
+
+        self.magic_number = _Bytecode._get_magic_number(self.python, run_python)
+        if self.magic_number is None:
+            self.fingerprint = _Bytecode.UNKNOWN_FINGERPRINT
+        else:
+            self.fingerprint = self.magic_number + ('-no-sources' if drop_sources else '')
+
+    @staticmethod
+    def get(options: _Options, run_python=True):
+        """
+        Returns the instance for the options, creating it the first time.
+
+        :param options: An instance of _Options, being used by the script.
+        :param run_python: Whether or not the python executable may be run to find its version, see `__init__`.
+        :return: Type[_Bytecode] None if 'Precompile Bytecode' is false.
+        """
+        if not options.precompile_bytecode:
+            return None
+
+        key = (options.bytecode_python, options.drop_sources)
+        if key in _Bytecode._instances:
+            return _Bytecode._instances[key]
+
+        bytecode = _Bytecode(options.bytecode_python, options.drop_sources, run_python)
+        # Instances of unknown versions are made again, since a later call may run the executable.
+        if bytecode.magic_number is not None:
+            _Bytecode._instances[key] = bytecode
+        return bytecode
+
+    @staticmethod
+    def _get_magic_number(python, run_python=True) -> str:
+        """
+        Finds the magic number of the .pyc files of a python executable, and checks that its version is supported.
+        Exits the script if the executable can not be run or is too old.
+
+        The python running SSP is never run. The versions of other executables are kept in VERSIONS_FILENAME by
+        their path, size and modification time, so they are only run again once they changed.
+
+        :param python: The python executable.
+        :param run_python: Whether or not the executable may be run if its version is not kept.
+        :return: Type[str] the magic number, in hexadecimal, None if `run_python` is False and it is not kept.
+        """
+        if python == sys.executable:
+            return importlib.util.MAGIC_NUMBER.hex()
+
+        executable = os.path.realpath(shutil.which(python) or python)
+        try:
+            stat = os.stat(executable)
+            executable_stat = [stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            executable_stat = None
+
+        versions = {}
+        try:
+            with open(_Bytecode.VERSIONS_FILENAME, 'r') as file:
+                data = json.load(file)
+            if data.get('version') == _Bytecode.VERSIONS_VERSION:
+                versions = data.get('pythons', {})
+        except (OSError, ValueError):
+            pass
+
+        kept = versions.get(executable)
+        if executable_stat is not None and kept is not None and kept.get('stat') == executable_stat:
+            return kept['magic_number']
+        if not run_python:
+            return None
+
+        try:
+            output = subprocess.run([python, '-c', _Bytecode.VERSION_SCRIPT], stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, check=True, universal_newlines=True).stdout.split()
+            magic_number = output[0]
+            version = (int(output[1]), int(output[2]))
+        except (OSError, subprocess.CalledProcessError, IndexError, ValueError):
+            logging.error(f"Unable to run '{python}' to compile the archives. Make sure that "
+                          f"'{_OptionsConfigurationKeys.BYTECODE_PYTHON}' is the path of a python executable.")
+            exit(1)
+
+        if version < (3, 7):
+            logging.error(f"Unable to compile the archives for python {version[0]}.{version[1]}, "
+                          f"python 3.7 or newer is needed.")
+            exit(1)
+
+        if executable_stat is not None:
+            versions[executable] = {'stat': executable_stat, 'magic_number': magic_number}
+            os.makedirs(_Bytecode.DIRECTORY, exist_ok=True)
+            temp_filename = f"{_Bytecode.VERSIONS_FILENAME}.{os.getpid()}.tmp"
+            with open(temp_filename, 'w') as file:
+                json.dump({'version': _Bytecode.VERSIONS_VERSION, 'pythons': versions}, file, indent=2,
+                          sort_keys=True)
+            os.replace(temp_filename, _Bytecode.VERSIONS_FILENAME)
+
+        return magic_number
+
+    def compile(self, sources) -> {str: bytes}:
+        """
+        Compiles python sources, reusing the files compiled before.
+
+        Sources that can not be compiled for the python version, e.g. because of a syntax error, are logged and left
+        out, so only their source is archived.
+
+        :param sources: Type{str: bytes} the contents of every .py file, by its name in the archive.
+        :return: Type{str: bytes} the contents of every .pyc file, by the name of its source in the archive.
+        """
+        directory = os.path.join(_Bytecode.DIRECTORY, self.magic_number)
+        cached_files = {}
+        for (archive_name, data) in sources.items():
+            # The name is compiled in, it is the file name shown in the executors' tracebacks.
+            key = hashlib.sha256(archive_name.encode() + b'\0' + data).hexdigest()
+            cached_files[archive_name] = os.path.join(directory, f"{key}.pyc")
+
+        missing_files = [archive_name for archive_name in sorted(sources)
+                         if not os.path.isfile(cached_files[archive_name])]
+        failures = {}
+        if len(missing_files) > 0:
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.TemporaryDirectory(dir=directory) as temp_dir:
+                jobs = []
+                for (idx, archive_name) in enumerate(missing_files):
+                    source = os.path.join(temp_dir, f"{idx}.py")
+                    with open(source, 'wb') as file:
+                        file.write(sources[archive_name])
+                    jobs.append([source, cached_files[archive_name], archive_name])
+
+                result = subprocess.run([self.python, '-c', _Bytecode.COMPILE_SCRIPT], input=json.dumps(jobs),
+                                        stdout=subprocess.PIPE, universal_newlines=True)
+                if result.returncode != 0:
+                    logging.error(f"Unable to compile the archives with '{self.python}'.")
+                    exit(1)
+                failures = json.loads(result.stdout)
+
+        for (archive_name, message) in sorted(failures.items()):
+            logging.warning(f"Unable to compile '{archive_name}', only its source is archived. {message}")
+
+        compiled_files = {}
+        for (archive_name, path) in cached_files.items():
+            if archive_name not in failures:
+                with open(path, 'rb') as file:
+                    compiled_files[archive_name] = file.read()
+        return compiled_files
+
+    def add_compiled_files(self, entries):
+        """
+        Adds the compiled files of the .py files of an archive to its entries, and leaves out the sources if
+        'Drop Sources' is true.
+
+        :param entries: Type{str: object} the entries of the archive, by their names. The values of .py files are
+            their contents, or their complete filenames on disk. Changed in place.
+        :return: None.
+        """
+        sources = {}
+        for (archive_name, value) in entries.items():
+            if archive_name.endswith('.py'):
+                if isinstance(value, bytes):
+                    sources[archive_name] = value
+                else:
+                    with open(value, 'rb') as file:
+                        sources[archive_name] = file.read()
+
+        for (archive_name, data) in self.compile(sources).items():
+            entries[archive_name + 'c'] = data
+            if self.drop_sources:
+                del entries[archive_name]
+
+
+class _ZipWriter:
+    """
+    Writes zip files by streaming files from disk through a large buffer, without loading them in memory or making
+    temporary copies of them.
+
+    Files that are already compressed, e.g. images, parquet files or nested archives, are stored as they are instead
+    of being compressed again. In reproducible mode, entries are written in sorted order, with a fixed timestamp and
+    normalized permissions, so the same files produce the same archive, byte for byte, on every run and machine.
+
+    The archive is written to a temporary file first and then moved in place, so a half written archive is never left
+    at the archive's path.
+    """
+
+    # The earliest date a zip file can hold.
+    DATE_TIME = (1980, 1, 1, 0, 0, 0)
+    DEFAULT_COMPRESSION_LEVEL = 6
+    FILE_MODE = 0o644
+    EXECUTABLE_MODE = 0o755
+    DIRECTORY_MODE = 0o755
+    # Entries are always marked as created on unix, so that the permissions are read the same everywhere.
+    CREATE_SYSTEM = 3
+    BUFFER_SIZE = 8 * 1024 * 1024
+
+    # Extensions of files whose contents are already compressed, so compressing them again gains almost nothing.
+    STORED_EXTENSIONS = frozenset([
+        '.zip', '.whl', '.egg', '.jar', '.gz', '.tgz', '.bz2', '.tbz2', '.xz', '.txz', '.zst', '.lz4', '.7z', '.rar',
+        '.snappy', '.parquet', '.orc', '.avro', '.npz',
+        '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp3', '.mp4', '.ogg', '.avi', '.mkv', '.mov', '.webm',
+        '.docx', '.xlsx', '.pptx', '.h5', '.pt', '.pth', '.onnx', '.pb', '.tflite', '.joblib',
+    ])
+
+    def __init__(self, archive_path, compression_level=DEFAULT_COMPRESSION_LEVEL, reproducible=True):
+        """
+        :param archive_path: Complete filename of the zip file to create.
+        :param compression_level: The deflate level, from 0 to 9, of the files that are compressed. With 0, every file
+            is stored as it is.
+        :param reproducible: Whether or not to normalize the order, timestamps and permissions of the entries.
+        """
+        self.archive_path = archive_path
+        self.compression_level = compression_level
+        self.reproducible = reproducible
+        self.bytes_read = 0
+        self.files_written = 0
+        self._temp_path = archive_path + '.tmp'
+        self._file = None
+        self._archive = None
+
+    def __enter__(self):
+        self._file = open(self._temp_path, 'wb', buffering=_ZipWriter.BUFFER_SIZE)
+        self._archive = zipfile.ZipFile(self._file, 'w')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._archive.close()
+        self._file.close()
+        if exc_type is None:
+            os.replace(self._temp_path, self.archive_path)
+        else:
+            os.remove(self._temp_path)
+
+    def _create_zip_info(self, archive_name, full_path=None, size=0) -> zipfile.ZipInfo:
+        """
+        Creates the header of an entry, choosing whether its contents are compressed or stored.
+
+        :param archive_name: The name of the entry in the archive, ending with '/' for directories.
+        :param full_path: The complete path of the file or directory on disk, None if the contents are in memory.
+        :param size: The size of the contents.
+        :return: Type[zipfile.ZipInfo]
+        """
+        if full_path is not None and not self.reproducible:
+            zip_info = zipfile.ZipInfo.from_file(full_path, archive_name)
+        else:
+            zip_info = zipfile.ZipInfo(archive_name, date_time=_ZipWriter.DATE_TIME)
+            zip_info.create_system = _ZipWriter.CREATE_SYSTEM
+            if archive_name.endswith('/'):
+                zip_info.external_attr = (0o40000 | _ZipWriter.DIRECTORY_MODE) << 16 | 0x10
+            else:
+                executable = full_path is not None and os.access(full_path, os.X_OK)
+                mode = _ZipWriter.EXECUTABLE_MODE if executable else _ZipWriter.FILE_MODE
+                zip_info.external_attr = (0o100000 | mode) << 16
+
+        # Lets zipfile decide whether the entry needs the zip64 format before its contents are streamed.
+        zip_info.file_size = size
+
+        extension = os.path.splitext(archive_name)[1].lower()
+        if archive_name.endswith('/') or self.compression_level == 0 or extension in _ZipWriter.STORED_EXTENSIONS:
+            zip_info.compress_type = zipfile.ZIP_STORED
+        else:
+            zip_info.compress_type = zipfile.ZIP_DEFLATED
+            # zipfile only reads the level from the entry when it is opened for writing with a ZipInfo.
+            zip_info._compresslevel = self.compression_level
+
+        return zip_info
+
+    def add_file(self, archive_name, full_path):
+        """
+        Streams a file from disk into the archive.
+
+        :param archive_name: The name of the entry in the archive.
+        :param full_path: The complete path of the file on disk.
+        :return: None.
+        """
+        size = os.path.getsize(full_path)
+        zip_info = self._create_zip_info(archive_name, full_path, size)
+        with open(full_path, 'rb') as source, self._archive.open(zip_info, 'w') as destination:
+            shutil.copyfileobj(source, destination, _ZipWriter.BUFFER_SIZE)
+        self.bytes_read += size
+        self.files_written += 1
+
+    def add_data(self, archive_name, data):
+        """
+        Writes contents held in memory into the archive.
+
+        :param archive_name: The name of the entry in the archive.
+        :param data: Type[bytes] the contents.
+        :return: None.
+        """
+        with self._archive.open(self._create_zip_info(archive_name, size=len(data)), 'w') as destination:
+            destination.write(data)
+        self.files_written += 1
+
+    def add_directory_contents(self, directory, scanned_entries=None, bytecode=None):
+        """
+        Adds the directories and files under `directory` to the root of the archive.
+
+        :param directory: The directory whose contents are added.
+        :param scanned_entries: The files and directories to add, as returned by `_IgnoreRules.scan`. None adds all.
+        :param bytecode: An instance of _Bytecode, the .py files are compiled with. None to only add the sources.
+        :return: None.
+        """
+        if scanned_entries is None:
+            scanned_entries = _IgnoreRules([]).scan(directory)
+
+        entries = {}
+        for (relative_path, entry) in scanned_entries:
+            entries[relative_path + '/' if entry.is_dir() else relative_path] = entry.path
+
+        if bytecode is not None:
+            bytecode.add_compiled_files(entries)
+
+        archive_names = sorted(entries) if self.reproducible else list(entries)
+
+        for archive_name in archive_names:
+            value = entries[archive_name]
+            if isinstance(value, bytes):
+                self.add_data(archive_name, value)
+            elif archive_name.endswith('/'):
+                with self._archive.open(self._create_zip_info(archive_name, value), 'w'):
+                    pass
+            else:
+                self.add_file(archive_name, value)
+
+
+class _PyFilesBundle:
+    """
+    Merges code dependencies into a single site-packages like zip file, so that spark-submit distributes one file
+    and executors have one entry on their `sys.path` instead of one per dependency.
+
+    .py files are placed at the root of the bundle, and the contents of zip, egg and pure python wheel files are
+    extracted into it. Everything else, e.g. wheels with compiled extensions, is left as a separate file.
+    """
+
+    FILENAME = 'py_files.zip'
+    MERGED_ARCHIVE_EXTENSIONS = ('.zip', '.egg', '.whl')
+
+    @staticmethod
+    def _is_pure_wheel(archive: zipfile.ZipFile) -> bool:
+        """
+        Reads the WHEEL metadata file of a wheel to know whether it only holds pure python code.
+
+        :param archive: The opened wheel.
+        :return: Type[bool]
+        """
+        for name in archive.namelist():
+            parts = name.split('/')
+            if len(parts) == 2 and parts[0].endswith('.dist-info') and parts[1] == 'WHEEL':
+                metadata = archive.read(name).decode('utf-8', 'replace')
+                return any(line.strip().lower() == 'root-is-purelib: true' for line in metadata.splitlines())
+        return False
+
+    @staticmethod
+    def _read_archive(path) -> {str: bytes}:
+        """
+        Reads the files of a zip, egg or pure python wheel.
+
+        The purelib and platlib directories of a wheel's .data directory are moved to the root, and its other
+        directories, e.g. scripts, are dropped, the way pip would install them.
+
+        :param path: Complete filename of the archive.
+        :return: Type{str: bytes} the contents of every file, by its name in the bundle. None if the archive is a wheel
+            that is not pure python.
+        """
+        files = {}
+        with zipfile.ZipFile(path) as archive:
+            is_wheel = path.endswith('.whl')
+            if is_wheel and not _PyFilesBundle._is_pure_wheel(archive):
+                return None
+
+            for name in archive.namelist():
+                if name.endswith('/'):
+                    continue
+                if is_wheel:
+                    data_dir = re.match(r'^[^/]+\.data/([^/]+)/(.+)$', name)
+                    if data_dir:
+                        if data_dir.group(1) not in ('purelib', 'platlib'):
+                            continue
+                        files[data_dir.group(2)] = archive.read(name)
+                        continue
+                files[name] = archive.read(name)
+
+        return files
+
+    @staticmethod
+    def _is_root_init(archive_name) -> bool:
+        """
+        Checks whether a file is an `__init__` module at the root of a dependency, e.g. because a package directory was
+        archived without its parent. Such files are never imported from the root of a `sys.path` entry, so they are
+        left out of the bundle instead of being reported as conflicts.
+
+        :param archive_name: The name of a file in the bundle.
+        :return: Type[bool]
+        """
+        return re.match(r'^(__pycache__/)?__init__(\.[^/]*)?\.(py|pyc)$', archive_name) is not None
+
+    @staticmethod
+    def _get_top_level_module(archive_name) -> (str, str):
+        """
+        Returns the name of the top level module or package a file belongs to.
+
+        :param archive_name: The name of a file in the bundle.
+        :return: Type(str, str) the name and whether it is a 'module' or a 'package'. None if the file does not belong
+            to an importable name, e.g. a .dist-info file.
+        """
+        parts = archive_name.split('/')
+        if len(parts) == 1:
+            name, extension = os.path.splitext(parts[0])
+            if extension in ('.py', '.pyc', '.so', '.pyd'):
+                return name.split('.')[0], 'module'
+            return None
+        if parts[0].endswith('.dist-info') or parts[0].endswith('.egg-info') or parts[0] == 'EGG-INFO' \
+                or parts[0] == '__pycache__':
+            return None
+        return parts[0], 'package'
+
+    @staticmethod
+    def _find_conflicts(origins) -> [str]:
+        """
+        Finds the top level modules that are provided by more than one dependency.
+
+        Packages spread over several dependencies, i.e. namespace packages, are allowed as long as no file is
+        provided twice with different contents.
+
+        :param origins: Type{str: {str: bytes}} the files of every dependency, by the dependency's filename.
+        :return: Type[str] a description of every conflict.
+        """
+        conflicts = []
+        file_origins = {}
+        module_origins = {}
+
+        for (origin, files) in origins.items():
+            for (archive_name, data) in files.items():
+                if archive_name in file_origins:
+                    (other_origin, other_data) = file_origins[archive_name]
+                    if other_data != data:
+                        conflicts.append(f"'{archive_name}' is provided by both '{other_origin}' and '{origin}'.")
+                else:
+                    file_origins[archive_name] = (origin, data)
+
+                module = _PyFilesBundle._get_top_level_module(archive_name)
+                if module is not None:
+                    module_origins.setdefault(module[0], {}).setdefault(origin, set()).add(module[1])
+
+        for (module, providers) in sorted(module_origins.items()):
+            kinds = set().union(*providers.values())
+            if len(providers) > 1 and 'module' in kinds:
+                conflicts.append(f"Top level module '{module}' is provided by each of: "
+                                 f"{', '.join(sorted(providers))}.")
+
+        return conflicts
+
+    @staticmethod
+    def get_settings(compression_level, bytecode=None) -> {str: object}:
+        """
+        Returns what the bundle is made with, stored in its _ArchiveCache entry so that the bundle is made again when
+        any of it changes. The bundle is always written in reproducible mode.
+
+        :param compression_level: The deflate level of the bundle's entries, see _ZipWriter.
+        :param bytecode: An instance of _Bytecode, the .py files of the bundle are compiled with, if any.
+        :return: Type{str: object}
+        """
+        return {'compression_level': compression_level, 'reproducible': True,
+                'bytecode': bytecode.fingerprint if bytecode is not None else None}
+
+    @staticmethod
+    def create(code_files, archive_path, compression_level, cache: _ArchiveCache, bytecode=None) -> [str]:
+        """
+        Merges `code_files` into the bundle `archive_path`.
+
+        Exits the script if two of the files provide the same top level module.
+
+        :param code_files: Complete filenames of the code dependencies.
+        :param archive_path: Complete filename of the bundle to create.
+        :param compression_level: The deflate level of the bundle's entries, see _ZipWriter.
+        :param cache: An instance of _ArchiveCache, used to skip the bundle if none of `code_files` changed.
+        :param bytecode: An instance of _Bytecode, the .py files of the bundle are compiled with. None to only bundle
+            the sources.
+        :return: Type[str] complete filenames of the code dependencies to pass to spark-submit instead of
+            `code_files`, the bundle being the first one.
+        """
+        existing_files = [path for path in code_files if os.path.isfile(path)]
+        for path in code_files:
+            if path not in existing_files:
+                logging.warning(f"Code dependency '{path}' does not exist. It is not added to the bundle.")
+
+        settings = _PyFilesBundle.get_settings(compression_level, bytecode)
+        entry = cache.get_files_entry(existing_files, archive_path, **settings)
+        if entry is not None:
+            logging.debug(f"Reusing bundle '{archive_path}'.")
+            return [archive_path] + entry['separate_files']
+
+        logging.info("Bundling code dependencies...")
+
+        origins = {}
+        separate_files = []
+        for path in existing_files:
+            if path.endswith('.py'):
+                with open(path, 'rb') as file:
+                    origins[path] = {os.path.basename(path): file.read()}
+            elif path.lower().endswith(_PyFilesBundle.MERGED_ARCHIVE_EXTENSIONS):
+                files = _PyFilesBundle._read_archive(path)
+                if files is None:
+                    logging.warning(f"'{path}' is not a pure python wheel. It is sent as a separate file.")
+                    separate_files.append(path)
+                else:
+                    origins[path] = files
+            else:
+                separate_files.append(path)
+
+        for files in origins.values():
+            for archive_name in [name for name in files if _PyFilesBundle._is_root_init(name)]:
+                del files[archive_name]
+
+        conflicts = _PyFilesBundle._find_conflicts(origins)
+        if len(conflicts) > 0:
+            conflicts_str = '\n  '.join(conflicts)
+            logging.error(f"\n  Unable to bundle the code dependencies, some of them conflict:\n  {conflicts_str}\n  ")
+            exit(1)
+
+        entries = {}
+        for files in origins.values():
+            for (archive_name, data) in files.items():
+                entries.setdefault(archive_name, data)
+
+        if bytecode is not None:
+            bytecode.add_compiled_files(entries)
+
+        os.makedirs(os.path.dirname(archive_path) or '.', exist_ok=True)
+        with _ZipWriter(archive_path, compression_level, reproducible=True) as writer:
+            for archive_name in sorted(entries):
+                writer.add_data(archive_name, entries[archive_name])
+        cache.update_files_entry(existing_files, archive_path, separate_files=separate_files, **settings)
+
+        return [archive_path] + separate_files
+
+
+class _ShippedFiles:
+    """
+    Drops the files that would be shipped more than once, and finds the files that would shadow each other on the
+    executors.
+
+    Spark places every `--py-files`, `--files` and `--archives` file in the working directory of the executors by its
+    name, so a file is a duplicate if it is listed under the same real path, or under the same name with the same
+    contents. Two different files with the same name are a conflict, since only one of them can be placed.
+    """
+
+    def __init__(self):
+        self._real_paths = set()
+        self._names = {}
+        self.conflicts = []
+
+    def add(self, paths) -> [str]:
+        """
+        Normalizes the paths and drops the ones that were already added.
+
+        :param paths: Complete filenames of files to ship.
+        :return: Type[str] the normalized complete filenames that were not added before, in the same order.
+        """
+        kept_paths = []
+        for path in paths:
+            path = os.path.normpath(path)
+            real_path = os.path.realpath(path)
+            if real_path in self._real_paths:
+                logging.debug(f"'{path}' is listed more than once. It is only shipped once.")
+                continue
+
+            name = os.path.basename(path)
+            other_path = self._names.get(name)
+            if other_path is not None:
+                if os.path.isfile(path) and os.path.isfile(other_path) and \
+                        _RequirementsLock.hash_file(path) == _RequirementsLock.hash_file(other_path):
+                    logging.debug(f"'{path}' is a copy of '{other_path}'. It is only shipped once.")
+                    self._real_paths.add(real_path)
+                    continue
+                self.conflicts.append(f"'{path}' and '{other_path}' are different files with the same name.")
+            else:
+                self._names[name] = path
+
+            self._real_paths.add(real_path)
+            kept_paths.append(path)
+
+        return kept_paths
+
+    @staticmethod
+    def _get_top_level_modules(path) -> {str: bool}:
+        """
+        Lists the top level modules and packages a code dependency puts on the `sys.path` of the executors.
+
+        :param path: Complete filename of the code dependency.
+        :return: Type{str: bool} the names, and whether each one is a module or a regular package, i.e. not a namespace
+            package that can be spread over several dependencies.
+        """
+        if path.endswith('.py'):
+            return {os.path.splitext(os.path.basename(path))[0]: True}
+        if not path.lower().endswith(_PyFilesBundle.MERGED_ARCHIVE_EXTENSIONS) or not os.path.isfile(path):
+            return {}
+
+        try:
+            with zipfile.ZipFile(path) as archive:
+                names = archive.namelist()
+        except zipfile.BadZipFile:
+            return {}
+
+        modules = {}
+        for name in names:
+            data_dir = re.match(r'^[^/]+\.data/(?:purelib|platlib)/(.+)$', name)
+            if data_dir:
+                name = data_dir.group(1)
+            if name.endswith('/') or _PyFilesBundle._is_root_init(name):
+                continue
+
+            module = _PyFilesBundle._get_top_level_module(name)
+            if module is None:
+                continue
+            regular = module[1] == 'module' or re.match(r'^[^/]+/__init__\.(py|pyc)$', name) is not None
+            modules[module[0]] = modules.get(module[0], False) or regular
+
+        return modules
+
+    @staticmethod
+    def find_shadowed_modules(code_files) -> [str]:
+        """
+        Finds the top level modules that are provided by more than one code dependency. The executors only import the
+        one that comes first on their `sys.path`.
+
+        :param code_files: Complete filenames of the code dependencies.
+        :return: Type[str] a description of every shadowed module.
+        """
+        providers = {}
+        for path in code_files:
+            for (module, regular) in _ShippedFiles._get_top_level_modules(path).items():
+                providers.setdefault(module, {})[path] = regular
+
+        conflicts = []
+        for (module, origins) in sorted(providers.items()):
+            if len(origins) > 1 and any(origins.values()):
+                conflicts.append(f"Top level module '{module}' is provided by each of: {', '.join(origins)}.")
+
+        return conflicts
+
+    @staticmethod
+    def report(conflicts, fail):
+        """
+        Logs the conflicts, and exits the script if `fail` is True.
+
+        :param conflicts: Descriptions of the conflicts.
+        :param fail: Whether or not conflicts stop the script.
+        :return: None.
+        """
+        if len(conflicts) == 0:
+            return
+
+        conflicts_str = '\n  '.join(conflicts)
+        if fail:
+            logging.error(f"\n  Some of the shipped files conflict:\n  {conflicts_str}\n  ")
+            exit(1)
+        logging.warning(f"\n  Some of the shipped files conflict, the executors will only see one of each:\n"
+                        f"  {conflicts_str}\n  ")
+
+
+class _SizeReport:
+    """
+    Breaks the shipped files down by size, and checks them against the budgets of the [OPTIONS] section's
+    'Size Budgets' key.
+
+    Every shipped file belongs to one category: 'wheels', 'archives' for the other zip and egg files of
+    `--py-files`, e.g. the archives of directories, 'code' for its remaining files, 'environment' for the packed
+    virtual environment, and 'assets' for the rest of `--files` and `--archives`. Budgets are set per category, and
+    for the 'total', on the size of the files as they are shipped.
+    """
+
+    CATEGORIES = ['wheels', 'archives', 'code', 'environment', 'assets']
+    TOTAL = 'total'
+
+    # The number of the largest files listed for every archive.
+    LARGEST_FILES = 5
+
+    UNITS = {'': 1, 'b': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+    @staticmethod
+    def parse_size(value) -> int:
+        """
+        Reads a size such as '200 MiB', '1.5GB' or '512k'. Units are powers of 1024.
+
+        :param value: The size.
+        :return: Type[int] the number of bytes.
+        """
+        match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?\s*$', value, re.IGNORECASE)
+        if match is None:
+            raise ValueError(f"'{value}' is not a size.")
+        return int(float(match.group(1)) * _SizeReport.UNITS[match.group(2).lower()])
+
+    @staticmethod
+    def parse_budgets(lines) -> {str: int}:
+        """
+        Reads the lines of the 'Size Budgets' key, e.g. 'wheels = 200 MiB'.
+
+        :param lines: The lines.
+        :return: Type{str: int} the budget of every category, in bytes.
+        """
+        budgets = {}
+        for line in lines:
+            if line.strip() == '':
+                continue
+            (category, _, size) = line.partition('=')
+            category = category.strip().lower()
+            if category not in _SizeReport.CATEGORIES and category != _SizeReport.TOTAL:
+                raise ValueError(f"'{category}' is not a category.")
+            budgets[category] = _SizeReport.parse_size(size)
+        return budgets
+
+    @staticmethod
+    def _get_category(path, argument) -> str:
+        """
+        :param path: The complete filename of a shipped file, with its '#alias' if it has one.
+        :param argument: 'py_files', 'files' or 'archives', the spark-submit argument the file is passed to.
+        :return: Type[str] the category of the file.
+        """
+        filename = path.split('#')[0].lower()
+        if argument == 'py_files':
+            if filename.endswith('.whl'):
+                return 'wheels'
+            if filename.endswith(('.zip', '.egg')):
+                return 'archives'
+            return 'code'
+        if argument == 'archives' and filename.endswith(_VirtualEnvironment.ARCHIVE_FILENAME):
+            return 'environment'
+        return 'assets'
+
+    @staticmethod
+    def _list_archive(path) -> (int, [(str, int)]):
+        """
+        Reads the sizes of the files in a zip or tar archive, without extracting them.
+
+        :param path: The complete filename of the archive.
+        :return: Type(int, [(str, int)]) the total size of the files and the largest of them, by their names. None if
+            the file is not an archive.
+        """
+        import tarfile
+
+        sizes = []
+        try:
+            if zipfile.is_zipfile(path):
+                with zipfile.ZipFile(path) as archive:
+                    sizes = [(info.filename, info.file_size) for info in archive.infolist() if not info.is_dir()]
+            elif tarfile.is_tarfile(path):
+                with tarfile.open(path) as archive:
+                    sizes = [(info.name, info.size) for info in archive if info.isfile()]
+            else:
+                return None
+        except (OSError, zipfile.BadZipFile, tarfile.TarError):
+            return None
+
+        largest_files = sorted(sizes, key=lambda file: (-file[1], file[0]))[:_SizeReport.LARGEST_FILES]
+        return sum(size for (_, size) in sizes), largest_files
+
+    @staticmethod
+    def analyze(py_files, files, archives, details=False) -> [dict]:
+        """
+        Measures every shipped file.
+
+        :param py_files: Complete filenames of the code dependencies.
+        :param files: Complete filenames of the file assets.
+        :param archives: Complete filenames of the archive assets.
+        :param details: Whether or not the archives are opened to read the sizes of their files.
+        :return: Type[dict] for every file, its 'path', 'category', 'size', and if `details` is True, the
+            'uncompressed_size' and 'largest_files' of archives.
+        """
+        artifacts = []
+        for (argument, paths) in [('py_files', py_files), ('files', files), ('archives', archives)]:
+            for path in paths:
+                filename = path.split('#')[0]
+                artifact = {'path': path, 'category': _SizeReport._get_category(path, argument),
+                            'size': os.path.getsize(filename) if os.path.isfile(filename) else 0}
+                if details and os.path.isfile(filename):
+                    contents = _SizeReport._list_archive(filename)
+                    if contents is not None:
+                        artifact['uncompressed_size'], artifact['largest_files'] = contents
+                artifacts.append(artifact)
+        return artifacts
+
+    @staticmethod
+    def get_totals(artifacts) -> {str: int}:
+        """
+        :param artifacts: The output of `analyze`.
+        :return: Type{str: int} the size of every category, and the 'total'.
+        """
+        totals = {category: 0 for category in _SizeReport.CATEGORIES}
+        for artifact in artifacts:
+            totals[artifact['category']] += artifact['size']
+        totals[_SizeReport.TOTAL] = sum(totals.values())
+        return totals
+
+    @staticmethod
+    def check_budgets(artifacts, budgets) -> [str]:
+        """
+        Compares the sizes of the categories with their budgets.
+
+        :param artifacts: The output of `analyze`.
+        :param budgets: Type{str: int} the budget of every category, see `parse_budgets`.
+        :return: Type[str] a description of every budget that is exceeded.
+        """
+        totals = _SizeReport.get_totals(artifacts)
+        return [f"'{category}' is {_Metrics.format_size(totals[category])}, over its budget of "
+                f"{_Metrics.format_size(budget)}." for (category, budget) in budgets.items()
+                if totals[category] > budget]
+
+    @staticmethod
+    def format(artifacts) -> str:
+        """
+        Makes a table of the shipped files by category, the largest first, with the largest files of every archive.
+
+        :param artifacts: The output of `analyze`, with details.
+        :return: Type[str]
+        """
+        def format_row(name, size, uncompressed_size=None):
+            uncompressed_str = _Metrics.format_size(uncompressed_size) if uncompressed_size is not None else ''
+            return f"{name:<80} {_Metrics.format_size(size):>11} {uncompressed_str:>13}"
+
+        totals = _SizeReport.get_totals(artifacts)
+        lines = [f"{'Shipped file':<80} {'Size':>11} {'Uncompressed':>13}"]
+        for category in _SizeReport.CATEGORIES:
+            category_artifacts = [artifact for artifact in artifacts if artifact['category'] == category]
+            if len(category_artifacts) == 0:
+                continue
+
+            lines.append(format_row(category, totals[category]))
+            for artifact in sorted(category_artifacts, key=lambda artifact: (-artifact['size'], artifact['path'])):
+                lines.append(format_row(f"  {artifact['path']}", artifact['size'], artifact.get('uncompressed_size')))
+                for (name, size) in artifact.get('largest_files', []):
+                    lines.append(format_row(f"      {name}", size))
+        lines.append(format_row(_SizeReport.TOTAL.capitalize(), totals[_SizeReport.TOTAL]))
+        return '\n'.join(lines)
+
+
+class _ImportGraph:
+    """
+    Finds the code dependencies an application can import, by following the import statements of the application
+    file through the sources of the code dependencies.
+
+    Code is kept or pruned by top level module or package of every `sys.path` entry the executors get: a .py file, a
+    zip, egg or wheel file, or a top level directory of the Source Code or Include Code Directory. Once a top level
+    name is imported, all of its sources are followed, and it is shipped as a whole. Modules imported with
+    `__import__` or `importlib.import_module` are followed when their name is a string literal, other dynamic imports
+    are listed in the allowlist.
+    """
+
+    CODE_EXTENSIONS = ('.py', '.pyc', '.so', '.pyd')
+
+    def __init__(self, application_file, allowlist):
+        """
+        :param application_file: The python file passed to spark-submit.
+        :param allowlist: Names of modules that are always treated as imported.
+        """
+        self.application_file = application_file
+        self.allowlist = [name.split('.')[0] for name in allowlist]
+        # The sources of every top level name, by the sys.path entry providing it.
+        self._providers = {}
+        # The names of the files and directories of every top level name of a directory.
+        self._entry_names = {}
+        self._imports = {}
+        self._reached = {}
+        self._added_paths = set()
+
+    def _add_name(self, origin, name, sources, entry_name=None):
+        self._providers.setdefault(name, {}).setdefault(origin, []).extend(sources)
+        if entry_name is not None:
+            self._entry_names.setdefault(origin, {}).setdefault(name, []).append(entry_name)
+
+    def add_file(self, path):
+        """
+        Adds the top level names of a .py, zip, egg or wheel file.
+
+        :param path: Complete filename of the file.
+        :return: None.
+        """
+        path = os.path.normpath(path)
+        if path in self._added_paths:
+            return
+        self._added_paths.add(path)
+
+        if path.endswith('.py'):
+            self._add_name(path, os.path.splitext(os.path.basename(path))[0], [path])
+            return
+        if not path.lower().endswith(_PyFilesBundle.MERGED_ARCHIVE_EXTENSIONS) or not os.path.isfile(path):
+            return
+
+        try:
+            with zipfile.ZipFile(path) as archive:
+                names = archive.namelist()
+        except zipfile.BadZipFile:
+            return
+
+        for member in names:
+            name = member
+            data_dir = re.match(r'^[^/]+\.data/(?:purelib|platlib)/(.+)$', member)
+            if data_dir:
+                name = data_dir.group(1)
+            if name.endswith('/') or _PyFilesBundle._is_root_init(name):
+                continue
+
+            module = _PyFilesBundle._get_top_level_module(name)
+            if module is not None:
+                self._add_name(path, module[0], [(path, member)] if member.endswith('.py') else [])
+
+    def add_directory(self, directory):
+        """
+        Adds the top level names of a directory that is archived, i.e. its .py files and its sub directories that
+        hold .py files. Other files and directories are always shipped.
+
+        :param directory: The directory.
+        :return: None.
+        """
+        directory = os.path.normpath(directory)
+        with os.scandir(directory) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if entry.is_dir():
+                    sources = [os.path.join(root, filename) for (root, _, filenames) in os.walk(entry.path)
+                               for filename in sorted(filenames) if filename.endswith('.py')]
+                    if len(sources) > 0:
+                        self._add_name(directory, entry.name, sources, entry.name)
+                elif os.path.splitext(entry.name)[1] in _ImportGraph.CODE_EXTENSIONS and \
+                        not _PyFilesBundle._is_root_init(entry.name):
+                    sources = [entry.path] if entry.name.endswith('.py') else []
+                    self._add_name(directory, entry.name.split('.')[0], sources, entry.name)
+
+    def _get_imports(self, source) -> {str}:
+        """
+        Lists the top level names a source file imports. Relative imports are left out, since they never leave the
+        top level package they are in.
+
+        :param source: The complete filename of the file, or the complete filename of an archive and the name of the
+            file in it.
+        :return: Type{str}
+        """
+        import ast
+
+        if source in self._imports:
+            return self._imports[source]
+
+        try:
+            if isinstance(source, tuple):
+                with zipfile.ZipFile(source[0]) as archive:
+                    code = archive.read(source[1])
+            else:
+                with open(source, 'rb') as file:
+                    code = file.read()
+            tree = ast.parse(code)
+        except (OSError, SyntaxError, ValueError) as e:
+            logging.warning(f"Unable to read the imports of '{source}': {e}")
+            tree = None
+
+        names = set()
+        for node in ast.walk(tree) if tree is not None else []:
+            if isinstance(node, ast.Import):
+                names.update(alias.name.split('.')[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module is not None:
+                names.add(node.module.split('.')[0])
+            elif isinstance(node, ast.Call) and len(node.args) > 0 and \
+                    getattr(node.func, 'id', getattr(node.func, 'attr', None)) in ('__import__', 'import_module'):
+                try:
+                    name = ast.literal_eval(node.args[0])
+                except ValueError:
+                    continue
+                if isinstance(name, str) and not name.startswith('.'):
+                    names.add(name.split('.')[0])
+
+        self._imports[source] = names
+        return names
+
+    def update(self):
+        """
+        Follows the imports from the application file and the allowlist through the added files and directories.
+
+        :return: None.
+        """
+        pending_names = list(self.allowlist) + sorted(self._get_imports(os.path.normpath(self.application_file)))
+        visited_names = set()
+        self._reached = {}
+
+        while len(pending_names) > 0:
+            name = pending_names.pop()
+            if name in visited_names:
+                continue
+            visited_names.add(name)
+
+            for (origin, sources) in self._providers.get(name, {}).items():
+                self._reached.setdefault(origin, set()).add(name)
+                for source in sources:
+                    pending_names.extend(self._get_imports(source))
+
+    def is_imported(self, origin) -> bool:
+        """
+        Checks whether anything of a file or directory is imported. Files and directories without any top level
+        names, e.g. a LICENSE file, are always treated as imported.
+
+        :param origin: The complete filename of the file or directory.
+        :return: Type[bool]
+        """
+        origin = os.path.normpath(origin)
+        has_names = any(origin in origins for origins in self._providers.values())
+        return not has_names or len(self._reached.get(origin, ())) > 0
+
+    def get_excluded_entries(self, directory) -> [str]:
+        """
+        Lists the top level files and directories of an archived directory that are not imported.
+
+        :param directory: The directory.
+        :return: Type[str] names of the files and directories to leave out of the archive.
+        """
+        directory = os.path.normpath(directory)
+        reached = self._reached.get(directory, set())
+        return sorted(entry_name for (name, entry_names) in self._entry_names.get(directory, {}).items()
+                      if name not in reached for entry_name in entry_names)
+
+
+def _archive_directory(directory_path, archive_path, fingerprint, compression_level, reproducible,
+                       excluded_entries=(), ignore_rules=None, bytecode=None) -> (dict, dict):
+    """
+    Creates a zip file of a directory. This is run by the worker processes that archive directories in parallel, so it
+    must not depend on anything but its arguments.
+
+    :param directory_path: The directory to archive.
+    :param archive_path: Complete filename of the zip file to create.
+    :param fingerprint: Whether or not to compute the directory's _ArchiveCache fingerprint.
+    :param compression_level: The deflate level of the archive's entries, see _ZipWriter.
+    :param reproducible: Whether or not to normalize the order, timestamps and permissions of the entries.
+    :param excluded_entries: Names of top level files and directories of the directory to leave out.
+    :param ignore_rules: An instance of _IgnoreRules, the files and directories it leaves out are not archived.
+    :param bytecode: An instance of _Bytecode, the .py files are compiled with. None to only archive the sources.
+    :return: Type(dict, dict) the fingerprint of the directory, None if `fingerprint` is False, and the metrics of
+        the archiving, see `_Metrics.add`.
+    """
+    wall_time = time.perf_counter()
+    cpu_time = time.thread_time()
+
+    # The directory is only traversed once, for both the fingerprint and the archive.
+    scanned_entries = (ignore_rules or _IgnoreRules([])).scan(directory_path, excluded_entries)
+
+    entry = None
+    if fingerprint:
+        entry = _ArchiveCache.create_entry(directory_path, scanned_entries, ignore_rules, bytecode, compression_level,
+                                           reproducible)
+    if entry is not None and len(excluded_entries) > 0:
+        entry['excluded_entries'] = list(excluded_entries)
+    with _ZipWriter(archive_path, compression_level, reproducible) as writer:
+        writer.add_directory_contents(directory_path, scanned_entries, bytecode)
+
+    return entry, {'wall_seconds': time.perf_counter() - wall_time, 'cpu_seconds': time.thread_time() - cpu_time,
+                   'files': writer.files_written, 'bytes_read': writer.bytes_read,
+                   'bytes_written': os.path.getsize(archive_path)}
+
+
+class Requirements:
+    """
+    This class holds the responsibility of loading external packages, archiving source code and processing include files
+    and directories.
+    """
+
+    # postfixes are appended to the end of directory names to avoid conflicts.
+    ASSETS_POSTFIX = '_assets'
+    CODE_POSTFIX = '_code'
+    SOURCE_POSTFIX = '_src'
+
+    @staticmethod
+    def _load_requirements_packages(paths: _Paths, options: _Options):
+        """
+        Loads/Downloads the requirements in the requirements file in the libraries directory.
+
+        Uses the `pip wheel -r <file> -w <dir>` command. If the requirements lock is enabled, nothing is done when the
+        requirements file did not change. Otherwise the file is resolved as a whole to exact pins, see
+        `_resolve_requirements`, and only the wheels of the pins that were added or changed are fetched or built,
+        each by its own pip process, `options.get_jobs()` of them at the same time. Built wheels are kept in the
+        wheelhouse, so later runs can reuse them. The wheelhouse is the shared wheel store, if there is one, see
+        _SharedWheelStore.
+
+        :param paths: An instance of _Paths, being used by the script.
+        :param options: An instance of _Options, being used by the script.
+        :return: Type[str] complete filenames of the wheels that were written to the libraries directory.
+        """
+        if not os.path.isfile(paths.requirements_file):
+            logging.warning(f"Requirement file '{paths.requirements_file}' not found. "
+                            "Not loading any external packages.")
+            Requirements._clean_dir(paths.libraries_dir)
+            store = _SharedWheelStore.get(options)
+            if store.enabled:
+                store.set_references({}, paths.libraries_dir)
+            return []
+
+        lock = _RequirementsLock(options.use_requirements_lock)
+
+        if not lock.enabled:
+            logging.info("Loading External Packages...")
+
+            Requirements._clean_dir(paths.libraries_dir)
+
+            command_args = ['pip', 'wheel', '-r', f"{paths.requirements_file}", '-w', f"{paths.libraries_dir}"]
+
+            logging.debug(f"Running Command: {subprocess.list2cmdline(command_args)}")
+
+            subprocess.run(args=command_args)
+            return Requirements._get_file_paths_list(paths.libraries_dir)
+
+        requirements_hash = _RequirementsLock.hash_file(paths.requirements_file)
+        store = _SharedWheelStore.get(options)
+
+        if not store.enabled:
+            return Requirements._load_locked_requirements_packages(paths, options, lock, requirements_hash,
+                                                                   WHEELHOUSE_DIR)
+
+        with store.get_lock():
+            written_paths = Requirements._load_locked_requirements_packages(paths, options, lock, requirements_hash,
+                                                                            store.wheels_dir)
+            store.set_references(lock.wheels, paths.libraries_dir)
+        return written_paths
+
+    @staticmethod
+    def _load_locked_requirements_packages(paths: _Paths, options: _Options, lock: _RequirementsLock,
+                                           requirements_hash, wheelhouse_dir) -> [str]:
+        """
+        Loads the requirements of the requirements lock, see `_load_requirements_packages`.
+
+        :param paths: An instance of _Paths, being used by the script.
+        :param options: An instance of _Options, being used by the script.
+        :param lock: An instance of _RequirementsLock, it is saved when the requirements are loaded.
+        :param requirements_hash: The hash of the current requirements file.
+        :param wheelhouse_dir: The directory where every built wheel is kept.
+        :return: Type[str] complete filenames of the wheels that were written to the libraries directory.
+        """
+        if lock.is_up_to_date(requirements_hash, paths.libraries_dir):
+            logging.info("Requirements did not change. Reusing External Packages...")
+            return []
+
+        logging.info("Loading External Packages...")
+
+        if not os.path.isdir(paths.libraries_dir):
+            os.makedirs(paths.libraries_dir)
+
+        if not os.path.isdir(wheelhouse_dir):
+            os.makedirs(wheelhouse_dir)
+
+        options_lines, requirement_lines = _RequirementsLock.parse_requirements(paths.requirements_file)
+        pins = Requirements._resolve_requirements(paths.requirements_file, wheelhouse_dir)
+        if pins is None:
+            lock.save(None, requirement_lines)
+            return []
+
+        missing_pins = lock.get_missing_pins(pins, paths.libraries_dir)
+        logging.info(f"Resolved {len(pins)} packages, {len(missing_pins)} of them are added or changed.")
+        complete = True
+        written_paths = []
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=options.get_jobs()) as executor:
+            futures = [(pin, executor.submit(Requirements._build_pinned_wheel, pin, options_lines, wheelhouse_dir))
+                       for pin in missing_pins]
+
+            for (pin, future) in futures:
+                wheelhouse_path = future.result()
+                if wheelhouse_path is None:
+                    complete = False
+                    continue
+
+                wheel_path = os.path.join(paths.libraries_dir, os.path.basename(wheelhouse_path))
+                if not os.path.isfile(wheel_path):
+                    Requirements._link_or_copy(wheelhouse_path, wheel_path)
+                    written_paths.append(wheel_path)
+                lock.set_pin_wheel(pin, wheel_path)
+
+        locked_wheels = lock.get_locked_wheels()
+        for path in Requirements._get_file_paths_list(paths.libraries_dir):
+            if os.path.basename(path) not in locked_wheels:
+                logging.debug(f"Deleting unused package '{path}'.")
+                os.remove(path)
+
+        lock.save(requirements_hash if complete else None, requirement_lines)
+
+        return written_paths
+
+    @staticmethod
+    def _load_virtual_environment(paths: _Paths, options: _Options) -> [str]:
+        """
+        Creates a virtual environment, installs the requirements in it and packs it, see _VirtualEnvironment.
+
+        Nothing is done when the requirements file did not change since the environment was packed, if the
+        requirements lock is enabled. Wheels built for the requirements lock are used when they fit.
+
+        :param paths: An instance of _Paths, being used by the script.
+        :param options: An instance of _Options, being used by the script.
+        :return: Type[str] complete filenames of the files that were written, i.e. the packed environment.
+        """
+        archive_path = _VirtualEnvironment.get_archive_path(paths)
+
+        if not os.path.isfile(paths.requirements_file):
+            logging.warning(f"Requirement file '{paths.requirements_file}' not found. "
+                            "Not packing a virtual environment.")
+            if os.path.isfile(archive_path):
+                os.remove(archive_path)
+            return []
+
+        environment = _VirtualEnvironment(options.use_requirements_lock)
+        requirements_hash = _RequirementsLock.hash_file(paths.requirements_file)
+
+        if environment.is_up_to_date(requirements_hash, archive_path):
+            logging.info("Requirements did not change. Reusing the Virtual Environment...")
+            return []
+
+        logging.info("Creating the Virtual Environment...")
+
+        if os.path.isdir(_VirtualEnvironment.DIRECTORY):
+            shutil.rmtree(_VirtualEnvironment.DIRECTORY)
+
+        # Copies of the python binaries are kept, since symbolic links would point out of the unpacked archive.
+        command_args = [sys.executable, '-m', 'venv', '--copies', _VirtualEnvironment.DIRECTORY]
+        logging.debug(f"Running Command: {subprocess.list2cmdline(command_args)}")
+        if subprocess.run(args=command_args).returncode != 0:
+            logging.error(f"Unable to create the virtual environment '{_VirtualEnvironment.DIRECTORY}'.")
+            exit(1)
+
+        command_args = [_VirtualEnvironment.get_python(_VirtualEnvironment.DIRECTORY), '-m', 'pip', 'install',
+                        '-r', paths.requirements_file]
+        for wheelhouse_dir in [WHEELHOUSE_DIR, _SharedWheelStore.get(options).wheels_dir]:
+            if wheelhouse_dir is not None and os.path.isdir(wheelhouse_dir):
+                command_args.extend(['--find-links', wheelhouse_dir])
+        logging.debug(f"Running Command: {subprocess.list2cmdline(command_args)}")
+
+        complete = subprocess.run(args=command_args).returncode == 0
+        if not complete:
+            logging.error("Unable to install some of the requirements in the virtual environment. "
+                          "They will be installed again by the next run.")
+
+        logging.info("Packing the Virtual Environment...")
+        _VirtualEnvironment.pack(_VirtualEnvironment.DIRECTORY, archive_path, options.compression_level,
+                                 options.reproducible_archives)
+
+        environment.save(requirements_hash if complete else None, archive_path)
+
+        return [archive_path]
+
+    @staticmethod
+    def _load_measured_requirements_packages(paths: _Paths, options: _Options, metrics: _Metrics):
+        """
+        Runs `_load_requirements_packages` as the 'pip' stage of the metrics, or `_load_virtual_environment` as the
+        'environment' stage if the [OPTIONS] section's 'Pack Virtual Environment' is true.
+
+        :param paths: An instance of _Paths, being used by the script.
+        :param options: An instance of _Options, being used by the script.
+        :param metrics: An instance of _Metrics, the stage is recorded in.
+        :return: None.
+        """
+        if options.pack_virtual_environment:
+            stage_name, load = 'environment', Requirements._load_virtual_environment
+        else:
+            stage_name, load = 'pip', Requirements._load_requirements_packages
+
+        with metrics.measure(stage_name, children=True) as stage:
+            written_paths = load(paths, options)
+            stage.files = len(written_paths)
+            stage.bytes_written = sum(os.path.getsize(path) for path in written_paths)
+
+    @staticmethod
+    def _run_pip(command_args, description) -> subprocess.CompletedProcess:
+        """
+        Runs pip with its output captured, and logs it.
+
+        Pip runs in threads at the same time, so its output is logged once it is done instead of being printed while
+        it runs.
+
+        :param command_args: The pip command.
+        :param description: What pip does, for the logs, e.g. "requirement 'urllib3==1.26.18'".
+        :return: Type[subprocess.CompletedProcess]
+        """
+        logging.debug(f"Running Command: {subprocess.list2cmdline(command_args)}")
+
+        result = subprocess.run(args=command_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                universal_newlines=True)
+        logging.debug(f"pip output for {description}:\n{result.stdout}")
+        return result
+
+    @staticmethod
+    def _resolve_requirements(requirements_file, wheelhouse_dir) -> [str]:
+        """
+        Resolves the requirements file as a whole, like `pip install -r <file>` would, and returns the exact pin of
+        every package it installs: 'name==version' for packages of the package index, and 'name @ <url>' for those of
+        URLs, paths and version control.
+
+        Uses `pip install --dry-run --ignore-installed --report`, which needs pip 22.2 or newer. The wheelhouse is
+        added with --find-links, so packages that were built from source distributions before are found there. If
+        the package index can not be used, e.g. without network access, the wheelhouse alone is tried.
+
+        :param requirements_file: Complete filename of the requirements file.
+        :param wheelhouse_dir: The directory where every built wheel is kept.
+        :return: Type[str] the pins, None if the requirements could not be resolved.
+        """
+        with tempfile.TemporaryDirectory(prefix='ssp-') as temp_dir:
+            report_file = os.path.join(temp_dir, 'report.json')
+            command_args = ['pip', 'install', '--dry-run', '--ignore-installed', '--quiet', '--report', report_file,
+                            '-r', requirements_file, '--find-links', wheelhouse_dir]
+
+            result = Requirements._run_pip(command_args, f"the requirements file '{requirements_file}'")
+            if result.returncode != 0:
+                offline_result = Requirements._run_pip(command_args + ['--no-index'],
+                                                       f"the requirements file '{requirements_file}'")
+                if offline_result.returncode != 0:
+                    logging.error(f"Unable to resolve the requirements file '{requirements_file}'. Resolving needs "
+                                  f"pip 22.2 or newer.\n{result.stdout}")
+                    return None
+                logging.warning(f"Unable to resolve the requirements file '{requirements_file}' with the package "
+                                f"index, it was resolved with the wheels of '{wheelhouse_dir}' alone. Newer versions "
+                                f"of requirements that are not pinned may be missed.\n{result.stdout}")
+
+            with open(report_file, 'r') as file:
+                report = json.load(file)
+
+        pins = []
+        for item in report.get('install', []):
+            name = item['metadata']['name']
+            download_info = item.get('download_info', {})
+            if not item.get('is_direct'):
+                pins.append(f"{name}=={item['metadata']['version']}")
+            elif 'vcs_info' in download_info:
+                vcs_info = download_info['vcs_info']
+                pins.append(f"{name} @ {vcs_info['vcs']}+{download_info['url']}@{vcs_info['commit_id']}")
+            else:
+                pins.append(f"{name} @ {download_info['url']}")
+        return pins
+
+    @staticmethod
+    def _build_pinned_wheel(pin, options_lines, wheelhouse_dir) -> str:
+        """
+        Fetches or builds the wheel of a single pin, without its dependencies, and moves it to the wheelhouse.
+
+        Runs `pip wheel --no-deps -r <file> -w <dir> --find-links <wheelhouse>`. The temporary requirements file holds
+        the option lines, e.g. `--index-url ...`, and `pin`. The package index is only skipped, with `--no-index`, for
+        'name==version' pins whose wheel is already in the wheelhouse, see `_has_wheelhouse_wheel`, so those need no
+        network access. If that fails, e.g. the wheel is for another platform, the package index is used too.
+
+        This is run in a thread for every pin at the same time.
+
+        :param pin: The pin, see `_resolve_requirements`.
+        :param options_lines: The option lines of the requirements file.
+        :param wheelhouse_dir: The directory where every built wheel is kept.
+        :return: Type[str] complete filename of the wheel in the wheelhouse, None if pip failed.
+        """
+        # The other files the requirements file refers to were resolved with it, and editable requirements are pinned
+        # to their paths.
+        options_lines = [line for line in options_lines
+                         if line.split()[0].split('=')[0] not in ['-r', '--requirement', '-c', '--constraint', '-e',
+                                                                  '--editable']]
+
+        with tempfile.TemporaryDirectory(prefix='ssp-') as temp_dir:
+            requirements_file = os.path.join(temp_dir, 'requirements.txt')
+            wheel_dir = os.path.join(temp_dir, 'wheels')
+
+            with open(requirements_file, 'w') as file:
+                file.write('\n'.join(options_lines + [pin]) + '\n')
+
+            command_args = ['pip', 'wheel', '--no-deps', '-r', requirements_file, '-w', wheel_dir,
+                            '--find-links', wheelhouse_dir]
+
+            extra_args_list = [[]]
+            if Requirements._has_wheelhouse_wheel(pin, wheelhouse_dir):
+                extra_args_list.insert(0, ['--no-index'])
+
+            for extra_args in extra_args_list:
+                result = Requirements._run_pip(command_args + extra_args, f"requirement '{pin}'")
+                if result.returncode == 0:
+                    break
+            else:
+                logging.error(f"Unable to build the wheel of requirement '{pin}':\n{result.stdout}")
+                return None
+
+            logging.info(f"Loaded requirement '{pin}'.")
+
+            wheel_paths = Requirements._get_file_paths_list(wheel_dir)
+            if len(wheel_paths) != 1:
+                logging.error(f"pip made {len(wheel_paths)} wheels for requirement '{pin}' instead of one.")
+                return None
+
+            destination = os.path.join(wheelhouse_dir, os.path.basename(wheel_paths[0]))
+            if not os.path.isfile(destination):
+                # Another pin may be adding the same wheel, os.replace keeps the destination whole either way.
+                (handle, temp_destination) = tempfile.mkstemp(suffix='.tmp', dir=wheelhouse_dir)
+                os.close(handle)
+                shutil.copyfile(wheel_paths[0], temp_destination)
+                shutil.copymode(wheel_paths[0], temp_destination)
+                os.replace(temp_destination, destination)
+
+            return destination
+
+    @staticmethod
+    def _has_wheelhouse_wheel(pin, wheelhouse_dir) -> bool:
+        """
+        Checks whether the wheelhouse has a wheel of the exact version of `pin`. Wheel filenames start with the
+        distribution name, with runs of '-', '_' and '.' replaced by '_', and the version, see PEP 427.
+
+        :param pin: The pin, see `_resolve_requirements`.
+        :param wheelhouse_dir: The directory where every built wheel is kept.
+        :return: Type[bool] True if `pin` is a 'name==version' pin and one of its wheels is in the wheelhouse.
+        """
+        match = re.fullmatch(r'([A-Za-z0-9][A-Za-z0-9._-]*)==([^\s;*]+)', pin.strip())
+        if match is None or not os.path.isdir(wheelhouse_dir):
+            return False
+
+        name = re.sub(r'[-_.]+', '_', match.group(1)).lower()
+        for filename in os.listdir(wheelhouse_dir):
+            parts = filename[:-len('.whl')].split('-') if filename.endswith('.whl') else []
+            if len(parts) >= 5 and re.sub(r'[-_.]+', '_', parts[0]).lower() == name and parts[1] == match.group(2):
+                return True
+        return False
+
+    @staticmethod
+    def _link_or_copy(source, destination):
+        """
+        Hard links `source` to `destination`, or copies it if hard links are not supported, e.g. across file systems.
+        On Linux, the copy is a reflink where the file system supports them, e.g. btrfs or XFS, so it shares the
+        blocks of `source` until either file is changed.
+
+        :param source: Complete filename of the existing file.
+        :param destination: Complete filename of the file to create.
+        :return: None.
+        """
+        try:
+            os.link(source, destination)
+            return
+        except OSError:
+            pass
+
+        if sys.platform.startswith('linux'):
+            import fcntl
+
+            # The FICLONE ioctl of linux/fs.h.
+            ficlone = 0x40049409
+            try:
+                with open(source, 'rb') as source_file, open(destination, 'wb') as destination_file:
+                    fcntl.ioctl(destination_file.fileno(), ficlone, source_file.fileno())
+                return
+            except OSError:
+                pass
+
+        shutil.copyfile(source, destination)
+
+    @staticmethod
+    def _create_source_distribution(paths: _Paths, options: _Options, cache: _ArchiveCache, metrics: _Metrics,
+                                    executor, import_graph=None) -> [(str, str, object)]:
+        """
+        Archives the directories in source code directory and places it in the distribution directory.
+
+        Files are not moved to the distribution directory, they are taken directly from the source code directory.
+
+        :param paths: An instance of _Paths, being used by the script.
+        :param options: An instance of _Options, being used by the script.
+        :param cache: An instance of _ArchiveCache, used to skip directories that did not change.
+        :param metrics: An instance of _Metrics, the reused archives are recorded in.
+        :param executor: The concurrent.futures executor the directories are archived in.
+        :param import_graph: An instance of _ImportGraph, used to leave out code that is not imported. None to archive
+            everything.
+        :return: Type[(str, str, Future)] the archives being created, see `_create_archives_of_directories_in`.
+        """
+
+        path = Requirements._generate_dist_path(paths.distribution_dir, paths.source_code_dir,
+                                                Requirements.SOURCE_POSTFIX)
+
+        if os.path.isdir(paths.source_code_dir):
+            logging.info("Gathering source code...")
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            return Requirements._create_archives_of_directories_in(paths.source_code_dir, path, options, cache,
+                                                                   metrics, executor, import_graph,
+                                                                   _Bytecode.get(options))
+        else:
+            logging.warning(f"Source code directory '{paths.source_code_dir}' does not exist.")
+            return []
+
+    @staticmethod
+    def _create_archives_of_directories_in(source_dir, destination_dir, options: _Options, cache: _ArchiveCache,
+                                           metrics: _Metrics, executor, import_graph=None,
+                                           bytecode=None) -> [(str, str, object)]:
+        """
+        Creates zip files of all the top level directories of `source_dir` and places them in `destination_dir`.
+
+        The archives are created by `executor`, this function does not wait for them. Directories whose archive is
+        still up to date according to `cache` are not archived again. Archives in `destination_dir` that no longer
+        have a matching directory are deleted.
+
+        :param source_dir: The directory from where the directories to be archived are to be taken.
+        :param destination_dir: The directory where the archives should be palced.
+        :param options: An instance of _Options, being used by the script.
+        :param cache: An instance of _ArchiveCache, used to skip directories that did not change.
+        :param metrics: An instance of _Metrics, the reused archives are recorded in.
+        :param executor: The concurrent.futures executor the directories are archived in.
+        :param import_graph: An instance of _ImportGraph. Directories of which nothing is imported are not archived,
+            and the parts of the others that are not imported are left out. None to archive everything.
+        :param bytecode: An instance of _Bytecode, the .py files are compiled with. None to only archive the sources.
+        :return: Type[(str, str, Future)] complete filename of every archive being created, the directory it is made
+            from, and the future of its creation.
+        """
+        ignore_rules = _IgnoreRules.load()
+        archive_paths = Requirements._get_archive_paths(source_dir, destination_dir, ignore_rules)
+
+        # Stale archives are deleted before any archive is started, so that partly written archives are left alone.
+        for archive_path in Requirements._get_file_paths_list(destination_dir):
+            if archive_path not in archive_paths:
+                logging.debug(f"Deleting stale archive '{archive_path}'.")
+                os.remove(archive_path)
+                cache.forget(archive_path)
+
+        pending_archives = []
+        for (archive_path, directory_path) in archive_paths.items():
+            excluded_entries = []
+            if import_graph is not None:
+                if not import_graph.is_imported(directory_path):
+                    logging.debug(f"Not archiving '{directory_path}', nothing in it is imported.")
+                    continue
+                excluded_entries = import_graph.get_excluded_entries(directory_path)
+
+            wall_time = time.perf_counter()
+            cpu_time = time.thread_time()
+            if cache.is_up_to_date(directory_path, archive_path, excluded_entries, ignore_rules, bytecode,
+                                   options.compression_level, options.reproducible_archives):
+                logging.debug(f"Reusing archive '{archive_path}'.")
+                metrics.add(f"archive {directory_path}", time.perf_counter() - wall_time, time.thread_time() - cpu_time,
+                            action='reuse')
+                continue
+
+            logging.debug(f"Archiving '{directory_path}'.")
+            future = executor.submit(_archive_directory, directory_path, archive_path, cache.enabled,
+                                     options.compression_level, options.reproducible_archives, excluded_entries,
+                                     ignore_rules, bytecode)
+            pending_archives.append((archive_path, directory_path, future))
+
+        return pending_archives
+
+    @staticmethod
+    def _create_include_dir_distributions(paths: _Paths, options: _Options, cache: _ArchiveCache, metrics: _Metrics,
+                                          executor, import_graph=None) -> [(str, str, object)]:
+        """
+        Walks the Include Code Directory and Include Assets Directory, converting the top level directories into
+        zip archives and placing them in their respective Distribution Directory's sub directory.
+
+        :param paths:  An instance of _Paths, being used by the script.
+        :param options: An instance of _Options, being used by the script.
+        :param cache: An instance of _ArchiveCache, used to skip directories that did not change.
+        :param metrics: An instance of _Metrics, the reused archives are recorded in.
+        :param executor: The concurrent.futures executor the directories are archived in.
+        :param import_graph: An instance of _ImportGraph, used to leave out code that is not imported. None to archive
+            everything. Assets are always archived as a whole.
+        :return: Type[(str, str, Future)] the archives being created, see `_create_archives_of_directories_in`.
+        """
+        pending_archives = []
+
+        if os.path.isdir(paths.include_code_dir):
+            logging.info("Processing Include Code Directory...")
+            path = Requirements._generate_dist_path(paths.distribution_dir, paths.include_code_dir,
+                                                    Requirements.CODE_POSTFIX)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            pending_archives.extend(
+                Requirements._create_archives_of_directories_in(paths.include_code_dir, path, options, cache,
+                                                                 metrics, executor, import_graph,
+                                                                 _Bytecode.get(options)))
+
+        if os.path.isdir(paths.include_assets_dir):
+            logging.info("Processing Include Assets Directory...")
+            path = Requirements._generate_dist_path(paths.distribution_dir, paths.include_assets_dir,
+                                                    Requirements.ASSETS_POSTFIX)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            pending_archives.extend(
+                Requirements._create_archives_of_directories_in(paths.include_assets_dir, path, options, cache,
+                                                                 metrics, executor))
+
+        return pending_archives
+
+    @staticmethod
+    def _create_archive_executor(jobs):
+        """
+        Creates the executor that archives directories. With more than one job, directories are archived in a pool
+        of worker processes, otherwise they are archived one at a time in a single background thread.
+
+        Worker processes are not forked from this process where possible, since it runs pip in another thread at the
+        same time, and forking a process with running threads can deadlock the child.
+
+        :param jobs: The number of directories to archive at the same time.
+        :return: Type[concurrent.futures.Executor]
+        """
+        if jobs > 1:
+            import multiprocessing
+
+            start_methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in start_methods else 'spawn')
+            return concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=context)
+        return concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    @staticmethod
+    def _acquire_dependencies(paths: _Paths, options: _Options, cache: _ArchiveCache, metrics: _Metrics,
+                              import_graph=None):
+        """
+        A convenience function that combines the functions that write to the disk.
+
+        The external packages are loaded in a background thread while the source code and include directories are
+        archived, and the directories themselves are archived in parallel by `options.get_jobs()` workers.
+
+        :param paths:  An instance of _Paths, being used by the script.
+        :param options: An instance of _Options, being used by the script.
+        :param cache: An instance of _ArchiveCache, used to skip directories that did not change.
+        :param metrics: An instance of _Metrics, pip and every archived directory are recorded in.
+        :param import_graph: An instance of _ImportGraph, used to leave out code that is not imported. None to archive
+            everything.
+        :return: None
+        """
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as packages_executor, \
+                Requirements._create_archive_executor(options.get_jobs()) as archive_executor:
+
+            packages_future = packages_executor.submit(Requirements._load_measured_requirements_packages, paths,
+                                                       options, metrics)
+
+            pending_archives = []
+            pending_archives.extend(Requirements._create_source_distribution(paths, options, cache, metrics,
+                                                                              archive_executor, import_graph))
+            pending_archives.extend(Requirements._create_include_dir_distributions(paths, options, cache, metrics,
+                                                                                    archive_executor, import_graph))
+
+            for (archive_path, directory_path, future) in pending_archives:
+                entry, stats = future.result()
+                cache.update(archive_path, entry)
+                metrics.add(f"archive {directory_path}", action='build', **stats)
+
+            packages_future.result()
+
+    @staticmethod
+    def _get_file_paths_list(directory, ignore_rules=None) -> [str]:
+        """
+        Utility function to list the complete filenames of the top level files of the directory.
+
+        :param directory: The directory path from which the filenames are to be taken.
+        :param ignore_rules: An instance of _IgnoreRules, the files it leaves out are not listed. None lists all.
+        :return: [str]
+        """
+        file_paths = []
+        for (_, _, filenames) in os.walk(directory):
+            for file in sorted(filenames):
+                file_path = os.path.join(directory, file)
+                if ignore_rules is None or not ignore_rules.is_ignored(file_path, False):
+                    file_paths.append(file_path)
+            break
+
+        return file_paths
+
+    @staticmethod
+    def _get_archive_paths(source_dir, destination_dir, ignore_rules=None) -> {str: str}:
+        """
+        Utility function to name the archives of the top level directories of `source_dir`.
+
+        :param source_dir: The directory whose top level directories are archived.
+        :param destination_dir: The directory where the archives are placed.
+        :param ignore_rules: An instance of _IgnoreRules, the directories it leaves out are not archived. None archives
+            all.
+        :return: Type{str: str} complete filename of every archive, sorted, and the directory it is made from.
+        """
+        archive_paths = {}
+        for (_, directories, _) in os.walk(source_dir):
+            for directory in sorted(directories):
+                directory_path = os.path.join(source_dir, directory)
+                if ignore_rules is None or not ignore_rules.is_ignored(directory_path, True):
+                    archive_paths[f"{os.path.join(destination_dir, directory)}.zip"] = directory_path
+            break
+
+        return archive_paths
+
+    @staticmethod
+    def _extract_lines(filename) -> [str]:
+        """
+        Splits the file's lines into a list.
+
+        :param filename: file to process.
+        :return: Type[str]
+        """
+        file = open(filename, 'r+')
+        lines = [line.strip() for line in file]
+        file.close()
+        return lines
+
+    @staticmethod
+    def _extract_paths(filename, warn=True) -> [str]:
+        """
+        Reads the paths of an include file, one per line. Lines with glob patterns, e.g. `libs/*.zip` or
+        `data/**/*.csv`, are replaced by the files they match, sorted, leaving out what the ignore file leaves out.
+        Blank lines and comments starting with '#' are skipped.
+
+        :param filename: The complete filename of the include file.
+        :param warn: Whether or not patterns that do not match any file are logged.
+        :return: Type[str]
+        """
+        import glob
+
+        ignore_rules = _IgnoreRules.load()
+        paths = []
+        for line in Requirements._extract_lines(filename):
+            if line == '' or line.startswith('#'):
+                continue
+            if not any(character in line for character in '*?['):
+                paths.append(line)
+                continue
+
+            matches = [path for path in sorted(glob.glob(line, recursive=True))
+                       if os.path.isfile(path) and not ignore_rules.is_ignored(path, False)]
+            if len(matches) == 0 and warn:
+                logging.warning(f"The pattern '{line}' of '{filename}' does not match any file.")
+            paths.extend(matches)
+
+        return paths
+
+    @staticmethod
+    def _generate_dist_path(dist_dir, original_dir, postfix):
+        """
+        Generates a path of a sub distribution directory corresponding to the original directory. postfix is used to
+        avoid potential conflicts.
+
+        :param dist_dir: Path of top level distribution directory.
+        :param original_dir: Path of the directory which needs a sub distribution directory.
+        :param postfix: A string appended with the sub directory name to avoid conflicts.
+        :return: None.
+        """
+        name = original_dir.split(os.path.sep)[-1]
+        name += postfix
+        path = os.path.join(dist_dir, name)
+        return path
+
+    @staticmethod
+    def _clean_dir(directory):
+        """
+        Deletes the files and folders in a directory.
+
+        :param directory: Path of the directory.
+        :return: None.
+        """
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+            os.mkdir(directory)
+
+    @staticmethod
+    def _collect_dependencies(dist_dir, directory, postfix) -> [str]:
+        """
+        Collects the directory's sub distribution files and the top level files of the directory itself, and places
+        their paths in a list.
+
+        The sub distribution files are named after the directory's top level directories, so they are known before
+        the directories are archived.
+
+        :param dist_dir: Top level distribution directory.
+        :param directory: The directory whose dependencies are being collected.
+        :param postfix: The posted used when the sub distribution directory for the directory was made.
+        :return: Type[str].
+        """
+        deps = []
+        ignore_rules = _IgnoreRules.load()
+
+        deps.extend(Requirements._get_file_paths_list(directory, ignore_rules))
+        path = Requirements._generate_dist_path(dist_dir, directory, postfix)
+        deps.extend(Requirements._get_archive_paths(directory, path, ignore_rules))
+
+        return deps
+
+    @staticmethod
+    def _process_assets(paths: _Paths, options: _Options) -> ([str], [str]):
+        """
+        Collects the include directory's sub distribution files and the top level files of the directory itself,
+        and places their paths in two list, file_assets, archive_assets. It also process the include asset file
+        and places assets in file_assets, archive_assets.
+
+        Currently, only zip files are considered archives.
+
+        :param paths: An instance of _Paths, being used by the script.
+        :return: Type([str],[str])
+        """
+        file_assets = []
+        archive_assets = []
+        temp_file_names = []
+
+        if os.path.isdir(paths.include_assets_dir):
+            path = Requirements._generate_dist_path(paths.distribution_dir, paths.include_assets_dir,
+                                                    Requirements.ASSETS_POSTFIX)
+            files_list = list(Requirements._get_archive_paths(paths.include_assets_dir, path, _IgnoreRules.load()))
+            if options.use_archive_arg:
+                archive_assets.extend(files_list)
+            else:
+                file_assets.extend(files_list)
+
+            temp_file_names = Requirements._get_file_paths_list(paths.include_assets_dir, _IgnoreRules.load())
+
+        elif not paths.include_assets_dir == '':
+            logging.warning(f"Include Assets Directory '{paths.include_assets_dir}' does not exist.")
+
+        if os.path.isfile(paths.include_assets_file):
+            temp_file_names.extend(Requirements._extract_paths(paths.include_assets_file))
+
+        elif not paths.include_assets_file == '':
+            logging.warning(f"Include Assets File '{paths.include_assets_file}' does not exist.")
+
+        if options.use_archive_arg:
+            regex = re.compile(r'^.*\.(zip)$')
+
+            for name in temp_file_names:
+                if bool(regex.match(name)):
+                    archive_assets.append(name)
+                else:
+                    file_assets.append(name)
+        else:
+            file_assets.extend(temp_file_names)
+
+        return file_assets, archive_assets
+
+    @staticmethod
+    def get_requirements_list(paths: _Paths, options: _Options, cache=None, metrics=None,
+                              application_file=None) -> ([str], [str], [str]):
+        """
+        Acquires the dependencies and makes a list of complete filenames of all the dependencies.
+
+        Returns three lists.
+        First code_files are the code dependencies.
+        Second asset_files are the file assets like txt, jpg etc. all expect .zip.
+        Third archive_assets are assets but only zip files.
+
+        :param options: An instance of _Options, being used by the script.
+        :param paths: An instance of _Paths, being used by the script.
+        :param cache: An instance of _ArchiveCache kept from an earlier call, None loads it from the disk.
+        :param metrics: An instance of _Metrics the stages are recorded in, None to not record them.
+        :param application_file: The python file passed to spark-submit. Code it does not import is pruned if the
+            [OPTIONS] section's 'Prune Unused Code' is true.
+        :return: Type([str],[str],[str])
+        """
+
+        if not options.use_archive_cache:
+            logging.info("Deleting old distribution files...")
+            Requirements._clean_dir(paths.distribution_dir)
+
+        if cache is None:
+            cache = _ArchiveCache(options.use_archive_cache)
+
+        if metrics is None:
+            metrics = _Metrics()
+
+        import_graph = None
+        if options.prune_unused_code:
+            with metrics.measure('imports'):
+                import_graph = Requirements._create_import_graph(paths, options, application_file)
+
+        Requirements._acquire_dependencies(paths, options, cache, metrics, import_graph)
+
+        logging.info("Gathering requirements...")
+
+        # The packed environment already holds the external packages.
+        wheel_files = [] if options.pack_virtual_environment else \
+            Requirements._get_file_paths_list(paths.libraries_dir)
+        code_files = Requirements._gather_code_files(paths, wheel_files)
+
+        if import_graph is not None:
+            with metrics.measure('prune') as stage:
+                # The wheels pip just built are followed too.
+                for path in wheel_files:
+                    import_graph.add_file(path)
+                import_graph.update()
+                stage.files = len(code_files)
+                code_files = Requirements._prune_code_files(paths, code_files, import_graph)
+            logging.info(f"Pruned {stage.files - len(code_files)} code dependencies that "
+                         f"'{application_file}' does not import.")
+
+        shipped_files = _ShippedFiles()
+        code_files = shipped_files.add(code_files)
+
+        if options.consolidate_py_files:
+            bundle_path = os.path.join(paths.distribution_dir, _PyFilesBundle.FILENAME)
+            old_stat = _ArchiveCache._archive_stat(bundle_path)
+            with metrics.measure('bundle') as stage:
+                merged_files = len(code_files)
+                code_files = _PyFilesBundle.create(code_files, bundle_path, options.compression_level, cache,
+                                                   _Bytecode.get(options))
+                stage.files = merged_files - len(code_files) + 1
+                stage.values['action'] = 'reuse' if _ArchiveCache._archive_stat(bundle_path) == old_stat else 'build'
+                if stage.values['action'] == 'build':
+                    stage.bytes_written = os.path.getsize(bundle_path)
+
+        cache.save()
+
+        # Assets Includes
+
+        with metrics.measure('assets') as stage:
+            file_assets, archive_assets = Requirements._process_assets(paths, options)
+            file_assets = shipped_files.add(file_assets)
+            archive_assets = shipped_files.add(archive_assets)
+            stage.files = len(file_assets) + len(archive_assets)
+
+        archive_path = _VirtualEnvironment.get_archive_path(paths)
+        if options.pack_virtual_environment and os.path.isfile(archive_path):
+            archive_assets.append(f"{os.path.normpath(archive_path)}#{options.virtual_environment_alias}")
+
+        with metrics.measure('conflicts') as stage:
+            _ShippedFiles.report(shipped_files.conflicts + _ShippedFiles.find_shadowed_modules(code_files),
+                                 options.fail_on_conflicts)
+            stage.files = len(code_files)
+
+        return code_files, file_assets, archive_assets
+
+    @staticmethod
+    def _create_import_graph(paths: _Paths, options: _Options, application_file) -> _ImportGraph:
+        """
+        Finds the code dependencies the application file imports, among the ones known before pip runs.
+
+        :param paths: An instance of _Paths, being used by the script.
+        :param options: An instance of _Options, being used by the script.
+        :param application_file: The python file passed to spark-submit.
+        :return: Type[_ImportGraph] None if the application file is not a python file, then nothing is pruned.
+        """
+        if application_file is None or not application_file.endswith('.py') or not os.path.isfile(application_file):
+            logging.warning(f"Not pruning unused code, the application file '{application_file}' is not a python "
+                            f"file.")
+            return None
+
+        import_graph = _ImportGraph(application_file, options.prune_allowlist)
+        ignore_rules = _IgnoreRules.load()
+
+        for directory in [paths.source_code_dir, paths.include_code_dir]:
+            if os.path.isdir(directory):
+                for path in Requirements._get_file_paths_list(directory, ignore_rules):
+                    import_graph.add_file(path)
+                for directory_path in Requirements._get_archive_paths(directory, directory, ignore_rules).values():
+                    import_graph.add_directory(directory_path)
+
+        if os.path.isfile(paths.include_code_file):
+            for path in Requirements._extract_paths(paths.include_code_file):
+                import_graph.add_file(path)
+
+        for path in Requirements._get_file_paths_list(paths.libraries_dir):
+            import_graph.add_file(path)
+
+        import_graph.update()
+        return import_graph
+
+    @staticmethod
+    def _prune_code_files(paths: _Paths, code_files, import_graph: _ImportGraph) -> [str]:
+        """
+        Removes the code dependencies nothing of which is imported. Archives of directories are looked up by the
+        directory they are made from.
+
+        :param paths: An instance of _Paths, being used by the script.
+        :param code_files: Complete filenames of the code dependencies.
+        :param import_graph: An instance of _ImportGraph, holding the code dependencies.
+        :return: Type[str]
+        """
+        sources = {}
+        for (directory, postfix) in [(paths.source_code_dir, Requirements.SOURCE_POSTFIX),
+                                     (paths.include_code_dir, Requirements.CODE_POSTFIX)]:
+            if os.path.isdir(directory):
+                destination_dir = Requirements._generate_dist_path(paths.distribution_dir, directory, postfix)
+                for (archive_path, directory_path) in \
+                        Requirements._get_archive_paths(directory, destination_dir).items():
+                    sources[os.path.normpath(archive_path)] = directory_path
+
+        return [path for path in code_files if import_graph.is_imported(sources.get(os.path.normpath(path), path))]
+
+    @staticmethod
+    def _gather_code_files(paths: _Paths, wheel_files) -> [str]:
+        """
+        Makes a list of the complete filenames of the code dependencies.
+
+        :param paths: An instance of _Paths, being used by the script.
+        :param wheel_files: Complete filenames of the wheels in the libraries directory.
+        :return: Type[str]
+        """
+        code_files = []
+        code_files.extend(wheel_files)
+
+        if os.path.isdir(paths.source_code_dir):
+            code_files.extend(Requirements._collect_dependencies(paths.distribution_dir, paths.source_code_dir,
+                                                                 Requirements.SOURCE_POSTFIX))
+        # Code Includes
+
+        if os.path.isdir(paths.include_code_dir):
+            code_files.extend(Requirements._collect_dependencies(paths.distribution_dir, paths.include_code_dir,
+                                                                 Requirements.CODE_POSTFIX))
+        elif not paths.include_code_dir == '':
+            logging.warning(f"Include Code Directory '{paths.include_code_dir}' does not exist.")
+
+        if os.path.isfile(paths.include_code_file):
+            lines = Requirements._extract_paths(paths.include_code_file)
+            code_files.extend(lines)
+        elif not paths.include_code_file == '':
+            logging.warning(f"Include Code File '{paths.include_code_file}' does not exist.")
+
+        return code_files
+
+    @staticmethod
+    def _plan_requirements_packages(paths: _Paths, options: _Options) -> ([str], dict):
+        """
+        Works out what `_load_requirements_packages` would do, without running pip or writing to the disk.
+
+        :param paths: An instance of _Paths, being used by the script.
+        :param options: An instance of _Options, being used by the script.
+        :return: Type([str], dict) complete filenames of the wheels that are known to be kept in the libraries
+            directory, and a description of the work to be done: its 'action', one of 'none', 'reuse' and 'build',
+            and the requirement 'lines' that were added or changed since the last run.
+        """
+        if not os.path.isfile(paths.requirements_file):
+            return [], {'action': 'none', 'lines': []}
+
+        if options.pack_virtual_environment:
+            environment = _VirtualEnvironment(options.use_requirements_lock)
+            up_to_date = environment.is_up_to_date(_RequirementsLock.hash_file(paths.requirements_file),
+                                                   _VirtualEnvironment.get_archive_path(paths))
+            return [], {'action': 'reuse' if up_to_date else 'build',
+                        'lines': [] if up_to_date else _RequirementsLock.parse_requirements(paths.requirements_file)[1]}
+
+        lock = _RequirementsLock(options.use_requirements_lock)
+        (_, requirement_lines) = _RequirementsLock.parse_requirements(paths.requirements_file)
+
+        if not lock.enabled:
+            return [], {'action': 'build', 'lines': requirement_lines}
+
+        if lock.is_up_to_date(_RequirementsLock.hash_file(paths.requirements_file), paths.libraries_dir):
+            wheels = lock.get_locked_wheels()
+            return [os.path.join(paths.libraries_dir, wheel) for wheel in sorted(wheels)], \
+                {'action': 'reuse', 'lines': []}
+
+        # The file is resolved again, so which of the locked wheels are kept is not known before pip runs.
+        return [], {'action': 'build', 'lines': lock.get_changed_lines(requirement_lines)}
+
+    @staticmethod
+    def get_submission_plan(paths: _Paths, options: _Options, application_file=None) -> dict:
+        """
+        Works out what `get_requirements_list` would do, without archiving anything, running pip or any other
+        subprocess, or writing to the disk.
+
+        The returned dict holds:
+        'py_files', 'files' and 'archives', the three lists `get_requirements_list` would return. When the
+        requirements file has to be resolved again, its wheels are not known yet, so they are missing from 'py_files'.
+        'requirements', what would be done with the requirements file, see `_plan_requirements_packages`.
+        'artifacts', every archive SSP manages, with the 'action' that would be taken: 'reuse', 'build' or 'delete'.
+
+        :param paths: An instance of _Paths, being used by the script.
+        :param options: An instance of _Options, being used by the script.
+        :param application_file: The python file passed to spark-submit, used if 'Prune Unused Code' is true.
+        :return: Type[dict]
+        """
+        cache = _ArchiveCache(options.use_archive_cache)
+
+        wheel_files, requirements = Requirements._plan_requirements_packages(paths, options)
+
+        import_graph = None
+        if options.prune_unused_code:
+            import_graph = Requirements._create_import_graph(paths, options, application_file)
+
+        ignore_rules = _IgnoreRules.load()
+        # No subprocess is run, so if the version of the bytecode python is not known yet, every compiled archive is
+        # built.
+        plan_bytecode = _Bytecode.get(options, run_python=False)
+        artifacts = []
+        for (directory, postfix) in [(paths.source_code_dir, Requirements.SOURCE_POSTFIX),
+                                     (paths.include_code_dir, Requirements.CODE_POSTFIX),
+                                     (paths.include_assets_dir, Requirements.ASSETS_POSTFIX)]:
+            if not os.path.isdir(directory):
+                continue
+
+            destination_dir = Requirements._generate_dist_path(paths.distribution_dir, directory, postfix)
+            archive_paths = Requirements._get_archive_paths(directory, destination_dir, ignore_rules)
+
+            for (archive_path, directory_path) in archive_paths.items():
+                excluded_entries = []
+                if import_graph is not None and postfix != Requirements.ASSETS_POSTFIX:
+                    if not import_graph.is_imported(directory_path):
+                        continue
+                    excluded_entries = import_graph.get_excluded_entries(directory_path)
+                bytecode = plan_bytecode if postfix != Requirements.ASSETS_POSTFIX else None
+                up_to_date = cache.is_up_to_date(directory_path, archive_path, excluded_entries, ignore_rules,
+                                                 bytecode, options.compression_level, options.reproducible_archives)
+                action = 'reuse' if up_to_date else 'build'
+                artifacts.append({'path': archive_path, 'source': directory_path, 'action': action})
+
+            if options.use_archive_cache:
+                for archive_path in Requirements._get_file_paths_list(destination_dir):
+                    if archive_path not in archive_paths:
+                        artifacts.append({'path': archive_path, 'source': None, 'action': 'delete'})
+
+        code_files = Requirements._gather_code_files(paths, wheel_files)
+        if import_graph is not None:
+            code_files = Requirements._prune_code_files(paths, code_files, import_graph)
+
+        shipped_files = _ShippedFiles()
+        code_files = shipped_files.add(code_files)
+
+        if options.consolidate_py_files:
+            bundle_path = os.path.join(paths.distribution_dir, _PyFilesBundle.FILENAME)
+            built_files = {os.path.normpath(artifact['path']) for artifact in artifacts
+                           if artifact['action'] == 'build'}
+
+            entry = None
+            if requirements['action'] != 'build' and len(built_files.intersection(code_files)) == 0:
+                entry = cache.get_files_entry([path for path in code_files if os.path.isfile(path)], bundle_path,
+                                              **_PyFilesBundle.get_settings(options.compression_level, plan_bytecode))
+
+            if entry is not None:
+                code_files = [bundle_path] + entry['separate_files']
+            else:
+                code_files = [bundle_path] + [path for path in code_files if not path.endswith('.py') and
+                                              not path.lower().endswith(_PyFilesBundle.MERGED_ARCHIVE_EXTENSIONS)]
+
+            artifacts.append({'path': bundle_path, 'source': None, 'action': 'build' if entry is None else 'reuse'})
+
+        file_assets, archive_assets = Requirements._process_assets(paths, options)
+        file_assets = shipped_files.add(file_assets)
+        archive_assets = shipped_files.add(archive_assets)
+
+        if options.pack_virtual_environment and requirements['action'] != 'none':
+            archive_path = _VirtualEnvironment.get_archive_path(paths)
+            archive_assets.append(f"{os.path.normpath(archive_path)}#{options.virtual_environment_alias}")
+            artifacts.append({'path': archive_path, 'source': paths.requirements_file,
+                              'action': requirements['action']})
+
+        return {'py_files': code_files, 'files': file_assets, 'archives': archive_assets,
+                'requirements': requirements, 'artifacts': artifacts}
+
+
+class _Watcher:
+    """
+    Keeps the Distribution Directory and the Libraries Directory up to date while the project's files are edited, so
+    a later submission finds everything ready.
+
+    The Source Code, Include Code and Include Assets Directories and the requirements file are watched with inotify
+    where it is available, and polled otherwise. Only the archives of the top level directories that changed are
+    created again, and pip only runs when the requirements file changed.
+    """
+
+    # Changes are collected for this long after the first one, so that saving many files is handled as one change.
+    DEBOUNCE_SECONDS = 0.5
+    POLL_INTERVAL_SECONDS = 1.0
+
+    # From <sys/inotify.h>
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT_HEADER_SIZE = 16
+
+    def __init__(self, config):
+        """
+        :param config: An instance of SubmissionConfig, being used by the script.
+        """
+        self.config = config
+        self.paths = config.paths
+        self.options = config.options
+
+        # The watched directories and the Distribution Directory's sub directory their archives are placed in.
+        self.archive_dirs = {}
+        for (directory, postfix) in [(self.paths.source_code_dir, Requirements.SOURCE_POSTFIX),
+                                     (self.paths.include_code_dir, Requirements.CODE_POSTFIX),
+                                     (self.paths.include_assets_dir, Requirements.ASSETS_POSTFIX)]:
+            if os.path.isdir(directory):
+                self.archive_dirs[directory] = Requirements._generate_dist_path(self.paths.distribution_dir,
+                                                                                directory, postfix)
+
+        self.requirements_file = os.path.abspath(self.paths.requirements_file)
+
+    def _get_archive(self, path):
+        """
+        Finds the archive a changed path belongs to.
+
+        :param path: The absolute path of a changed file or directory.
+        :return: Type[(str, str)] the top level file or directory of a watched directory the path is in, and the
+            complete filename of its archive, None for top level files. None if the path is not in a watched directory,
+            or if the ignore file leaves it out.
+        """
+        if _IgnoreRules.load().is_ignored(path):
+            return None
+
+        for (directory, destination_dir) in self.archive_dirs.items():
+            relative_path = os.path.relpath(path, os.path.abspath(directory))
+            if relative_path == os.curdir or relative_path.startswith(os.pardir):
+                continue
+
+            top_level_name = relative_path.split(os.sep)[0]
+            directory_path = os.path.join(directory, top_level_name)
+            if relative_path == top_level_name and os.path.isfile(directory_path):
+                return directory_path, None
+            return directory_path, f"{os.path.join(destination_dir, top_level_name)}.zip"
+
+        return None
+
+    def _rebuild(self, changed_paths):
+        """
+        Creates again the archives affected by the changed paths, and loads the requirements again if the
+        requirements file changed.
+
+        :param changed_paths: The absolute paths of the changed files and directories.
+        :return: Type[bool] whether or not any of the paths affect the dependencies.
+        """
+        requirements_changed = self.requirements_file in changed_paths
+        changed_files = [archive for archive in map(self._get_archive, changed_paths) if archive is not None]
+        if not requirements_changed and len(changed_files) == 0:
+            return False
+
+        with _BuildGenerations.get_build_lock():
+            self._rebuild_archives(requirements_changed, changed_files)
+        return True
+
+    def _rebuild_archives(self, requirements_changed, changed_files):
+        """
+        Creates again the archives of the changed files. It should be called while the build lock is held.
+
+        :param requirements_changed: Whether or not the requirements file changed.
+        :param changed_files: Type[(str, str)] the changed files, as returned by `_get_archive`.
+        :return: None.
+        """
+        cache = self.config.get_cache()
+
+        if requirements_changed:
+            logging.info("Requirements file changed.")
+            Requirements._load_requirements_packages(self.paths, self.options)
+
+        affected_archives = {archive_path: directory_path for (directory_path, archive_path) in changed_files
+                             if archive_path is not None}
+        ignore_rules = _IgnoreRules.load()
+
+        for (archive_path, directory_path) in sorted(affected_archives.items()):
+            if not os.path.isdir(directory_path) or ignore_rules.is_ignored(directory_path, True):
+                if os.path.isfile(archive_path):
+                    logging.info(f"Deleting stale archive '{archive_path}'.")
+                    os.remove(archive_path)
+                cache.forget(archive_path)
+                continue
+
+            bytecode = None
+            if os.path.normpath(os.path.dirname(directory_path)) != os.path.normpath(self.paths.include_assets_dir):
+                bytecode = _Bytecode.get(self.options)
+            if not cache.is_up_to_date(directory_path, archive_path, ignore_rules=ignore_rules, bytecode=bytecode,
+                                       compression_level=self.options.compression_level,
+                                       reproducible=self.options.reproducible_archives):
+                logging.info(f"Archiving '{directory_path}'.")
+                os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+                entry, _ = _archive_directory(directory_path, archive_path, cache.enabled,
+                                              self.options.compression_level, self.options.reproducible_archives,
+                                              ignore_rules=ignore_rules, bytecode=bytecode)
+                cache.update(archive_path, entry)
+
+        if self.options.consolidate_py_files:
+            code_files = Requirements._gather_code_files(self.paths,
+                                                         Requirements._get_file_paths_list(self.paths.libraries_dir))
+            bundle_path = os.path.join(self.paths.distribution_dir, _PyFilesBundle.FILENAME)
+            _PyFilesBundle.create(code_files, bundle_path, self.options.compression_level, cache,
+                                  _Bytecode.get(self.options))
+
+        cache.save()
+
+    def _get_inotify_changes(self):
+        """
+        Starts watching with inotify.
+
+        :return: Type[generator] sets of the absolute paths that changed. An empty set means that events were lost
+            and everything must be checked.
+        """
+        import ctypes
+        import ctypes.util
+        import select
+        import struct
+
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify is only available on Linux.")
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init()
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "Unable to initialize inotify.")
+
+        watched_dirs = {}
+
+        def add_watch(directory, recursive):
+            for (root, directories, _) in os.walk(directory):
+                wd = libc.inotify_add_watch(fd, os.fsencode(root), _Watcher.WATCH_MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(), f"Unable to watch '{root}'.")
+                watched_dirs[wd] = os.path.abspath(root)
+                if not recursive:
+                    break
+
+        try:
+            for directory in self.archive_dirs:
+                add_watch(directory, True)
+            add_watch(os.path.dirname(self.requirements_file), False)
+        except OSError:
+            os.close(fd)
+            raise
+
+        def get_changes():
+            while True:
+                changed_paths = set()
+                overflowed = False
+                timeout = None
+                while select.select([fd], [], [], timeout)[0]:
+                    buffer = os.read(fd, 64 * 1024)
+                    offset = 0
+                    while offset < len(buffer):
+                        wd, mask, _, name_length = struct.unpack_from('iIII', buffer, offset)
+                        name = buffer[offset + _Watcher.EVENT_HEADER_SIZE:
+                                      offset + _Watcher.EVENT_HEADER_SIZE + name_length].rstrip(b'\0')
+                        offset += _Watcher.EVENT_HEADER_SIZE + name_length
+
+                        if mask & _Watcher.IN_Q_OVERFLOW:
+                            overflowed = True
+                        elif mask & _Watcher.IN_IGNORED:
+                            watched_dirs.pop(wd, None)
+                        elif wd in watched_dirs:
+                            path = os.path.join(watched_dirs[wd], os.fsdecode(name))
+                            changed_paths.add(path)
+                            if mask & _Watcher.IN_ISDIR and mask & (_Watcher.IN_CREATE | _Watcher.IN_MOVED_TO) and \
+                                    watched_dirs[wd] != os.path.dirname(self.requirements_file):
+                                add_watch(path, True)
+                    timeout = _Watcher.DEBOUNCE_SECONDS
+
+                yield set() if overflowed else changed_paths
+
+        return get_changes()
+
+    def _snapshot(self) -> {str: (int, int)}:
+        """
+        Takes the modification time and size of every watched file.
+
+        :return: Type{str: (int, int)}
+        """
+        snapshot = {}
+        for directory in self.archive_dirs:
+            for (root, directories, files) in os.walk(directory):
+                for file in files:
+                    path = os.path.abspath(os.path.join(root, file))
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+
+        if os.path.isfile(self.requirements_file):
+            stat = os.stat(self.requirements_file)
+            snapshot[self.requirements_file] = (stat.st_mtime_ns, stat.st_size)
+
+        return snapshot
+
+    def _get_polled_changes(self):
+        """
+        Waits for changes by comparing snapshots of the watched files.
+
+        :return: Type[generator] sets of the absolute paths that changed.
+        """
+        import time
+
+        old_snapshot = self._snapshot()
+        while True:
+            time.sleep(_Watcher.POLL_INTERVAL_SECONDS)
+            new_snapshot = self._snapshot()
+            changed_paths = {path for path in old_snapshot.keys() | new_snapshot.keys()
+                             if old_snapshot.get(path) != new_snapshot.get(path)}
+            old_snapshot = new_snapshot
+            if len(changed_paths) > 0:
+                yield changed_paths
+
+    def run(self):
+        """
+        Prepares the dependencies once, then keeps them up to date until interrupted.
+
+        :return: None.
+        """
+        if not self.options.use_archive_cache:
+            logging.error(f"Watch mode needs '{_OptionsConfigurationKeys.USE_ARCHIVE_CACHE} = True', since every "
+                          f"submission deletes the Distribution Directory otherwise.")
+            exit(1)
+
+        build_submission(self.config)
+
+        try:
+            changes = self._get_inotify_changes()
+            logging.info("Watching for changes with inotify. Press Ctrl+C to stop.")
+        except (OSError, AttributeError) as e:
+            logging.info(f"inotify is not available ({e}), polling for changes every "
+                         f"{_Watcher.POLL_INTERVAL_SECONDS} seconds. Press Ctrl+C to stop.")
+            changes = self._get_polled_changes()
+
+        try:
+            for changed_paths in changes:
+                if len(changed_paths) == 0:
+                    logging.warning("Some changes were missed, checking everything.")
+                    build_submission(self.config)
+                elif not self._rebuild(changed_paths):
+                    continue
+                logging.info("Ready.")
+        except KeyboardInterrupt:
+            logging.info("Stopped watching.")
+
+
+class _SparkSubmitProcess:
+    """
+    Runs spark-submit and supervises it: its output is streamed to the console and written to the log file, the
+    application ID and tracking URL are picked out of it, and the process is stopped early when it runs out of time or
+    prints a line matching one of the fatal patterns, so that a broken submission does not keep holding the cluster.
+    """
+
+    # YARN, standalone, local and Kubernetes application IDs.
+    APPLICATION_ID_PATTERN = r'\b(application_\d+_\d+|app-\d{14}-\d{4,}|local-\d{13}|spark-[0-9a-f]{32})\b'
+    TRACKING_URL_PATTERNS = [r'tracking URL: (\S+)', r'SparkUI.* at (https?://\S+)']
+
+    # The exit codes of a spark-submit that was stopped by SSP, like the `timeout` command's.
+    TIMEOUT_EXIT_CODE = 124
+    FATAL_PATTERN_EXIT_CODE = 1
+    INTERRUPTED_EXIT_CODE = 130
+
+    # Seconds spark-submit is given to exit after being asked to stop, before it is killed.
+    STOP_GRACE_SECONDS = 10
+
+    # The processes that are running, so that all of them can be stopped, e.g. when a batch is interrupted.
+    _running = set()
+    _running_lock = threading.Lock()
+
+    def __init__(self, args, timeout=0, output_timeout=0, fatal_patterns=()):
+        """
+        :param args: The spark-submit command, 'spark-submit' first.
+        :param timeout: The seconds spark-submit may run, 0 for no limit.
+        :param output_timeout: The seconds spark-submit may go without printing anything, 0 for no limit.
+        :param fatal_patterns: Regular expressions, spark-submit is stopped when a line of its output matches one.
+        """
+        self.args = args
+        self.timeout = timeout
+        self.output_timeout = output_timeout
+        self.fatal_patterns = [re.compile(pattern) for pattern in fatal_patterns]
+        self.application_id = None
+        self.tracking_url = None
+        self.failure = None
+        self._exit_code = None
+        self._process = None
+        self._last_output = time.monotonic()
+
+        self._output_logger = logging.getLogger('spark-submit')
+        self._output_logger.propagate = False
+        self._output_logger.handlers = [handler for handler in logging.getLogger().handlers
+                                        if isinstance(handler, logging.FileHandler)]
+
+    def _signal(self, kill=False):
+        """
+        Asks spark-submit and the processes it started to stop, or kills them.
+
+        :param kill: Whether to kill the processes instead of asking them to stop.
+        :return: None.
+        """
+        if os.name == 'nt':
+            self._process.kill() if kill else self._process.terminate()
+            return
+
+        import signal
+
+        try:
+            os.killpg(self._process.pid, signal.SIGKILL if kill else signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    @staticmethod
+    def stop_all(failure, exit_code, kill=False):
+        """
+        Asks every running spark-submit to stop, or kills them. spark-submit runs in its own session, so it does not
+        get the interrupts of the terminal, and `run` only sees them in the main thread.
+
+        :param failure: Why spark-submit is stopped.
+        :param exit_code: The exit code to report instead of spark-submit's.
+        :param kill: Whether to kill the processes instead of asking them to stop.
+        :return: None.
+        """
+        with _SparkSubmitProcess._running_lock:
+            running = list(_SparkSubmitProcess._running)
+        for process in running:
+            process._stop(failure, exit_code)
+            if kill:
+                process._signal(kill=True)
+
+    def _stop(self, failure, exit_code):
+        """
+        Asks spark-submit to stop. The first reason to stop is the one that is reported.
+
+        :param failure: Why spark-submit is stopped.
+        :param exit_code: The exit code to report instead of spark-submit's.
+        :return: None.
+        """
+        if self.failure is None:
+            self.failure = failure
+            self._exit_code = exit_code
+            self._signal()
+
+    def _handle_line(self, line):
+        """
+        Writes a line of output to the log file, and checks it for the application ID, the tracking URL and the
+        fatal patterns.
+
+        :param line: The line, without the line break.
+        :return: None.
+        """
+        self._output_logger.info(line)
+
+        if self.application_id is None:
+            match = re.search(_SparkSubmitProcess.APPLICATION_ID_PATTERN, line)
+            if match:
+                self.application_id = match.group(1)
+                logging.info(f"Spark application ID: {self.application_id}")
+
+        if self.tracking_url is None:
+            for pattern in _SparkSubmitProcess.TRACKING_URL_PATTERNS:
+                match = re.search(pattern, line)
+                if match:
+                    self.tracking_url = match.group(1)
+                    logging.info(f"Spark tracking URL: {self.tracking_url}")
+                    break
+
+        for pattern in self.fatal_patterns:
+            if pattern.search(line):
+                self._stop(f"it printed a line matching the fatal pattern '{pattern.pattern}':\n  {line}",
+                           _SparkSubmitProcess.FATAL_PATTERN_EXIT_CODE)
+                break
+
+    def _stream(self, source, console):
+        """
+        Copies the output of spark-submit to the console as it comes, and hands every line of it to `_handle_line`.
+        Progress bars that redraw a line with carriage returns are shown right away, but only logged once the line
+        ends.
+
+        :param source: The pipe of spark-submit's stdout or stderr.
+        :param console: The stream of this process to copy the output to.
+        :return: None.
+        """
+        pending = b''
+        for chunk in iter(lambda: source.read1(64 * 1024), b''):
+            self._last_output = time.monotonic()
+            if hasattr(console, 'buffer'):
+                console.buffer.write(chunk)
+            else:
+                console.write(chunk.decode(errors='replace'))
+            console.flush()
+
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                self._handle_line(line.rstrip(b'\r').decode(errors='replace').split('\r')[-1])
+
+        if pending != b'':
+            self._handle_line(pending.rstrip(b'\r').decode(errors='replace').split('\r')[-1])
+
+    def run(self) -> int:
+        """
+        Runs spark-submit and waits for it to finish.
+
+        :return: Type[int] the exit code of spark-submit, or TIMEOUT_EXIT_CODE or FATAL_PATTERN_EXIT_CODE if it was
+            stopped by SSP.
+        """
+        started = time.monotonic()
+        # spark-submit gets its own process group, so that the processes it starts are stopped along with it. On
+        # Windows, spark-submit is a .cmd file, which only the shell runs.
+        self._process = subprocess.Popen(args=self.args, shell=os.name == 'nt', stdout=subprocess.PIPE,
+                                         stderr=subprocess.PIPE, start_new_session=os.name != 'nt')
+        readers = [threading.Thread(target=self._stream, args=(self._process.stdout, sys.stdout), daemon=True),
+                   threading.Thread(target=self._stream, args=(self._process.stderr, sys.stderr), daemon=True)]
+        for reader in readers:
+            reader.start()
+
+        with _SparkSubmitProcess._running_lock:
+            _SparkSubmitProcess._running.add(self)
+        try:
+            stopped = None
+            while True:
+                try:
+                    exit_code = self._process.wait(timeout=1)
+                    break
+                except subprocess.TimeoutExpired:
+                    pass
+                except KeyboardInterrupt:
+                    self._stop("it was interrupted.", _SparkSubmitProcess.INTERRUPTED_EXIT_CODE)
+
+                now = time.monotonic()
+                if 0 < self.timeout < now - started:
+                    self._stop(f"it ran for more than {self.timeout} seconds.",
+                               _SparkSubmitProcess.TIMEOUT_EXIT_CODE)
+                elif 0 < self.output_timeout < now - self._last_output:
+                    self._stop(f"it printed nothing for more than {self.output_timeout} seconds.",
+                               _SparkSubmitProcess.TIMEOUT_EXIT_CODE)
+
+                if self.failure is not None:
+                    stopped = now if stopped is None else stopped
+                    if now - stopped > _SparkSubmitProcess.STOP_GRACE_SECONDS:
+                        self._signal(kill=True)
+        finally:
+            with _SparkSubmitProcess._running_lock:
+                _SparkSubmitProcess._running.discard(self)
+
+        # Processes spark-submit left running in the background may keep its output open.
+        for reader in readers:
+            reader.join(timeout=_SparkSubmitProcess.STOP_GRACE_SECONDS)
+
+        if self.failure is not None:
+            logging.error(f"Stopped spark-submit, {self.failure}")
+            return self._exit_code
+
+        return exit_code
+
+
+def _init_logger(config_filename, log_to_file=True):
+    """
+    Read the logging config from the [LOGGING] section of config file and applies it to the logger.
+
+    :param config_filename: The complete filename of the config file.
+    :param log_to_file: Whether or not the logs are also written to the log file.
+    :return: None.
+    """
+    LOGGING_CONFIG_SECTION_NAME = 'LOGGING'
+
+    conf = configparser.ConfigParser()
+    conf.read(config_filename)
+
+    level = 20
+
+    try:
+        conf = conf[LOGGING_CONFIG_SECTION_NAME]
+    except KeyError:
+        logging.error(f"Unable to read [{LOGGING_CONFIG_SECTION_NAME}] "
+                      f"Section from '{CONFIGURATION_FILENAME}' config file.")
+        exit(1)
+    try:
+        level = conf.getint('Level')
+    except (ValueError, TypeError):
+        logging.error(f"Unable to read [{LOGGING_CONFIG_SECTION_NAME}] "
+                      f"Section's 'Level' key as an Integer."
+                      f"Make sure that the value of 'Level' is an integer")
+        exit(1)
+    log_file = os.path.join(PRIVATE_FOLDER_PATH, 'log.txt')
+    handlers = [logging.StreamHandler()]
+    if log_to_file:
+        # Runs of the project may overlap, so the log is appended to, and every line says which run wrote it.
+        file_handler = logging.FileHandler(log_file, mode='a')
+        file_handler.setFormatter(logging.Formatter("SSP - %(asctime)s - %(process)7d - %(levelname)8s - %(message)s",
+                                                    datefmt='%Y-%m-%d %H:%M:%S'))
+        handlers.insert(0, file_handler)
+    logging.basicConfig(format="SSP - %(asctime)s - %(levelname)8s - %(message)s",
+                        level=level,
+                        datefmt='%H:%M:%S',
+                        handlers=handlers)
+    if log_to_file:
+        logging.info(f"Logs are being stored in {log_file}")
+
+
+def _pop_ssp_arg(args, name):
+    """
+    Removes an argument meant for SSP, e.g. `--jobs 4` or `--jobs=4`, from the args before they are passed to
+    spark-submit.
+
+    Only the spark-submit options before the application file are searched, so the application's own arguments are
+    never taken.
+
+    :param args: The args passed to this script. The argument is removed from this list.
+    :param name: The name of the argument, e.g. '--jobs'.
+    :return: Type[str] the value of the argument, None if it was not passed.
+    """
+    idx = 1
+    while idx < len(args) and args[idx].startswith('-'):
+        if args[idx] == name:
+            value = args[idx + 1] if len(args) > idx + 1 else ''
+            del args[idx:idx + 2]
+            return value
+        if args[idx].startswith(name + '='):
+            value = args[idx][len(name) + 1:]
+            del args[idx]
+            return value
+        idx += 1 if args[idx] in SPARK_SUBMIT_FLAGS or '=' in args[idx] else 2
+
+    return None
+
+
+def _pop_ssp_flag(args, name) -> bool:
+    """
+    Removes a flag meant for SSP, e.g. `--json`, from the args before they are passed to spark-submit.
+
+    Like `_pop_ssp_arg`, only the spark-submit options before the application file are searched.
+
+    :param args: The args passed to this script. The flag is removed from this list.
+    :param name: The name of the flag, e.g. '--json'.
+    :return: Type[bool] whether or not the flag was passed.
+    """
+    idx = 1
+    while idx < len(args) and args[idx].startswith('-'):
+        if args[idx] == name:
+            del args[idx]
+            return True
+        idx += 1 if args[idx] in SPARK_SUBMIT_FLAGS or '=' in args[idx] else 2
+
+    return False
+
+
+def _get_application_file(args) -> str:
+    """
+    Finds the application file in the args, i.e. the first argument that is not a spark-submit option.
+
+    :param args: The args passed to this script, this script's filename first.
+    :return: Type[str] the application file, None if there is none.
+    """
+    idx = 1
+    while idx < len(args) and args[idx].startswith('-'):
+        idx += 1 if args[idx] in SPARK_SUBMIT_FLAGS or '=' in args[idx] else 2
+
+    return args[idx] if idx < len(args) else None
+
+
+def _read_batch_jobs(filename) -> [[str]]:
+    """
+    Reads a job list, one job per line. Every line holds the args of a job, as they would be passed to ssp.sh, e.g.
+    `--master local jobs/daily.py 2024-01-01`. Blank lines and comments starting with '#' are skipped.
+
+    :param filename: The complete filename of the job list, '-' reads it from the standard input.
+    :return: Type[[str]] the args of every job.
+    """
+    import shlex
+
+    try:
+        if filename == '-':
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(filename, 'r') as file:
+                lines = file.read().splitlines()
+    except OSError as e:
+        logging.error(f"Unable to read the job list '{filename}': {e}")
+        exit(1)
+
+    jobs = []
+    for (number, line) in enumerate(lines, start=1):
+        try:
+            job = shlex.split(line, comments=True)
+        except ValueError as e:
+            logging.error(f"Unable to read line {number} of the job list '{filename}': {e}")
+            exit(1)
+        if len(job) > 0:
+            jobs.append(job)
+
+    return jobs
+
+
+def _log_batch_summary(jobs, results):
+    """
+    Logs the exit code and the duration of every job of a batch.
+
+    :param jobs: The args of every job.
+    :param results: The exit code and the duration of every job, returned by `submit_batch`.
+    :return: None.
+    """
+    failed = sum(1 for (exit_code, _) in results if exit_code != 0)
+    lines = [f"{'Job':<5} {'Exit':>5} {'Time (s)':>10}  Args"]
+    for (number, (job, (exit_code, seconds))) in enumerate(zip(jobs, results), start=1):
+        lines.append(f"{number:<5} {exit_code:>5} {seconds:>10.3f}  {subprocess.list2cmdline(job)}")
+
+    logging.info(f"Batch of {len(jobs)} jobs finished, {failed} failed:\n\n" + '\n'.join(lines) + '\n')
+
+
+def _read_spark_properties_file(args) -> {str: str}:
+    """
+    Reads the Spark properties spark-submit loads before the `--conf` args: the `--properties-file` passed to this
+    script, or 'spark-defaults.conf' in SPARK_CONF_DIR, or in the 'conf' directory of SPARK_HOME.
+
+    :param args: The args passed to this script, this script's filename first.
+    :return: Type{str: str} the properties, empty if there is no properties file.
+    """
+    properties_file = _pop_ssp_arg(list(args), '--properties-file')
+    if properties_file is None:
+        conf_dir = os.environ.get('SPARK_CONF_DIR')
+        if conf_dir is None and os.environ.get('SPARK_HOME') is not None:
+            conf_dir = os.path.join(os.environ['SPARK_HOME'], 'conf')
+        properties_file = os.path.join(conf_dir, 'spark-defaults.conf') if conf_dir is not None else None
+
+    properties = {}
+    if properties_file is None or not os.path.isfile(properties_file):
+        return properties
+
+    with open(properties_file, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if line == '' or line.startswith(('#', '!')):
+                continue
+            parts = re.split(r'\s*[=:]\s*|\s+', line, maxsplit=1)
+            properties[parts[0]] = parts[1] if len(parts) > 1 else ''
+    return properties
+
+
+def _build_spark_submit_args(args, code_files, file_assets, archive_assets, spark_conf=None) -> [str]:
+    """
+    Makes the spark-submit command from the args passed to this script and the lists of dependencies.
+
+    The `--py-files`, `--files` and `--archives` args passed to this script are merged with the lists.
+
+    :param args: The args passed to this script, this script's filename first.
+    :param code_files: Complete filenames of the code dependencies.
+    :param file_assets: Complete filenames of the file assets.
+    :param archive_assets: Complete filenames of the archive assets.
+    :param spark_conf: Spark properties to pass as `--conf` args. Properties passed to this script are kept instead,
+        except for those of PATH_LIST_SPARK_CONF_KEYS, whose value is appended to the one passed to this script or set
+        in the Spark properties file.
+    :return: Type[str] the command, 'spark-submit' first.
+    """
+    args = list(args)
+
+    # Convert it to a comma separated string of filenames.
+    requirements_list_str = ','.join(code_files)
+    assets_list_str = ','.join(file_assets)
+    archives_list_str = ','.join(archive_assets)
+
+    old_py_files_args = ''
+    old_files_args = ''
+    old_archive_args = ''
+
+    # If a '--py-files' arg was passed, merge it with the requirements_list_str.
+    if '--py-files' in args:
+        idx = args.index('--py-files')
+        if len(args) > idx + 1:
+            old_py_files_args = args[idx + 1]
+            del args[idx + 1]
+        del args[idx]
+        requirements_list_str = old_py_files_args + ',' + requirements_list_str
+
+    if '--files' in args:
+        idx = args.index('--files')
+        if len(args) > idx + 1:
+            old_files_args = args[idx + 1]
+            del args[idx + 1]
+        del args[idx]
+        assets_list_str = old_files_args + ',' + assets_list_str
+
+    if '--archives' in args:
+        idx = args.index('--archives')
+        if len(args) > idx + 1:
+            old_archive_args = args[idx + 1]
+            del args[idx + 1]
+        del args[idx]
+        archives_list_str = old_archive_args + ',' + archives_list_str
+
+    # The arg[0] is this file's name. Changing it to spark-submit.
+    args[0] = 'spark-submit'
+
+    spark_properties = None
+    for (key, value) in reversed(sorted((spark_conf or {}).items())):
+        idx = next((idx for (idx, arg) in enumerate(args) if arg.startswith(f"{key}=")), None)
+        if key in PATH_LIST_SPARK_CONF_KEYS:
+            if spark_properties is None:
+                spark_properties = _read_spark_properties_file(args)
+            old_value = args[idx][len(key) + 1:] if idx is not None else spark_properties.get(key, '')
+            if old_value != '':
+                logging.info(f"Appending '{value}' to the '{key}' Spark property, which is '{old_value}'.")
+                value = os.pathsep.join([old_value, value])
+            if idx is not None:
+                args[idx] = f"{key}={value}"
+                continue
+
+        if idx is None:
+            args.insert(1, f"{key}={value}")
+            args.insert(1, '--conf')
+
+    # Insert the list filenames of dependencies as the --py-files arg.
+    if requirements_list_str != '':
+        args.insert(1, requirements_list_str)
+        args.insert(1, '--py-files')
+
+    if assets_list_str != '':
+        args.insert(1, assets_list_str)
+        args.insert(1, '--files')
+
+    if archives_list_str != '':
+        args.insert(1, archives_list_str)
+        args.insert(1, '--archives')
+
+    return args
+
+
+def _print_plan(plan, command, unknown=()):
+    """
+    Prints a submission plan in a human readable form.
+
+    :param plan: The dict returned by `Requirements.get_submission_plan`.
+    :param command: The spark-submit command the plan would run.
+    :param unknown: Type[str] what in the command is not known before the files are built, see `_plan_submission`.
+    :return: None.
+    """
+    print(f"Command:\n  {subprocess.list2cmdline(command)}")
+
+    for (title, key) in [('--py-files', 'py_files'), ('--files', 'files'), ('--archives', 'archives')]:
+        print(f"\n{title}:")
+        for path in plan[key]:
+            print(f"  {path}")
+
+    requirements = plan['requirements']
+    print(f"\nRequirements: {requirements['action']}")
+    for line in requirements['lines']:
+        print(f"  {line}")
+
+    print("\nArtifacts:")
+    for artifact in plan['artifacts']:
+        source = f" (from {artifact['source']})" if artifact['source'] is not None else ''
+        print(f"  {artifact['action']:<7} {artifact['path']}{source}")
+
+    if len(unknown) > 0:
+        print("\nNot known before building:")
+        for line in unknown:
+            print(f"  {line}")
+
+
+class SubmissionConfig:
+    """
+    The parsed configuration of a project, kept in memory so it can be used for many submissions.
+
+    The paths in the config file, and the private folder of SSP, are relative to the current working directory, so it
+    must be the project directory while the config is being used, just like when ssp.sh is run.
+    """
+
+    def __init__(self, config_filename=CONFIGURATION_FILENAME):
+        """
+        Reads the config file.
+
+        :param config_filename: The complete filename of the config file.
+        """
+        # Check if config file exists.
+        if not os.path.isfile(config_filename):
+            logging.error(
+                f"'{config_filename}' file was not found in the current working directory. "
+                f"Make sure you run the ssp.sh from the project directory and that the project directory has the "
+                f"'{config_filename}' configuration file."
+            )
+            exit(1)
+
+        self.config_filename = config_filename
+
+        # Load paths for the script to use.
+        self.paths = _Paths(config_filename)
+
+        # Load options
+        self.options = _Options(config_filename)
+
+        self._cache = None
+
+    def get_cache(self) -> _ArchiveCache:
+        """
+        Loads the archive cache the first time it is needed and keeps it warm for later submissions.
+
+        :return: Type[_ArchiveCache]
+        """
+        if self._cache is None or self._cache.enabled != self.options.use_archive_cache:
+            self._cache = _ArchiveCache(self.options.use_archive_cache)
+        return self._cache
+
+
+class SubmissionPlan:
+    """
+    The dependencies of a submission, prepared on the disk and ready to be passed to spark-submit.
+    """
+
+    def __init__(self, py_files, files, archives, metrics=None, environment_alias=None, generation_lock=None,
+                 spark_conf=None):
+        """
+        :param py_files: Complete filenames of the code dependencies.
+        :param files: Complete filenames of the file assets.
+        :param archives: Complete filenames of the archive assets.
+        :param metrics: An instance of _Metrics holding the stages of the preparation, None starts empty metrics.
+        :param environment_alias: The alias of the packed virtual environment in `archives`, whose python Spark is set
+            to run. None if there is no packed environment.
+        :param generation_lock: The _FileLock held on the build generation of the files, it is held for as long as the
+            plan exists. None if the files are not pinned to a generation.
+        :param spark_conf: Type{str: str} Spark properties the submission needs, e.g. to run the extraction bootstrap.
+        """
+        self.py_files = py_files
+        self.files = files
+        self.archives = archives
+        self.metrics = metrics if metrics is not None else _Metrics()
+        self.environment_alias = environment_alias
+        self.generation_lock = generation_lock
+        self.spark_conf = spark_conf if spark_conf is not None else {}
+
+    def get_spark_submit_args(self, args) -> [str]:
+        """
+        Makes the spark-submit command for this plan.
+
+        :param args: The args to pass to spark-submit, e.g. ['--master', 'local', 'main.py'].
+        :return: Type[str] the command, 'spark-submit' first.
+        """
+        spark_conf = dict(self.spark_conf)
+        if self.environment_alias is not None:
+            spark_conf.update(_VirtualEnvironment.get_spark_conf(self.environment_alias, args))
+        return _build_spark_submit_args(['spark-submit'] + list(args), self.py_files, self.files, self.archives,
+                                        spark_conf)
+
+
+def _prepare_dependencies(config: SubmissionConfig, application_file, metrics: _Metrics) -> ([str], [str], [str]):
+    """
+    Reuses the dependencies of the last run if the manifest shows that nothing changed, builds them otherwise, and
+    checks their sizes. It should be called while the build lock is held.
+
+    :param config: An instance of SubmissionConfig.
+    :param application_file: The python file that will be passed to spark-submit, see `build_submission`.
+    :param metrics: An instance of _Metrics, the stages are recorded in.
+    :return: Type([str], [str], [str]) the code dependencies, file assets and archive assets.
+    """
+    options = config.options
+
+    # Pruned dependencies only hold for the application file they were pruned for.
+    if not options.prune_unused_code:
+        application_file = None
+
+    # Without the archive cache and the requirements lock, every run is meant to build everything again.
+    manifest = _Manifest(options.use_manifest and options.use_archive_cache and options.use_requirements_lock)
+
+    with metrics.measure('manifest') as stage:
+        dependencies = manifest.get_dependencies(config.config_filename, config.paths, application_file)
+        stage.values['action'] = 'build' if dependencies is None else 'reuse'
+
+    if dependencies is not None:
+        logging.info("Nothing changed since the last run. Reusing its dependencies...")
+    else:
+        # Acquire a list of dependencies (filenames).
+        dependencies = \
+            Requirements.get_requirements_list(config.paths, options, config.get_cache(), metrics, application_file)
+
+        # Requirements that failed to build are tried again by the next run.
+        requirements_state = _VirtualEnvironment() if options.pack_virtual_environment else _RequirementsLock()
+        if os.path.isfile(config.paths.requirements_file) and requirements_state.requirements_hash is None:
+            manifest.enabled = False
+
+        manifest.save(config.config_filename, config.paths, *dependencies, application_file)
+
+    # The sizes are checked before anything is uploaded, to the artifact store or by spark-submit.
+    if len(options.size_budgets) > 0 or options.print_size_report:
+        with metrics.measure('sizes') as stage:
+            artifacts = _SizeReport.analyze(*dependencies, details=options.print_size_report)
+            exceeded_budgets = _SizeReport.check_budgets(artifacts, options.size_budgets)
+            stage.files = len(artifacts)
+            if len(exceeded_budgets) > 0 and not options.print_size_report:
+                artifacts = _SizeReport.analyze(*dependencies, details=True)
+
+        if options.print_size_report or len(exceeded_budgets) > 0:
+            logging.info(f"Sizes:\n\n{_SizeReport.format(artifacts)}\n")
+        if len(exceeded_budgets) > 0:
+            exceeded_str = '\n  '.join(exceeded_budgets)
+            if options.fail_on_size_budgets:
+                logging.error(f"\n  The shipped files are too large:\n  {exceeded_str}\n  ")
+                exit(1)
+            logging.warning(f"\n  The shipped files are larger than their budgets:\n  {exceeded_str}\n  ")
+
+    return dependencies
+
+
+def build_submission(config=None, application_file=None) -> SubmissionPlan:
+    """
+    Prepares the dependencies of a project, i.e. loads the external packages and archives the directories.
+
+    Passing the same config to every call reuses the parsed config file and the archive cache. If the manifest
+    shows that nothing changed since the last call, the dependencies of the last call are returned right away.
+
+    Builds of the same project, in this process or in others, run one at a time. Unless 'Use Build Generations' is
+    false, the returned plan ships the files of its own build generation, which later builds leave alone for as long
+    as the plan exists.
+
+    :param config: An instance of SubmissionConfig, None reads the config file of the current working directory.
+    :param application_file: The python file that will be passed to spark-submit. Code it does not import is pruned
+        if the [OPTIONS] section's 'Prune Unused Code' is true.
+    :return: Type[SubmissionPlan]
+    """
+    if config is None:
+        config = SubmissionConfig()
+
+    metrics = _Metrics()
+    options = config.options
+
+    # A build that waited usually finds that nothing changed, and shares the generation of the build it waited for.
+    build_lock = _BuildGenerations.get_build_lock()
+    with metrics.measure('lock'):
+        if not build_lock.acquire(blocking=False):
+            logging.info("Waiting for another build of this project to finish...")
+            build_lock.acquire()
+
+    generation_lock = None
+    spark_conf = {}
+    try:
+        dependencies = _prepare_dependencies(config, application_file, metrics)
+
+        # The manifest keeps the dependencies without the bootstrap, so the option can be changed without a rebuild.
+        if options.executor_extraction_cache != '':
+            with metrics.measure('bootstrap') as stage:
+                hashes = _FileHashes()
+                py_files = _ExtractionBootstrap.add_module(config.paths, dependencies[0])
+                bundles = _ExtractionBootstrap.hash_bundles(py_files, hashes)
+                hashes.save()
+                dependencies = (py_files, dependencies[1], dependencies[2])
+                stage.files = len(bundles)
+                stage.bytes_read = hashes.bytes_read
+
+        if options.use_build_generations:
+            with metrics.measure('generation') as stage:
+                dependencies, generation_lock, created = _BuildGenerations.pin(config.paths, dependencies)
+                stage.values['action'] = 'build' if created else 'reuse'
+                stage.values['deleted'] = _BuildGenerations.collect_garbage()
+
+        if options.executor_extraction_cache != '':
+            spark_conf = _ExtractionBootstrap.get_spark_conf(dependencies[0], bundles,
+                                                             options.executor_extraction_cache)
+
+        # The manifest keeps the local files, so a change of the store never needs a rebuild.
+        if options.artifact_store != '':
+            with metrics.measure('store') as stage:
+                store = _ArtifactStore.open(options.artifact_store)
+                dependencies = [store.publish(paths) for paths in dependencies]
+                store.save()
+                stage.files = store.files_written
+                stage.bytes_read = store.bytes_read
+                stage.bytes_written = store.bytes_written
+            logging.info(f"Added {store.files_written} files to the artifact store '{options.artifact_store}'.")
+    finally:
+        build_lock.release()
+
+    return SubmissionPlan(*dependencies, metrics, _VirtualEnvironment.get_shipped_alias(options, dependencies[2]),
+                          generation_lock, spark_conf)
+
+
+def _plan_submission(config: SubmissionConfig, plan) -> (SubmissionPlan, [str]):
+    """
+    Works out the SubmissionPlan `build_submission` would return, from what `Requirements.get_submission_plan` found,
+    without writing anything, so that 'plan' shows the command that would actually run: with the files of the build
+    generation, the Spark properties of the extraction bootstrap and the URIs of the artifact store.
+
+    What is only known once the files are built, i.e. the hashes of the files that would be built and the build
+    generation they would be pinned to, is PLAN_PLACEHOLDER.
+
+    :param config: An instance of SubmissionConfig.
+    :param plan: The dict returned by `Requirements.get_submission_plan`.
+    :return: Type(SubmissionPlan, [str]) the submission plan, and what in it is not known before the files are built.
+    """
+    options = config.options
+    dependencies = (list(plan['py_files']), list(plan['files']), list(plan['archives']))
+    unknown_files = {os.path.normpath(artifact['path']) for artifact in plan['artifacts']
+                     if artifact['action'] == 'build'}
+    complete = plan['requirements']['action'] != 'build'
+
+    spark_conf = {}
+    hashes = _FileHashes()
+    if options.executor_extraction_cache != '':
+        if not _ExtractionBootstrap.is_module_up_to_date(config.paths):
+            unknown_files.add(os.path.normpath(_ExtractionBootstrap.get_archive_path(config.paths)))
+        py_files = _ExtractionBootstrap.get_py_files(config.paths, dependencies[0])
+        bundles = _ExtractionBootstrap.hash_bundles(py_files, hashes, unknown_files)
+        dependencies = (py_files, dependencies[1], dependencies[2])
+
+    local_dependencies = dependencies
+    if options.use_build_generations:
+        dependencies = _BuildGenerations.plan(config.paths, dependencies, unknown_files, complete)
+
+    if options.executor_extraction_cache != '':
+        spark_conf = _ExtractionBootstrap.get_spark_conf(dependencies[0], bundles, options.executor_extraction_cache)
+
+    # The files of a generation are links to the local files, so they have the same names and hashes.
+    if options.artifact_store != '':
+        store = _ArtifactStore.open(options.artifact_store)
+        dependencies = [store.get_uris(paths, unknown_files) for paths in local_dependencies]
+
+    unknown = []
+    if not complete:
+        unknown.append("The wheels of the requirements, the requirements file has to be resolved again.")
+    if len(unknown_files) > 0 or not complete:
+        if options.use_build_generations:
+            unknown.append(f"The build generation, shown as '{PLAN_PLACEHOLDER}'.")
+        if options.executor_extraction_cache != '' or options.artifact_store != '':
+            unknown.append(f"The sha256 hashes of the files that would be built, shown as '{PLAN_PLACEHOLDER}'.")
+
+    environment_alias = _VirtualEnvironment.get_shipped_alias(options, dependencies[2])
+    return SubmissionPlan(*dependencies, environment_alias=environment_alias, spark_conf=spark_conf), unknown
+
+
+def submit(plan: SubmissionPlan, args, config=None) -> int:
+    """
+    Runs spark-submit with the dependencies of the plan and waits for it to finish. Its output is streamed to the
+    console and written to the log file.
+
+    The 'args' and 'spark-submit' stages are recorded in the plan's metrics, along with the application ID and the
+    tracking URL if spark-submit printed them.
+
+    :param plan: An instance of SubmissionPlan, returned by `build_submission`.
+    :param args: The args to pass to spark-submit, e.g. ['--master', 'local', 'main.py'].
+    :param config: An instance of SubmissionConfig, whose timeouts and fatal output patterns are applied. None runs
+        spark-submit without them.
+    :return: Type[int] the exit code of spark-submit, see `_SparkSubmitProcess.run`.
+    """
+    with plan.metrics.measure('args'):
+        args = plan.get_spark_submit_args(args)
+
+    logging.debug(f"Running the following command:\n\n  {subprocess.list2cmdline(args)}\n")
+
+    if config is not None:
+        options = config.options
+        spark_submit_proc = _SparkSubmitProcess(args, options.submit_timeout, options.output_timeout,
+                                                options.fatal_output_patterns)
+    else:
+        spark_submit_proc = _SparkSubmitProcess(args)
+
+    with plan.metrics.measure('spark-submit', children=True) as stage:
+        exit_code = spark_submit_proc.run()
+        stage.values['exit_code'] = exit_code
+        for key in ['application_id', 'tracking_url', 'failure']:
+            if getattr(spark_submit_proc, key) is not None:
+                stage.values[key] = getattr(spark_submit_proc, key)
+    return exit_code
+
+
+def submit_batch(plan: SubmissionPlan, jobs, concurrency=1, config=None) -> [(int, float)]:
+    """
+    Runs spark-submit once for every job with the dependencies of the plan, so that they are prepared only once for
+    the whole batch.
+
+    An interrupt, e.g. Ctrl+C, stops the batch: the jobs that did not start are skipped, and the spark-submit of the
+    running ones is asked to stop, or killed by a second interrupt. Both report INTERRUPTED_EXIT_CODE.
+
+    :param plan: An instance of SubmissionPlan, returned by `build_submission`.
+    :param jobs: The args to pass to spark-submit for every job, e.g. [['--master', 'local', 'daily.py'], ...].
+    :param concurrency: The number of spark-submit processes that run at the same time.
+    :param config: An instance of SubmissionConfig, whose timeouts and fatal output patterns are applied to every job.
+    :return: Type[(int, float)] the exit code of spark-submit and the seconds it ran, for every job in order.
+    """
+    interrupted = threading.Event()
+
+    def run(job):
+        if interrupted.is_set():
+            return _SparkSubmitProcess.INTERRUPTED_EXIT_CODE, 0.0
+        started = time.perf_counter()
+        try:
+            exit_code = submit(plan, job, config)
+        except OSError as e:
+            logging.error(f"Unable to run spark-submit for the job '{subprocess.list2cmdline(job)}': {e}")
+            exit_code = 1
+        return exit_code, time.perf_counter() - started
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(concurrency, 1))
+    futures = [executor.submit(run, job) for job in jobs]
+    try:
+        concurrent.futures.wait(futures)
+    except KeyboardInterrupt:
+        # Only the main thread gets the interrupt, the jobs' threads and spark-submit processes never see it.
+        logging.warning("Interrupted. Stopping the batch...")
+        interrupted.set()
+        for future in futures:
+            future.cancel()
+
+        # A job may start spark-submit right after the others were stopped, so they are stopped until all finished.
+        kill = False
+        while not all(future.done() for future in futures):
+            _SparkSubmitProcess.stop_all("it was interrupted.", _SparkSubmitProcess.INTERRUPTED_EXIT_CODE, kill)
+            try:
+                concurrent.futures.wait(futures, timeout=1)
+            except KeyboardInterrupt:
+                logging.warning("Interrupted again. Killing the batch...")
+                kill = True
+    finally:
+        executor.shutdown(wait=True)
+
+    return [(_SparkSubmitProcess.INTERRUPTED_EXIT_CODE, 0.0) if future.cancelled() else future.result()
+            for future in futures]
+
+
+def main(args):
+    """
+    Runs SSP from the command line.
+
+    :param args: The args passed to the script, the script's filename first.
+    :return: None.
+    """
+    args = list(args)
+
+    # 'plan' only prints what would be submitted, without writing anything to the disk.
+    plan_mode = len(args) > 1 and args[1].lower() == 'plan'
+    if plan_mode:
+        del args[1]
+
+    # Initialize Logger
+    if os.path.isfile(CONFIGURATION_FILENAME):
+        _init_logger(CONFIGURATION_FILENAME, log_to_file=not plan_mode)
+
+    config = SubmissionConfig(CONFIGURATION_FILENAME)
+
+    # The number of directories archived at the same time. Overrides the [OPTIONS] section's 'Jobs' key. It may be
+    # passed before or after the command, e.g. `--jobs 4 watch` or `watch --jobs 4`.
+    jobs_arg = _pop_ssp_arg(args, '--jobs')
+    command = args[1].lower() if len(args) > 1 and args[1].lower() in SSP_COMMANDS else None
+    if command is not None:
+        del args[1]
+        if jobs_arg is None:
+            jobs_arg = _pop_ssp_arg(args, '--jobs')
+    if jobs_arg is not None:
+        try:
+            config.options.jobs = int(jobs_arg)
+        except ValueError:
+            logging.error(f"Unable to read the value of '--jobs' as an integer: '{jobs_arg}'.")
+            exit(1)
+
+    if command == 'watch':
+        _Watcher(config).run()
+        exit(0)
+
+    if command == 'batch':
+        # The number of jobs run at the same time. Overrides the [OPTIONS] section's 'Batch Concurrency' key.
+        concurrency_arg = _pop_ssp_arg(args, '--concurrency')
+        if concurrency_arg is not None:
+            try:
+                config.options.batch_concurrency = int(concurrency_arg)
+            except ValueError:
+                logging.error(f"Unable to read the value of '--concurrency' as an integer: '{concurrency_arg}'.")
+                exit(1)
+
+        jobs = _read_batch_jobs(args[1] if len(args) > 1 else '-')
+        if len(jobs) == 0:
+            logging.warning("The job list is empty. Nothing to submit.")
+            exit(0)
+
+        # The jobs have different application files, so the dependencies of all of them are shipped to each.
+        config.options.prune_unused_code = False
+
+        plan = build_submission(config)
+        logging.info(f"Submitting {len(jobs)} jobs, {max(config.options.batch_concurrency, 1)} at a time...")
+        results = submit_batch(plan, jobs, config.options.batch_concurrency, config)
+        _log_batch_summary(jobs, results)
+
+        if config.options.write_metrics:
+            plan.metrics.save()
+        if config.options.print_metrics_summary:
+            logging.info(f"Metrics:\n\n{plan.metrics.get_summary()}\n")
+
+        # The exit code of the first job that failed.
+        exit(next((exit_code for (exit_code, _) in results if exit_code != 0), 0))
+
+    if command == 'gc':
+        store = _SharedWheelStore.get(config.options)
+        if not store.enabled:
+            logging.error("There is no shared wheel store. Define SSP_HOME_DIR, or set the [OPTIONS] section's "
+                          "'Shared Wheel Store Directory', and make sure 'Use Shared Wheel Store' and "
+                          "'Use Requirements Lock' are true.")
+            exit(1)
+
+        lock = store.get_lock(shared=False)
+        if not lock.acquire(blocking=False):
+            logging.info("Waiting for the builds using the shared wheel store to finish...")
+            lock.acquire()
+        try:
+            deleted_wheels, deleted_bytes = store.collect_garbage()
+        finally:
+            lock.release()
+        logging.info(f"Deleted {deleted_wheels} unreferenced wheels from '{store.wheels_dir}', "
+                     f"{_Metrics.format_size(deleted_bytes)} reclaimed.")
+        exit(0)
+
+    if command == 'sizes':
+        # Prepares the dependencies like a submission would, and only reports their sizes.
+        config.options.print_size_report = True
+        build_submission(config, _get_application_file(args))
+        exit(0)
+
+    if plan_mode:
+        json_output = _pop_ssp_flag(args, '--json')
+
+        plan = Requirements.get_submission_plan(config.paths, config.options, _get_application_file(args))
+        (submission, unknown) = _plan_submission(config, plan)
+        command = submission.get_spark_submit_args(args[1:])
+
+        if json_output:
+            print(json.dumps(dict(plan, command=command, unknown=unknown), indent=2))
+        else:
+            _print_plan(plan, command, unknown)
+        exit(0)
+
+    plan = build_submission(config, _get_application_file(args))
+    exit_code = submit(plan, args[1:], config)
+
+    if config.options.write_metrics:
+        plan.metrics.save()
+    if config.options.print_metrics_summary:
+        logging.info(f"Metrics:\n\n{plan.metrics.get_summary()}\n")
+
+    exit(exit_code)
@@ -0,0 +1,231 @@
+"""
+Runs on the executors in place of 'pyspark.daemon', the process that forks the python workers.
+
+Before the daemon starts, the zip files of --py-files are extracted once per host and user into a cache directory,
+named by the sha256 hash of their contents, and the extracted directories are put first on `sys.path`. The workers
+are forked from the daemon, so every worker, and every later application of the user on the host that ships the same
+files, imports plain files instead of opening the zip files again.
+
+A zip file is only extracted if its contents match its hash. On Linux and macOS, every user has their own
+subdirectory of the cache directory, named by their uid, and directories that are not owned by the user, or
+that other users can write to, are never used, so no other user can change the files that are imported.
+
+SSP ships this module in its own zip file when the [OPTIONS] section's 'Executor Extraction Cache' is set, and
+passes what it needs as environment variables of the executors:
+
+SSP_EXTRACTION_CACHE: the cache directory.
+SSP_EXTRACTION_BUNDLES: comma separated '<sha256>:<filename>' of every zip file to extract, in the order of
+    --py-files.
+SSP_EXTRACTION_SEARCH_PATH: directories, separated by os.pathsep, the zip files may be in besides the `sys.path`
+    entries and the working directory, e.g. the directories SSP made them in, for local mode.
+
+Nothing here may stop the daemon from starting. If a zip file can not be found, verified or extracted, a line is
+written to stderr, which the daemon does not use, and the zip file is imported as usual.
+
+Without Spark, `bootstrap` can be run with a stand-in environment, e.g.:
+
+    python -c "import ssp_bootstrap; print(ssp_bootstrap.bootstrap({'SSP_EXTRACTION_CACHE': '/tmp/cache', ...}))"
+"""
+import hashlib
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import zipfile
+
+
+CACHE_VARIABLE = 'SSP_EXTRACTION_CACHE'
+BUNDLES_VARIABLE = 'SSP_EXTRACTION_BUNDLES'
+SEARCH_PATH_VARIABLE = 'SSP_EXTRACTION_SEARCH_PATH'
+
+DAEMON_MODULE = 'pyspark.daemon'
+STAGING_INFIX = '.staging-'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def parse_bundles(value) -> [(str, str)]:
+    """
+    Reads the value of SSP_EXTRACTION_BUNDLES.
+
+    :param value: The value.
+    :return: Type[(str, str)] the sha256 hash and the filename of every zip file.
+    """
+    bundles = []
+    for item in value.split(','):
+        (sha256, _, filename) = item.strip().partition(':')
+        if sha256 != '' and filename != '':
+            bundles.append((sha256, filename))
+    return bundles
+
+
+def find_bundle(filename, path, search_dirs) -> str:
+    """
+    Finds a zip file on the host.
+
+    :param filename: The name of the zip file.
+    :param path: The `sys.path` entries, the zip files of --py-files are there on YARN and Kubernetes.
+    :param search_dirs: Other directories to look in.
+    :return: Type[str] the complete filename of the zip file, None if it is not found.
+    """
+    for entry in path:
+        if os.path.basename(entry) == filename and os.path.isfile(entry):
+            return entry
+
+    for directory in [os.curdir] + list(search_dirs):
+        candidate = os.path.join(directory, filename)
+        if os.path.isfile(candidate):
+            return candidate
+
+    return None
+
+
+def hash_file(filename) -> str:
+    """
+    Hashes a file's contents.
+
+    :param filename: The complete filename.
+    :return: Type[str] the sha256 hash, in hexadecimal.
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def check_directory(directory):
+    """
+    Checks that a directory can be trusted, i.e. that it is not a symbolic link, that it is owned by the current user,
+    and that no other user can write to it. Only checked on Linux and macOS.
+
+    :param directory: The directory.
+    :raises OSError: if it can not be trusted.
+    """
+    if not hasattr(os, 'getuid'):
+        return
+
+    status = os.lstat(directory)
+    if not stat.S_ISDIR(status.st_mode):
+        raise OSError(f"'{directory}' is not a directory.")
+    if status.st_uid != os.getuid():
+        raise OSError(f"'{directory}' is owned by uid {status.st_uid}, not by the current user.")
+    if status.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise OSError(f"'{directory}' can be written to by other users.")
+
+
+def get_user_cache_dir(cache_dir) -> str:
+    """
+    Makes the current user's subdirectory of the cache directory, named by their uid, and checks it. Without uids,
+    i.e. on Windows, the cache directory itself is used.
+
+    :param cache_dir: The cache directory.
+    :return: Type[str] the user's cache directory.
+    :raises OSError: if it can not be made or trusted.
+    """
+    if not hasattr(os, 'getuid'):
+        return cache_dir
+
+    user_cache_dir = os.path.join(cache_dir, str(os.getuid()))
+    try:
+        os.makedirs(cache_dir)
+        # Every user of the host makes their own subdirectory in it, like in /tmp.
+        os.chmod(cache_dir, 0o1777)
+    except FileExistsError:
+        pass
+    os.makedirs(user_cache_dir, mode=0o700, exist_ok=True)
+    check_directory(user_cache_dir)
+    return user_cache_dir
+
+
+def extract(bundle_path, sha256, cache_dir) -> str:
+    """
+    Extracts a zip file into the cache directory, unless it already is. The files are extracted into a staging
+    directory that is then renamed in place, so that workers and applications extracting the same file at the same
+    time never see a partial directory.
+
+    :param bundle_path: The complete filename of the zip file.
+    :param sha256: The sha256 hash of the zip file's contents.
+    :param cache_dir: The user's cache directory, see `get_user_cache_dir`.
+    :return: Type[str] the directory the zip file is extracted in.
+    :raises OSError: if it can not be extracted, or the directory it is extracted in can not be trusted.
+    """
+    target_dir = os.path.join(cache_dir, sha256)
+    if os.path.isdir(target_dir):
+        check_directory(target_dir)
+        # Keeps the directory from looking unused to whatever cleans the cache up.
+        os.utime(target_dir)
+        return target_dir
+
+    # mkdtemp only lets its owner in.
+    staging_dir = tempfile.mkdtemp(prefix=sha256 + STAGING_INFIX, dir=cache_dir)
+    try:
+        with zipfile.ZipFile(bundle_path) as archive:
+            archive.extractall(staging_dir)
+        try:
+            os.rename(staging_dir, target_dir)
+        except OSError:
+            # Another worker or application extracted it first.
+            if not os.path.isdir(target_dir):
+                raise
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    check_directory(target_dir)
+    return target_dir
+
+
+def bootstrap(environment=None, path=None) -> [str]:
+    """
+    Extracts the zip files listed in the environment, and puts the extracted directories first on `path`. The zip
+    files themselves are no longer searched by the imports of this process.
+
+    :param environment: Type{str: str} the environment variables, None for `os.environ`.
+    :param path: Type[str] the module search path, None for `sys.path`. Changed in place.
+    :return: Type[str] the extracted directories.
+    """
+    environment = os.environ if environment is None else environment
+    path = sys.path if path is None else path
+
+    cache_dir = environment.get(CACHE_VARIABLE, '')
+    if cache_dir == '':
+        return []
+
+    try:
+        cache_dir = get_user_cache_dir(cache_dir)
+    except OSError as e:
+        sys.stderr.write(f"ssp_bootstrap: unable to use the cache directory '{cache_dir}', nothing is extracted. {e}\n")
+        return []
+
+    search_dirs = [directory for directory in environment.get(SEARCH_PATH_VARIABLE, '').split(os.pathsep)
+                   if directory != '']
+
+    extracted_dirs = []
+    for (sha256, filename) in parse_bundles(environment.get(BUNDLES_VARIABLE, '')):
+        bundle_path = find_bundle(filename, path, search_dirs)
+        if bundle_path is None:
+            sys.stderr.write(f"ssp_bootstrap: '{filename}' was not found, it is not extracted.\n")
+            continue
+
+        try:
+            if hash_file(bundle_path) != sha256:
+                sys.stderr.write(f"ssp_bootstrap: '{bundle_path}' does not match its hash, it is not extracted.\n")
+                continue
+            extracted_dirs.append(extract(bundle_path, sha256, cache_dir))
+        except (OSError, zipfile.BadZipFile) as e:
+            sys.stderr.write(f"ssp_bootstrap: unable to extract '{bundle_path}', it is imported as it is. {e}\n")
+            continue
+
+        # A None importer makes the imports skip the zip file without opening it.
+        sys.path_importer_cache[bundle_path] = None
+
+    path[0:0] = extracted_dirs
+    return extracted_dirs
+
+
+if __name__ == '__main__':
+    bootstrap()
+
+    import runpy
+
+    runpy.run_module(DAEMON_MODULE, run_name='__main__', alter_sys=True)
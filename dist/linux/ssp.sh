@@ -13,6 +13,8 @@ then
 		else
 			echo SSP: Copying files from $SSP_HOME_DIR
 			cp -ri "$SSP_HOME_DIR/.spark-submit-project/" "./" 
+			# SSP itself is kept once for every OS, in the common folder next to SSP_HOME_DIR.
+			cp -ri "$SSP_HOME_DIR/../common/.spark-submit-project/" "./"
 			exit 0
 		fi
 		
@@ -27,6 +27,8 @@ echo SSP: Running init...
 IF DEFINED SSP_HOME_DIR (
 	echo SSP: Copying files from %SSP_HOME_DIR% to %cd%
 	xcopy /s "%SSP_HOME_DIR%\.spark-submit-project" ".\.spark-submit-project\"
+	REM SSP itself is kept once for every OS, in the common folder next to SSP_HOME_DIR.
+	xcopy /s "%SSP_HOME_DIR%\..\common\.spark-submit-project" ".\.spark-submit-project\"
 	GOTO end
 ) ELSE (
 	echo SSP_HOME_DIR environment variable not defined.
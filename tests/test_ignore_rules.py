@@ -0,0 +1,113 @@
+"""
+Checks how the gitignore-style patterns of the '.sspignore' file are translated to regular expressions by
+_IgnoreRules of spark_submit_project.py.
+
+Usage, from the root of the repository:
+
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SSP_COMMON_DIR = os.path.join(REPOSITORY_DIR, 'dist', 'common', '.spark-submit-project')
+
+sys.path.insert(0, SSP_COMMON_DIR)
+from spark_submit_project import _IgnoreRules  # noqa: E402
+
+
+BASE_DIR = os.path.abspath(os.sep + 'project')
+
+# The patterns of the ignore file, a path relative to its directory, whether the path is a directory, and whether it
+# is left out.
+CASES = [
+    # Patterns without a '/' match at any depth.
+    (['*.pyc'], 'a.pyc', False, True),
+    (['*.pyc'], 'pkg/sub/a.pyc', False, True),
+    (['*.pyc'], 'a.py', False, False),
+    (['*.log   '], 'a.log', False, True),
+    # A trailing '/' only matches directories, and everything under them is left out.
+    (['build/'], 'build', True, True),
+    (['build/'], 'build', False, False),
+    (['build/'], 'src/build', True, True),
+    (['build/'], 'build/module.py', False, True),
+    # A '/' anywhere but at the end anchors the pattern to the directory of the ignore file.
+    (['/build'], 'build', True, True),
+    (['/build'], 'src/build', True, False),
+    (['docs/*.md'], 'docs/a.md', False, True),
+    (['docs/*.md'], 'src/docs/a.md', False, False),
+    (['docs/*.md'], 'docs/sub/a.md', False, False),
+    # '**' matches any number of directories.
+    (['**/tests'], 'tests', True, True),
+    (['**/tests'], 'a/b/tests', True, True),
+    (['a/**/b'], 'a/b', False, True),
+    (['a/**/b'], 'a/x/y/b', False, True),
+    (['a/**/b'], 'c/a/b', False, False),
+    (['logs/**'], 'logs/a/b.txt', False, True),
+    (['logs/**'], 'logs', True, False),
+    # '?' and character classes match a single character, never a '/'.
+    (['file?.log'], 'file1.log', False, True),
+    (['file?.log'], 'file10.log', False, False),
+    (['[ab].py'], 'a.py', False, True),
+    (['[ab].py'], 'c.py', False, False),
+    (['[!ab].py'], 'c.py', False, True),
+    (['[!ab].py'], 'a.py', False, False),
+    # '!' re-includes what an earlier pattern left out, and the last matching pattern decides.
+    (['*.txt', '!keep.txt'], 'a.txt', False, True),
+    (['*.txt', '!keep.txt'], 'keep.txt', False, False),
+    (['*.txt', '!keep.txt'], 'docs/keep.txt', False, False),
+    (['!keep.txt', '*.txt'], 'keep.txt', False, True),
+    # The contents of a left out directory can not be re-included.
+    (['data/', '!data/keep.txt'], 'data/keep.txt', False, True),
+    # Comments and blank lines are skipped, and a leading '\' escapes '#' and '!'.
+    (['# a.txt', ''], 'a.txt', False, False),
+    (['\\#hash.txt'], '#hash.txt', False, True),
+    (['\\!important.txt'], '!important.txt', False, True),
+    (['\\!important.txt'], 'important.txt', False, False),
+    # Characters that are special in regular expressions match themselves.
+    (['a+b.txt'], 'a+b.txt', False, True),
+    (['a+b.txt'], 'aab.txt', False, False),
+    (['x.py'], 'xapy', False, False),
+    (['(v1)'], '(v1)', True, True),
+]
+
+
+class IgnoreRulesTest(unittest.TestCase):
+
+    def test_patterns(self):
+        for (patterns, relative_path, is_directory, expected) in CASES:
+            with self.subTest(patterns=patterns, path=relative_path, is_directory=is_directory):
+                rules = _IgnoreRules(patterns, BASE_DIR)
+                path = os.path.join(BASE_DIR, *relative_path.split('/'))
+                self.assertEqual(rules.is_ignored(path, is_directory), expected)
+
+    def test_paths_outside_are_kept(self):
+        rules = _IgnoreRules(['*'], BASE_DIR)
+
+        self.assertFalse(rules.is_ignored(os.path.join(os.path.dirname(BASE_DIR), 'other', 'a.py'), False))
+
+    def test_fingerprint(self):
+        self.assertIsNone(_IgnoreRules(['', '# only a comment']).fingerprint)
+        self.assertEqual(_IgnoreRules(['*.pyc']).fingerprint, _IgnoreRules(['*.pyc']).fingerprint)
+        self.assertNotEqual(_IgnoreRules(['*.pyc']).fingerprint, _IgnoreRules(['*.pyo']).fingerprint)
+
+    def test_scan(self):
+        temp_dir = tempfile.mkdtemp(prefix='ssp-test-')
+        self.addCleanup(shutil.rmtree, temp_dir, ignore_errors=True)
+        for relative_path in ['pkg/module.py', 'pkg/module.pyc', 'pkg/build/out.py', 'pkg/keep.txt', 'pkg/a.txt']:
+            path = os.path.join(temp_dir, *relative_path.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+
+        rules = _IgnoreRules(['*.pyc', 'build/', '*.txt', '!keep.txt'], temp_dir)
+        entries = rules.scan(os.path.join(temp_dir, 'pkg'))
+
+        self.assertEqual(sorted(relative_path for (relative_path, _) in entries), ['keep.txt', 'module.py'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+"""
+Checks how requirements files are split into pip option lines and requirement lines by
+_RequirementsLock.parse_requirements of spark_submit_project.py.
+
+Usage, from the root of the repository:
+
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SSP_COMMON_DIR = os.path.join(REPOSITORY_DIR, 'dist', 'common', '.spark-submit-project')
+
+sys.path.insert(0, SSP_COMMON_DIR)
+from spark_submit_project import _RequirementsLock  # noqa: E402
+
+
+# The contents of a requirements file, and the option lines and requirement lines it is split into. '{base}' stands
+# for the directory of the requirements file.
+CASES = [
+    ('requests==2.31.0\n', [], ['requests==2.31.0']),
+    # Comments and blank lines are dropped, a '#' only starts a comment at the start of a line or after whitespace.
+    ('# pinned for the cluster\n\nrequests==2.31.0  # the last 2.x\n', [], ['requests==2.31.0']),
+    ('pkg @ https://example.com/pkg-1.0-py3-none-any.whl#sha256=abc\n', [],
+     ['pkg @ https://example.com/pkg-1.0-py3-none-any.whl#sha256=abc']),
+    # Lines ending with a '\' are joined with the next one.
+    ('requests \\\n    ==2.31.0\nidna\n', [], ['requests     ==2.31.0', 'idna']),
+    # Environment markers and extras are kept.
+    ('pywin32; sys_platform == "win32"\nrequests[socks]>=2\n', [],
+     ['pywin32; sys_platform == "win32"', 'requests[socks]>=2']),
+    # Options are kept as they are, except for the paths of nested files, which are made absolute.
+    ('--index-url https://example.com/simple\nrequests\n', ['--index-url https://example.com/simple'], ['requests']),
+    ('-r other.txt\n-c constraints.txt\n--requirement=more.txt\n--constraint sub/pins.txt\n',
+     ['-r {base}/other.txt', '-c {base}/constraints.txt', '--requirement {base}/more.txt',
+      '--constraint {base}/sub/pins.txt'], []),
+    ('-r https://example.com/requirements.txt\n', ['-r https://example.com/requirements.txt'], []),
+    ('-e ./local_package\n', ['-e ./local_package'], []),
+    ('', [], []),
+]
+
+
+class ParseRequirementsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='ssp-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def parse(self, content) -> ([str], [str]):
+        """
+        Writes a requirements file and parses it.
+
+        :param content: The contents of the requirements file.
+        :return: Type([str], [str]) option lines and requirement lines.
+        """
+        filename = os.path.join(self.temp_dir, 'requirements.txt')
+        with open(filename, 'w') as file:
+            file.write(content)
+        return _RequirementsLock.parse_requirements(filename)
+
+    def test_lines(self):
+        for (content, options_lines, requirement_lines) in CASES:
+            with self.subTest(content=content):
+                expected_options_lines = [line.replace('{base}/', self.temp_dir + os.sep) for line in options_lines]
+                self.assertEqual(self.parse(content), (expected_options_lines, requirement_lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
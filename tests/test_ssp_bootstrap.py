@@ -0,0 +1,167 @@
+"""
+Runs the executor-side bootstrap, ssp_bootstrap.py, in local mode with a stand-in environment, without Spark.
+
+Usage, from the root of the repository:
+
+    python -m unittest discover tests
+"""
+import contextlib
+import importlib.machinery
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import unittest.mock
+import zipfile
+
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SSP_COMMON_DIR = os.path.join(REPOSITORY_DIR, 'dist', 'common', '.spark-submit-project')
+
+sys.path.insert(0, SSP_COMMON_DIR)
+import ssp_bootstrap  # noqa: E402
+
+
+class BootstrapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='ssp-test-')
+        self.cache_dir = os.path.join(self.temp_dir, 'cache')
+        self.bundles_dir = os.path.join(self.temp_dir, 'bundles')
+        os.makedirs(self.bundles_dir)
+
+    def tearDown(self):
+        for key in [key for key in sys.path_importer_cache if key.startswith(self.temp_dir)]:
+            del sys.path_importer_cache[key]
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def make_bundle(self, filename, module_name) -> str:
+        """
+        Makes a zip file holding a single module.
+
+        :param filename: The name of the zip file.
+        :param module_name: The name of the module.
+        :return: Type[str] the complete filename of the zip file.
+        """
+        bundle_path = os.path.join(self.bundles_dir, filename)
+        with zipfile.ZipFile(bundle_path, 'w') as archive:
+            archive.writestr(f"{module_name}.py", f"NAME = '{module_name}'\n")
+        return bundle_path
+
+    def make_environment(self, bundle_paths, hashes=None) -> {str: str}:
+        """
+        Makes the environment SSP passes to the executors.
+
+        :param bundle_paths: Complete filenames of the zip files to extract.
+        :param hashes: Type[str] the sha256 hash to pass for every zip file, None to hash them.
+        :return: Type{str: str}
+        """
+        if hashes is None:
+            hashes = [ssp_bootstrap.hash_file(bundle_path) for bundle_path in bundle_paths]
+        return {
+            ssp_bootstrap.CACHE_VARIABLE: self.cache_dir,
+            ssp_bootstrap.BUNDLES_VARIABLE: ','.join(f"{sha256}:{os.path.basename(bundle_path)}"
+                                                     for (sha256, bundle_path) in zip(hashes, bundle_paths)),
+            ssp_bootstrap.SEARCH_PATH_VARIABLE: self.bundles_dir,
+        }
+
+    def bootstrap(self, environment, path) -> ([str], str):
+        """
+        Runs the bootstrap.
+
+        :return: Type([str], str) the extracted directories, and what was written to stderr.
+        """
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            extracted_dirs = ssp_bootstrap.bootstrap(environment, path)
+        return extracted_dirs, stderr.getvalue()
+
+    def get_origin(self, module_name, path) -> str:
+        """
+        :return: Type[str] where an import of the module would load it from.
+        """
+        return importlib.machinery.PathFinder.find_spec(module_name, path).origin
+
+    def test_extracted_dirs_come_first(self):
+        bundle_paths = [self.make_bundle('first.zip', 'first_module'), self.make_bundle('second.whl', 'second_module')]
+        path = [bundle_paths[0], '/usr/lib/python3']
+
+        (extracted_dirs, stderr) = self.bootstrap(self.make_environment(bundle_paths), path)
+
+        self.assertEqual(stderr, '')
+        self.assertEqual(len(extracted_dirs), 2)
+        self.assertEqual(path, extracted_dirs + [bundle_paths[0], '/usr/lib/python3'])
+        for (extracted_dir, bundle_path) in zip(extracted_dirs, bundle_paths):
+            self.assertEqual(os.path.basename(extracted_dir), ssp_bootstrap.hash_file(bundle_path))
+        self.assertEqual(os.path.dirname(self.get_origin('first_module', path)), extracted_dirs[0])
+        self.assertEqual(os.path.dirname(self.get_origin('second_module', path)), extracted_dirs[1])
+        self.assertIsNone(sys.path_importer_cache[bundle_paths[0]])
+
+    def test_cache_is_reused(self):
+        bundle_path = self.make_bundle('first.zip', 'first_module')
+        environment = self.make_environment([bundle_path])
+
+        (first_dirs, _) = self.bootstrap(environment, [bundle_path])
+        with unittest.mock.patch.object(ssp_bootstrap.zipfile, 'ZipFile', side_effect=AssertionError('extracted')):
+            (second_dirs, stderr) = self.bootstrap(environment, [bundle_path])
+
+        self.assertEqual(stderr, '')
+        self.assertEqual(first_dirs, second_dirs)
+        self.assertEqual(os.listdir(os.path.dirname(first_dirs[0])), [os.path.basename(first_dirs[0])])
+
+    @unittest.skipUnless(hasattr(os, 'getuid'), "Only Linux and macOS have uids.")
+    def test_cache_is_per_user(self):
+        bundle_path = self.make_bundle('first.zip', 'first_module')
+
+        (extracted_dirs, _) = self.bootstrap(self.make_environment([bundle_path]), [bundle_path])
+
+        self.assertEqual(os.path.dirname(extracted_dirs[0]), os.path.join(self.cache_dir, str(os.getuid())))
+
+    def assert_falls_back(self, environment, bundle_path, message):
+        """
+        Checks that the bootstrap leaves the zip file to be imported as usual.
+        """
+        path = [bundle_path]
+
+        (extracted_dirs, stderr) = self.bootstrap(environment, path)
+
+        self.assertEqual(extracted_dirs, [])
+        self.assertEqual(path, [bundle_path])
+        self.assertIn(message, stderr)
+        self.assertIsNot(sys.path_importer_cache.get(bundle_path, False), None)
+
+    def test_missing_bundle_falls_back(self):
+        bundle_path = self.make_bundle('first.zip', 'first_module')
+        environment = self.make_environment([bundle_path])
+        os.remove(bundle_path)
+
+        self.assert_falls_back(environment, bundle_path, 'was not found')
+
+    def test_corrupt_bundle_falls_back(self):
+        bundle_path = os.path.join(self.bundles_dir, 'first.zip')
+        with open(bundle_path, 'wb') as file:
+            file.write(b'not a zip file')
+
+        self.assert_falls_back(self.make_environment([bundle_path]), bundle_path, 'unable to extract')
+
+    def test_changed_bundle_falls_back(self):
+        bundle_path = self.make_bundle('first.zip', 'first_module')
+
+        self.assert_falls_back(self.make_environment([bundle_path], hashes=['0' * 64]), bundle_path,
+                               'does not match its hash')
+        self.assertEqual(self.get_origin('first_module', [bundle_path]), os.path.join(bundle_path, 'first_module.py'))
+
+    @unittest.skipUnless(hasattr(os, 'getuid'), "Only Linux and macOS have uids.")
+    def test_cache_writable_by_others_falls_back(self):
+        bundle_path = self.make_bundle('first.zip', 'first_module')
+        user_cache_dir = os.path.join(self.cache_dir, str(os.getuid()))
+        os.makedirs(user_cache_dir)
+        os.chmod(user_cache_dir, 0o777)
+
+        self.assert_falls_back(self.make_environment([bundle_path]), bundle_path, 'can be written to by other users')
+
+
+if __name__ == '__main__':
+    unittest.main()